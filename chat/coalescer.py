@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventCoalescer:
+    """
+    연결 단위 갱신 이벤트 병합기
+
+    window 안에 연달아 들어온 trigger()를 한 번의 callback 호출로 합친다.
+    이벤트가 계속 들어와도 첫 이벤트로부터 max_delay가 지나면 반드시 실행되므로
+    화면이 max_delay 이상 뒤처지지 않는다. trigger(key)로 넘긴 key들은
+    모아서 callback(keys)에 전달된다.
+    """
+
+    # 프로세스 전체 누적 통계
+    totals = {'triggered': 0, 'merged': 0, 'flushed': 0}
+
+    def __init__(self, callback, window=None, max_delay=None):
+        self.callback = callback
+        self.window = window if window is not None else getattr(settings, 'CHAT_COALESCE_WINDOW', 0.1)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, 'CHAT_COALESCE_MAX_DELAY', 0.5)
+
+        self._keys = set()
+        self._first_at = None
+        self._handle = None
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+
+        self.triggered_count = 0
+        self.merged_count = 0
+        self.flush_count = 0
+
+    def trigger(self, key=None):
+        """갱신 요청 등록 (이미 대기 중인 요청이 있으면 병합)"""
+        self.triggered_count += 1
+        EventCoalescer.totals['triggered'] += 1
+        if key is not None:
+            self._keys.add(key)
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._first_at is None:
+            self._first_at = now
+        else:
+            self.merged_count += 1
+            EventCoalescer.totals['merged'] += 1
+
+        if self._handle is not None:
+            self._handle.cancel()
+        deadline = min(now + self.window, self._first_at + self.max_delay)
+        self._handle = loop.call_at(deadline, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        keys, self._keys = self._keys, set()
+        self._first_at = None
+        self.flush_count += 1
+        EventCoalescer.totals['flushed'] += 1
+
+        task = asyncio.ensure_future(self._run(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, keys):
+        # 이전 callback이 끝나기 전에 다음 callback이 실행되지 않도록 직렬화
+        async with self._lock:
+            try:
+                await self.callback(keys)
+            except Exception as e:
+                logger.error(f"Error in coalesced callback: {str(e)}")
+
+    def cancel(self):
+        """연결 종료 시 대기 중인 요청 취소"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._keys = set()
+        self._first_at = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def stats(self):
+        return {
+            'triggered': self.triggered_count,
+            'merged': self.merged_count,
+            'flushed': self.flush_count,
+        }
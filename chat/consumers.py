@@ -1,14 +1,26 @@
-import json
-from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+import logging
+from asgiref.sync import sync_to_async
+from metrics.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils.html import escape
-from .models import ChatRoom, ChatMessage
+from .models import ChatRoom, ChatMessage, ChatParticipant
+from .message_buffer import get_message_buffer, is_write_behind_enabled
+from .utils import record_new_messages, mark_room_read
+from .coalescer import EventCoalescer
+from .sidebar_events import current_sequence, send_to_sidebars, sidebar_group
+from .membership import room_membership_cache
 from user.models import User
-from .serializers import ChatMessageSerializer, ChatRoomSerializer
+from user import images, presence, profile_cache
+from realtime import fanout
+from realtime.groups import group_add_many, group_discard_many
+from realtime.protocol import ProtocolConsumer, encode_frames
+from .serializers import ChatRoomSerializer, build_message_payload, get_room_online_map
 
-class ChatConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+class ChatConsumer(ProtocolConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs'].get('room_id')
         
@@ -30,6 +42,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             # 채팅방 그룹 이름 설정
             self.room_group_name = f"chat_room_{self.room_id}"
+
+            # 상태/프로필 변경이 몰려도 참여자 정보는 한 번만 다시 조회
+            self.participants_refresh = EventCoalescer(self.refresh_participants_info)
             
             # 채팅방 그룹에 참여
             await self.channel_layer.group_add(
@@ -52,33 +67,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'room_group_name'):
-            # 채팅방 그룹에서 제거
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
-            
-        # 참여자 상태 그룹에서도 제거
-        if hasattr(self, 'status_subscriptions'):
-            for group_name in self.status_subscriptions:
-                await self.channel_layer.group_discard(
-                    group_name,
-                    self.channel_name
-                )
+        if hasattr(self, 'participants_refresh'):
+            self.participants_refresh.cancel()
+
+        # 채팅방 그룹과 참여자 상태 그룹에서 한 번에 제거
+        groups = [self.room_group_name] if hasattr(self, 'room_group_name') else []
+        groups += getattr(self, 'status_subscriptions', [])
+        await group_discard_many(self.channel_layer, groups, self.channel_name)
+
+    async def receive_invalid(self, error):
+        await self.send_error("잘못된 메시지 형식입니다.")
 
-    async def receive(self, text_data):
+    async def receive_data(self, data):
         try:
-            data = json.loads(text_data)
             message_type = data.get('type', 'message')
             
             if message_type == 'message':
                 await self.handle_chat_message(data)
+            elif message_type == 'read':
+                await self.handle_read(data)
             elif message_type == 'profile_image_updated':
                 await self.handle_profile_image_update()
                     
-        except json.JSONDecodeError:
-            await self.send_error("잘못된 메시지 형식입니다.")
         except Exception as e:
             await self.send_error(f"메시지 처리 중 오류가 발생했습니다: {str(e)}")
 
@@ -90,49 +100,100 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         try:
-            # 메시지 저장
-            message = await self.save_message(message_content)
+            # 메시지 저장 (write-behind 모드에서는 ID만 부여하고 DB 기록은 flusher가 일괄 처리)
+            if is_write_behind_enabled():
+                message = await self.queue_message(message_content)
+            else:
+                message = await self.save_message(message_content)
             
             # 메시지 시리얼라이즈
-            message_data = await self.serialize_message(message)
+            message_data = build_message_payload(message)
             
-            # 그룹에 메시지 전송
+            # 그룹에 메시지 전송 (프레임은 한 번만 인코딩하고 수신 측에서는 그대로 전달)
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'message',
-                    'message': message_data
+                    'frames': encode_frames({
+                        'type': 'message',
+                        'message': message_data
+                    })
                 }
             )
             
-            # 사이드바 업데이트
-            other_participant = await self.get_other_participant(message.room, self.scope["user"].id)
-            await send_sidebar_update(self.scope["user"], other_participant)
+            # 사이드바 업데이트 (상대방은 참여자 캐시에서 조회)
+            other_participant_id = await self.get_other_participant_id()
+            await send_sidebar_update(
+                self.scope["user"].id,
+                other_participant_id,
+                room_id=self.room.id,
+                message=message_data
+            )
         except Exception as e:
             await self.send_error(f"메시지 저장 중 오류가 발생했습니다: {str(e)}")
 
+    async def handle_read(self, data):
+        """읽음 watermark 전진 및 읽음 확인 전송"""
+        message_id = data.get('message_id')
+        if message_id is not None:
+            if isinstance(message_id, bool) or not str(message_id).isdecimal() or int(message_id) <= 0:
+                await self.send_error("잘못된 메시지 ID입니다.")
+                return
+            message_id = int(message_id)
+        watermark = await self.mark_read(message_id)
+        if watermark:
+            await send_read_receipt(self.room.id, self.scope["user"].id, watermark)
+            await send_room_read(self.scope["user"].id, self.room.id)
+
+    @database_sync_to_async
+    def mark_read(self, message_id):
+        return mark_room_read(self.room.id, self.scope["user"].id, message_id)
+
+    async def read_receipt(self, event):
+        """상대방의 읽음 확인을 클라이언트에게 전송"""
+        await self.send_data({
+            'type': 'read_receipt',
+            'user_id': event['user_id'],
+            'last_read_message_id': event['last_read_message_id'],
+            'last_read_at': event['last_read_at']
+        })
+
     async def message(self, event):
         """채팅 메시지를 클라이언트에게 전송"""
-        await self.send(text_data=json.dumps({
+        # 발신 측에서 인코딩한 프레임을 그대로 전달
+        if 'frames' in event:
+            await self.send_frames(event['frames'])
+            return
+        await self.send_data({
             "type": "message",  # message 타입으로 보내기
             "message": event['message']  # 메시지 내용
-        }))
+        })
 
     async def send_error(self, message):
         """에러 메시지 전송"""
-        await self.send(text_data=json.dumps({
+        await self.send_data({
             'type': 'error',
             'message': message
-        }))
+        })
         
     async def status_message(self, event):
         """사용자 상태 업데이트 처리"""
-        # 참여자 정보 갱신하여 전송
-        await self.send_participants_info()
+        # inbox 모드에서는 친구 등 다른 사용자의 이벤트도 들어오므로 채팅방 참여자만 처리
+        user_id = event.get('user_id')
+        if user_id == self.scope["user"].id:
+            return
+        membership = await self.get_room_membership()
+        if membership is None or not membership.has(user_id):
+            return
+        # 참여자 정보 갱신하여 전송 (짧은 시간 내 이벤트는 병합)
+        self.participants_refresh.trigger()
         
     async def profile_image_update(self, event):
         """프로필 이미지 업데이트 처리"""
-        # 참여자 정보 갱신하여 전송
+        # 참여자 정보 갱신하여 전송 (짧은 시간 내 이벤트는 병합)
+        self.participants_refresh.trigger()
+
+    async def refresh_participants_info(self, keys):
         await self.send_participants_info()
     
     async def handle_profile_image_update(self):
@@ -149,24 +210,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
                         'user_id': self.scope["user"].id,
                     }
                 )
-                
-                # 사이드바도 업데이트
-                await self.channel_layer.group_send(
-                    f"sidebar_chat_{participant_id}",
-                    {
-                        'type': 'profile_image_update',
-                        'user_id': self.scope["user"].id,
-                    }
-                )
+
+        # 사이드바도 업데이트
+        await send_to_sidebars(
+            self.channel_layer,
+            [participant_id for participant_id in chat_participants if participant_id != self.scope["user"].id],
+            {
+                'type': 'profile_image_update',
+                'user_id': self.scope["user"].id,
+            }
+        )
 
     @database_sync_to_async
     def initialize_room(self):
-        """채팅방 초기화 및 접근 권한 확인"""
+        """채팅방 초기화 및 접근 권한 확인 (참여자 캐시 사용)"""
         try:
-            self.room = ChatRoom.objects.select_related().get(id=self.room_id)
-            return self.room.participants.filter(id=self.scope["user"].id).exists()
-        except ChatRoom.DoesNotExist:
-            return False
+            membership = room_membership_cache.get(self.room_id)
+            if membership is None or not membership.has(self.scope["user"].id):
+                return False
+            # 메시지 저장과 참여자 조회에는 ID만 필요하므로 채팅방 행을 다시 읽지 않음
+            self.room = ChatRoom(id=membership.room_id, room_type=membership.room_type)
+            return True
         except Exception:
             return False
 
@@ -188,80 +252,114 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """메시지 저장"""
         try:
             sanitized_content = escape(content)  # XSS 방지
-            return ChatMessage.objects.create(
-                room=self.room,
-                sender=self.scope["user"],
-                content=sanitized_content
-            )
+            with transaction.atomic():
+                message = ChatMessage.objects.create(
+                    room=self.room,
+                    sender=self.scope["user"],
+                    content=sanitized_content
+                )
+                # 채팅방 마지막 메시지 및 안 읽은 메시지 수 갱신
+                record_new_messages([message])
+            return message
         except Exception as e:
             raise ValidationError(f"메시지 저장 실패: {str(e)}")
     
-    @database_sync_to_async
-    def serialize_message(self, message):
-        """메시지 시리얼라이즈"""
-        return ChatMessageSerializer(message).data
-    
-    @database_sync_to_async
-    def get_other_participant(self, room, user_id):
-        return room.participants.exclude(id=user_id).first()
-    
-    @database_sync_to_async
-    def get_room_participants(self):
+    async def queue_message(self, content):
+        """메시지를 write-behind 버퍼에 추가"""
+        message = ChatMessage(
+            room=self.room,
+            sender=self.scope["user"],
+            content=escape(content)  # XSS 방지
+        )
+        return await get_message_buffer().add(message)
+
+    async def get_room_membership(self):
+        """참여자 캐시 조회 (재확인이 필요할 때만 스레드에서 Redis/DB 확인)"""
+        membership = room_membership_cache.peek(self.room.id)
+        if membership is None:
+            membership = await database_sync_to_async(room_membership_cache.get)(self.room.id)
+        return membership
+
+    async def get_other_participant_id(self):
+        membership = await self.get_room_membership()
+        return membership.other(self.scope["user"].id) if membership is not None else None
+
+    async def get_room_participants(self):
         """채팅방의 모든 참여자 ID 목록 가져오기"""
-        return list(self.room.participants.values_list('id', flat=True))
+        membership = await self.get_room_membership()
+        return sorted(membership.participant_ids) if membership is not None else []
         
     async def subscribe_to_participants_status(self):
         """채팅방 참여자들의 상태 업데이트를 구독"""
         participant_ids = await self.get_room_participants()
-        
-        for participant_id in participant_ids:
-            if participant_id != self.scope["user"].id:  # 자신 제외
-                group_name = f"user_{participant_id}"
-                self.status_subscriptions.append(group_name)
-                await self.channel_layer.group_add(
-                    group_name,
-                    self.channel_name
-                )
+        groups = fanout.subscription_groups(
+            self.scope["user"].id,
+            [participant_id for participant_id in participant_ids if participant_id != self.scope["user"].id]  # 자신 제외
+        )
+        self.status_subscriptions.extend(groups)
+        await group_add_many(self.channel_layer, groups, self.channel_name)
     
     async def send_participants_info(self):
         """채팅방 참여자 정보 전송 (온라인 상태 및 프로필 이미지 포함)"""
         participants_info = await self.get_participants_info()
-        await self.send(text_data=json.dumps({
+        await self.send_data({
             'type': 'participants_info',
             'participants': participants_info
-        }))
+        })
     
     @database_sync_to_async
     def get_participants_info(self):
         """채팅방 참여자 정보 가져오기 (온라인 상태 및 프로필 이미지 포함)"""
-        participants = self.room.participants.all()
+        # 참여자 ID는 참여자 캐시, 이름/이미지는 프로필 스냅샷 캐시에서 조회
+        membership = room_membership_cache.get(self.room.id)
+        participant_ids = sorted(membership.participant_ids) if membership is not None else []
+        profiles = profile_cache.get_many(participant_ids)
         participants_info = []
+        # 접속 상태는 Redis에서 한 번에 조회
+        online_map = presence.get_many(participant_ids)
         
-        for participant in participants:
+        for participant_id in participant_ids:
+            profile = profiles.get(participant_id)
+            if profile is None:
+                continue
             participant_info = {
-                'id': participant.id,
-                'username': participant.username,
-                'is_online': hasattr(participant, 'is_online') and participant.is_online,
+                'id': participant_id,
+                'username': profile['username'],
+                'is_online': online_map.get(participant_id, False),
             }
             
-            # 프로필 이미지 추가
-            if hasattr(participant, 'image') and participant.image:
-                participant_info['profile_image_url'] = participant.image.url
-            else:
-                participant_info['profile_image_url'] = '/media/default/profile.jpg'
+            # 프로필 이미지 추가 (참여자 목록은 avatar 크기)
+            participant_info['profile_image_url'] = profile_cache.image_url(profile, 'avatar')
                 
             participants_info.append(participant_info)
             
         return participants_info
     
-class SidebarChatConsumer(AsyncWebsocketConsumer):
+class SidebarChatConsumer(ProtocolConsumer):
+    """
+    사이드바 채팅방 목록 Consumer
+
+    연결 시 전체 채팅방 목록(snapshot)을 한 번 보내고, 이후에는 변경된 채팅방이나
+    참여자에 대한 작은 delta 프레임만 전송한다. 사이드바 이벤트에는 만드는 쪽에서 붙인
+    사용자별 순번(seq, sidebar_events 참고)이 있고, 순번이 건너뛰면 중간 이벤트가 유실된
+    것이므로 전체 목록을 다시 보낸다. 프레임의 seq는 지금까지 반영한 마지막 순번이며
+    (병합된 delta는 마지막 이벤트의 순번), 클라이언트는 {"type": "resync"}로 언제든 전체
+    목록을 다시 받을 수 있다.
+    """
     async def connect(self):
         # 사용자 인증 확인
         if not self.scope["user"].is_authenticated:
             await self.close()
             return
         
-        self.user_channel_name = f"sidebar_chat_{self.scope['user'].id}"
+        self.user_channel_name = sidebar_group(self.scope['user'].id)
+        self.seq = 0  # 마지막으로 반영한 사이드바 이벤트 순번
+        self.rooms = {}  # room_id -> {'other_user_id', 'unread_count', 'last_message'}
+
+        # 같은 채팅방/사용자에 대한 연속 이벤트는 마지막 상태 한 번으로 병합
+        self.room_updates = EventCoalescer(self.flush_room_updates)
+        self.profile_updates = EventCoalescer(self.flush_profile_updates)
+        self.pending_profiles = {}
         
         # 채널 레이어에 참여
         await self.channel_layer.group_add(
@@ -278,162 +376,354 @@ class SidebarChatConsumer(AsyncWebsocketConsumer):
         await self.send_chat_room_list()
 
     async def disconnect(self, close_code):
-        # 채널 레이어에서 제거
-        if hasattr(self, 'user_channel_name'):
-            await self.channel_layer.group_discard(
-                self.user_channel_name,
-                self.channel_name
-            )
-            
-        # 모든 채팅방 참여자들의 상태 그룹에서도 제거
-        if hasattr(self, 'status_subscriptions'):
-            for group_name in self.status_subscriptions:
-                await self.channel_layer.group_discard(
-                    group_name,
-                    self.channel_name
-                )
+        for coalescer_name in ('room_updates', 'profile_updates'):
+            if hasattr(self, coalescer_name):
+                getattr(self, coalescer_name).cancel()
+
+        # 사이드바 그룹과 모든 채팅방 참여자들의 상태 그룹에서 한 번에 제거
+        groups = [self.user_channel_name] if hasattr(self, 'user_channel_name') else []
+        groups += getattr(self, 'status_subscriptions', [])
+        await group_discard_many(self.channel_layer, groups, self.channel_name)
 
-    async def receive(self, text_data):
+    async def receive_data(self, data):
         try:
-            data = json.loads(text_data)
-            
+            # 클라이언트가 요청하면 전체 목록 재전송
+            if data.get('type') == 'resync':
+                await self.send_chat_room_list()
+
             # 프로필 이미지 업데이트 처리
             if data.get('profile_image_updated'):
                 await self.handle_profile_image_update()
                 
-        except json.JSONDecodeError:
-            pass
-        except Exception as e:
-            pass
+        except Exception:
+            logger.exception(f"Sidebar receive error for user {self.scope['user'].id}")
+
+    async def send_frame(self, frame):
+        """마지막으로 반영한 이벤트 순번을 붙여 프레임 전송"""
+        frame['seq'] = self.seq
+        await self.send_data(frame)
+
+    async def accept_sequence(self, event):
+        """
+        사이드바 이벤트 순번 확인. 반영해야 하는 이벤트면 True
+
+        순번이 없거나(Redis 장애) 건너뛰었으면 전체 목록을 다시 보내고, 이미 snapshot에
+        포함된 이벤트(늦게 도착한 이전 순번)는 무시한다.
+        """
+        seq = event.get('seq')
+        if seq is not None and seq <= self.seq:
+            return False
+        if seq is None or seq > self.seq + 1:
+            logger.info(f"Sidebar event gap for user {self.scope['user'].id}: {self.seq} -> {seq}, resyncing")
+            await self.send_chat_room_list()
+            return False
+        self.seq = seq
+        return True
 
     async def send_chat_room_list(self):
-        """현재 사용자의 채팅방 목록 직렬화 및 전송"""
+        """현재 사용자의 채팅방 목록 직렬화 및 전송 (snapshot)"""
+        # 목록을 읽기 전의 순번을 기록 (이후 순번의 이벤트만 delta로 반영)
+        try:
+            self.seq = max(self.seq, await sync_to_async(current_sequence)(self.scope["user"].id))
+        except Exception as e:
+            logger.error(f"Sidebar sequence lookup error for user {self.scope['user'].id}: {str(e)}")
         chat_rooms = await self.get_chat_rooms_with_status()
-        await self.send(text_data=json.dumps({
+        self.rooms = {}
+        for room_data in chat_rooms:
+            self.track_room(room_data)
+        await self.send_frame({
             'type': 'chat_room_list',
             'rooms': chat_rooms
-        }))
+        })
+
+    def track_room(self, room_data):
+        """delta 계산을 위해 채팅방 상태를 기억"""
+        other_participant = room_data.get('other_participant') or {}
+        self.rooms[room_data['id']] = {
+            'other_user_id': other_participant.get('id'),
+            'unread_count': room_data.get('unread_count', 0),
+            'last_message': None,
+        }
+
+    async def send_room_added(self, room_id):
+        """목록에 없던 채팅방을 한 건만 조회하여 전송"""
+        room_data = await self.get_chat_room_with_status(room_id)
+        if room_data is None:
+            return
+        self.track_room(room_data)
+        await self.send_frame({
+            'type': 'room_added',
+            'room': room_data
+        })
 
     async def chat_message(self, event):
-        """새 메시지 수신 시 사이드바 업데이트"""
-        await self.send_chat_room_list()
+        """새 메시지 수신 시 해당 채팅방 delta 전송"""
+        if not await self.accept_sequence(event):
+            return
+        room_id = event.get('room_id')
+        if room_id is None:
+            await self.send_chat_room_list()
+            return
+        if room_id not in self.rooms:
+            await self.send_room_added(room_id)
+            return
+
+        room_state = self.rooms[room_id]
+        if event.get('sender_id') != self.scope["user"].id:
+            room_state['unread_count'] += 1
+        room_state['last_message'] = event.get('message')
+        self.room_updates.trigger(room_id)
+
+    async def room_read(self, event):
+        """채팅방을 읽었을 때 안 읽은 메시지 수 초기화"""
+        if not await self.accept_sequence(event):
+            return
+        room_id = event.get('room_id')
+        if room_id not in self.rooms:
+            return
+        self.rooms[room_id]['unread_count'] = 0
+        self.room_updates.trigger(room_id)
+
+    async def flush_room_updates(self, room_ids):
+        """병합된 채팅방 변경 사항을 채팅방별 delta 한 건으로 전송"""
+        for room_id in room_ids:
+            room_state = self.rooms.get(room_id)
+            if room_state is None:
+                continue
+            frame = {
+                'type': 'room_update',
+                'room_id': room_id,
+                'unread_count': room_state['unread_count']
+            }
+            message = room_state['last_message']
+            room_state['last_message'] = None
+            if message:
+                frame['last_message'] = message
+                frame['updated_at'] = message.get('created_at')
+            await self.send_frame(frame)
 
     async def update_chat_rooms(self, event):
         """채팅방 업데이트 이벤트 처리"""
-        await self.send_chat_room_list()
+        if not await self.accept_sequence(event):
+            return
+        room_id = event.get('room_id')
+        if room_id is None:
+            await self.send_chat_room_list()
+        elif room_id not in self.rooms:
+            await self.send_room_added(room_id)
         
     async def status_message(self, event):
         """사용자 상태 업데이트 처리"""
-        # 상태 메시지를 받으면 채팅방 목록을 다시 불러와 업데이트된 상태 정보를 포함
-        await self.send_chat_room_list()
+        if not self.is_tracked_participant(event.get('user_id')):
+            return
+        await self.send_frame({
+            'type': 'participant_status',
+            'user_id': event['user_id'],
+            'is_online': event.get('is_online', False)
+        })
         
     async def profile_image_update(self, event):
         """프로필 이미지 업데이트 처리"""
-        # 프로필 이미지가 업데이트되면 채팅방 목록을 다시 불러옴
-        await self.send_chat_room_list()
+        if not await self.accept_sequence(event):
+            return
+        user_id = event.get('user_id')
+        if not self.is_tracked_participant(user_id):
+            return
+        self.pending_profiles[user_id] = event.get('profile_image_url')
+        self.profile_updates.trigger(user_id)
+
+    async def flush_profile_updates(self, user_ids):
+        """병합된 프로필 변경 사항을 사용자별 delta 한 건으로 전송"""
+        for user_id in user_ids:
+            profile_image_url = self.pending_profiles.pop(user_id, None) or await self.get_profile_image_url(user_id)
+            await self.send_frame({
+                'type': 'participant_profile',
+                'user_id': user_id,
+                'profile_image_url': profile_image_url
+            })
+
+    def is_tracked_participant(self, user_id):
+        return any(room['other_user_id'] == user_id for room in self.rooms.values())
 
     async def handle_profile_image_update(self):
         """프로필 이미지 업데이트 처리 및 알림"""
         # 채팅 참여자들에게 업데이트 알림
         chat_participants = await self.get_all_chat_participants()
+        profile_image_url = await self.get_profile_image_url(self.scope["user"].id)
         
-        for participant_id in chat_participants:
-            await self.channel_layer.group_send(
-                f"sidebar_chat_{participant_id}",
-                {
-                    'type': 'profile_image_update',
-                    'user_id': self.scope["user"].id,
-                }
-            )
+        await send_to_sidebars(
+            self.channel_layer,
+            chat_participants,
+            {
+                'type': 'profile_image_update',
+                'user_id': self.scope["user"].id,
+                'profile_image_url': profile_image_url,
+            }
+        )
     
+    @database_sync_to_async
+    def get_profile_image_url(self, user_id):
+        """사용자의 현재 프로필 이미지 URL (프로필 스냅샷 캐시 사용)"""
+        return profile_cache.image_url(profile_cache.get(user_id), 'sidebar')
+
     @database_sync_to_async
     def get_all_chat_participants(self):
         """사용자가 참여하는 모든 채팅방의 다른 참여자들의 ID 목록 가져오기"""
-        chat_rooms = ChatRoom.objects.filter(participants=self.scope["user"])
-        participant_ids = set()
-        
-        for room in chat_rooms:
-            for participant in room.participants.all():
-                if participant.id != self.scope["user"].id:
-                    participant_ids.add(participant.id)
-                    
-        return list(participant_ids)
+        # 채팅방별로 참여자를 읽지 않고 참여 정보 테이블에서 한 번에 조회
+        user_id = self.scope["user"].id
+        room_ids = ChatParticipant.objects.filter(user_id=user_id).values('room_id')
+        return list(
+            ChatParticipant.objects.filter(room_id__in=room_ids)
+            .exclude(user_id=user_id)
+            .values_list('user_id', flat=True)
+            .distinct()
+        )
 
     async def subscribe_to_participants_status(self):
         """모든 채팅 참여자의 상태 업데이트를 구독"""
         participant_ids = await self.get_all_chat_participants()
-        self.status_subscriptions = []
-        
-        for participant_id in participant_ids:
-            group_name = f"user_{participant_id}"
-            self.status_subscriptions.append(group_name)
-            await self.channel_layer.group_add(
-                group_name,
-                self.channel_name
-            )
+        self.status_subscriptions = fanout.subscription_groups(self.scope["user"].id, participant_ids)
+        await group_add_many(self.channel_layer, self.status_subscriptions, self.channel_name)
 
-    @database_sync_to_async
-    def get_chat_rooms_with_status(self):
-        """사용자의 다이렉트 메시지 채팅방 목록과 참여자 상태 정보 가져오기"""
-        chat_rooms = ChatRoom.objects.filter(
-            participants=self.scope["user"], 
-            room_type='direct'
-        ).prefetch_related('participants', 'messages')
-        
+    def serialize_chat_rooms(self, chat_rooms):
+        """채팅방 목록 직렬화"""
         # 시리얼라이저 컨텍스트 생성
         class MockRequest:
             def __init__(self, user):
                 self.user = user
         
         mock_request = MockRequest(self.scope["user"])
+        chat_rooms = list(chat_rooms)
         serializer = ChatRoomSerializer(
             chat_rooms, 
             many=True, 
-            context={'request': mock_request}
+            context={
+                'request': mock_request,
+                'online_map': get_room_online_map(chat_rooms, self.scope["user"])
+            }
         )
-        
-        # 시리얼라이즈된 데이터에 온라인 상태와 프로필 이미지 정보 추가
-        serialized_data = serializer.data
-        
-        for room_data in serialized_data:
-            # 다른 참여자 정보 가져오기
-            for participant in room_data.get('participants', []):
-                if participant['id'] != self.scope["user"].id:
-                    # User 모델에서 현재 상태 및 프로필 이미지 가져오기
-                    try:
-                        user = User.objects.get(id=participant['id'])
-                        participant['is_online'] = hasattr(user, 'is_online') and user.is_online
-                        
-                        # 프로필 이미지 추가
-                        if hasattr(user, 'image') and user.image:
-                            participant['profile_image_url'] = user.image.url
-                        else:
-                            participant['profile_image_url'] = '/media/default/profile.jpg'
-                    except User.DoesNotExist:
-                        participant['is_online'] = False
-                        participant['profile_image_url'] = '/media/default/profile.jpg'
-        
-        return serialized_data
+        return serializer.data
+
+    @database_sync_to_async
+    def get_chat_rooms_with_status(self):
+        """사용자의 다이렉트 메시지 채팅방 목록과 참여자 상태 정보 가져오기"""
+        chat_rooms = ChatRoom.objects.filter(
+            participants=self.scope["user"], 
+            room_type='direct'
+        ).with_summary(self.scope["user"])
+        return self.serialize_chat_rooms(chat_rooms)
+
+    @database_sync_to_async
+    def get_chat_room_with_status(self, room_id):
+        """채팅방 한 건만 조회하여 직렬화"""
+        chat_rooms = ChatRoom.objects.filter(
+            id=room_id,
+            participants=self.scope["user"], 
+            room_type='direct'
+        ).with_summary(self.scope["user"])
+        serialized_data = self.serialize_chat_rooms(chat_rooms)
+        return serialized_data[0] if serialized_data else None
 
 # 채팅 업데이트 헬퍼 함수 (전역 함수로 이동)
-async def send_sidebar_update(sender, recipient):
+async def send_sidebar_update(sender_id, recipient_id, room_id=None, message=None):
     """
-    메시지 전송 시 양쪽 사용자의 사이드바 업데이트
+    메시지 전송 또는 채팅방 생성 시 양쪽 사용자의 사이드바 업데이트
+    message가 있으면 해당 채팅방의 delta만, 없으면 채팅방 추가 이벤트를 보낸다.
     """
     channel_layer = get_channel_layer()
 
-    # 발신자 사이드바 업데이트
-    await channel_layer.group_send(
-        f"sidebar_chat_{sender.id}",
+    if message is not None:
+        event = {
+            'type': 'chat_message',
+            'room_id': room_id,
+            'sender_id': sender_id,
+            'message': message
+        }
+    else:
+        event = {
+            'type': 'update_chat_rooms',
+            'room_id': room_id
+        }
+
+    # 발신자와 수신자 사이드바 업데이트 (상대방이 나간 채팅방이면 수신자는 생략)
+    await send_to_sidebars(channel_layer, [sender_id, recipient_id], event)
+
+
+async def send_room_read(user_id, room_id):
+    """채팅방 읽음 처리 시 본인 사이드바의 안 읽은 메시지 수 초기화"""
+    await send_to_sidebars(
+        get_channel_layer(),
+        [user_id],
         {
-            'type': 'chat_message'
+            'type': 'room_read',
+            'room_id': room_id
         }
     )
-    
-    # 수신자 사이드바 업데이트
+
+
+async def send_read_receipt(room_id, user_id, watermark):
+    """읽음 watermark가 이동했을 때 채팅방 참여자들에게 읽음 확인 전송"""
+    last_read_message_id, last_read_at = watermark
+    channel_layer = get_channel_layer()
     await channel_layer.group_send(
-        f"sidebar_chat_{recipient.id}",
+        f"chat_room_{room_id}",
+        {
+            'type': 'read_receipt',
+            'user_id': user_id,
+            'last_read_message_id': last_read_message_id,
+            'last_read_at': last_read_at.isoformat()
+        }
+    )
+
+
+@database_sync_to_async
+def _get_profile_audience(user_id):
+    """사용자의 채팅방 ID와 채팅 상대 ID"""
+    room_ids = list(ChatParticipant.objects.filter(user_id=user_id).values_list('room_id', flat=True))
+    partner_ids = set(
+        ChatParticipant.objects.filter(room_id__in=room_ids).exclude(user_id=user_id).values_list('user_id', flat=True)
+    )
+    user = User.objects.filter(id=user_id).only('id', 'username', 'image', 'image_variants', 'updated_at').first()
+    return user, room_ids, partner_ids
+
+
+async def send_profile_image_update(user_id):
+    """프로필 이미지 처리가 끝났을 때 친구, 채팅방, 채팅 상대 사이드바에 새 이미지 알림"""
+    user, room_ids, partner_ids = await _get_profile_audience(user_id)
+    if user is None:
+        return
+    channel_layer = get_channel_layer()
+
+    # 친구들의 UserStatusConsumer (접속 상태와 함께 새 avatar 전달)
+    await fanout.publish_user_event(
+        channel_layer,
+        user_id,
+        {
+            'type': 'status_message',
+            'message': '프로필 이미지가 변경되었습니다.',
+            'is_online': await database_sync_to_async(presence.is_online)(user_id),
+            'user_id': user_id,
+            'username': user.username,
+            'profile_image_url': images.image_url(user, 'avatar'),
+            'updated_at': user.updated_at.isoformat()
+        }
+    )
+
+    for room_id in room_ids:
+        await channel_layer.group_send(
+            f"chat_room_{room_id}",
+            {
+                'type': 'profile_image_update',
+                'user_id': user_id,
+            }
+        )
+
+    await send_to_sidebars(
+        channel_layer,
+        partner_ids,
         {
-            'type': 'chat_message'
+            'type': 'profile_image_update',
+            'user_id': user_id,
+            'profile_image_url': images.image_url(user, 'sidebar'),
         }
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,173 @@
+"""
+벤치마크 명령(bench_websocket, bench_endpoints) 공용 도구
+
+결과는 git 리비전과 함께 JSON으로 저장하고, --compare로 이전 결과와 비교해
+지정한 비율 이상 나빠진 지표를 회귀로 보고한다.
+"""
+
+import json
+import math
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# 비교 시 지표 방향 (값이 작을수록 좋은 지표 / 클수록 좋은 지표)
+LOWER_IS_BETTER = 'lower'
+HIGHER_IS_BETTER = 'higher'
+
+
+def percentile(values, pct):
+    """정렬된 값의 백분위수 (nearest-rank)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """지연 시간 목록 요약 (ms)"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class QueryCounter:
+    """
+    모든 스레드의 DB 쿼리 수와 실행 시간 집계
+
+    database_sync_to_async는 별도 스레드의 연결을 사용하므로 CaptureQueriesContext 대신
+    현재 스레드의 연결과 이후 새로 열리는 연결 모두에 execute wrapper를 붙인다.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.active = False
+        self._lock = threading.Lock()
+        self._wrapped = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if self.active:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.count += 1
+                    self.duration += elapsed
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        self._wrap(connection)
+
+    def _wrap(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self._wrapped.append(connection)
+
+    def install(self):
+        for connection in connections.all():
+            self._wrap(connection)
+        connection_created.connect(self._on_connection_created)
+
+    def uninstall(self):
+        connection_created.disconnect(self._on_connection_created)
+        for connection in self._wrapped:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+        self._wrapped = []
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.duration = 0.0
+
+    def __enter__(self):
+        self.install()
+        self.active = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.active = False
+        self.uninstall()
+
+
+def default_output_path(name):
+    revision = git_revision() or 'unknown'
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return os.path.join(settings.BASE_DIR, 'bench_results', f"{name}-{revision}-{timestamp}.json")
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def lookup(results, path):
+    """'latency_ms.p99' 같은 점 표기 경로로 값 조회"""
+    value = results
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare_results(current, baseline, metrics, max_regression=None):
+    """
+    지표별 변화율 계산
+
+    metrics: {경로: LOWER_IS_BETTER | HIGHER_IS_BETTER}
+    반환: [(경로, 기준값, 현재값, 변화율(%), 회귀 여부)]
+    """
+    rows = []
+    for path, direction in metrics.items():
+        base, cur = lookup(baseline, path), lookup(current, path)
+        if base is None or cur is None:
+            continue
+        change = ((cur - base) / base * 100) if base else 0.0
+        worse = change > 0 if direction == LOWER_IS_BETTER else change < 0
+        regressed = max_regression is not None and worse and abs(change) > max_regression
+        rows.append((path, base, cur, change, regressed))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for path, base, cur, change, regressed in rows:
+        mark = '  REGRESSION' if regressed else ''
+        lines.append(f"{path:<40} {base:>12.3f} {cur:>12.3f} {change:>8.1f}%{mark}")
+    return '\n'.join(lines)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from chat.models import ChatRoom, ChatMessage, ChatParticipant
+
+
+class Command(BaseCommand):
+    help = '기존 채팅방의 마지막 메시지 포인터, 참여자별 읽음 watermark와 안 읽은 메시지 수를 채웁니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='특정 채팅방만 처리')
+
+    def handle(self, *args, **options):
+        rooms = ChatRoom.objects.order_by('id').values_list('id', flat=True)
+        if options.get('room'):
+            rooms = rooms.filter(id=options['room'])
+
+        processed = 0
+        for room_id in rooms.iterator():
+            self.backfill_room(room_id)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{processed}개 채팅방 요약 정보를 갱신했습니다.'))
+
+    @transaction.atomic
+    def backfill_room(self, room_id):
+        last_message_id = ChatMessage.objects.filter(room_id=room_id).order_by(
+            '-created_at', '-id'
+        ).values_list('id', flat=True).first()
+        ChatRoom.objects.filter(id=room_id).update(last_message_id=last_message_id)
+
+        # 보낸 사람별 안 읽은 메시지 수를 한 번에 집계한 뒤 참여자별로 계산
+        unread_by_sender = dict(
+            ChatMessage.objects.filter(room_id=room_id, is_read=False)
+            .values_list('sender_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        total_unread = sum(unread_by_sender.values())
+
+        for membership in ChatParticipant.objects.select_for_update().filter(room_id=room_id):
+            membership.unread_count = total_unread - unread_by_sender.get(membership.user_id, 0)
+
+            # 기존 is_read 값으로 읽음 watermark 계산 (상대방이 보낸 메시지 중 마지막으로 읽은 메시지)
+            last_read = ChatMessage.objects.filter(room_id=room_id, is_read=True).exclude(
+                sender_id=membership.user_id
+            ).order_by('-created_at', '-id').values_list('id', 'created_at').first()
+            if last_read:
+                membership.last_read_message_id, membership.last_read_at = last_read
+
+            membership.save(update_fields=['unread_count', 'last_read_message_id', 'last_read_at'])
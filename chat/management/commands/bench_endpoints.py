@@ -0,0 +1,202 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chat.models import ChatMessage, ChatParticipant, ChatRoom
+from chat.utils import record_new_messages
+from user import friend_graph
+from user.models import Friendship, User
+
+from ._bench_utils import (
+    LOWER_IS_BETTER, compare_results, default_output_path, format_comparison,
+    git_revision, load_results, save_results,
+)
+
+# 측정할 엔드포인트 (이름: 데이터에서 URL을 만드는 함수)
+ENDPOINTS = {
+    'direct_room_list': lambda data: reverse('chat:direct_room_list'),
+    'direct_room_messages': lambda data: reverse('chat:direct_room_messages', args=[data['busy_room_id']]),
+    'friend_list': lambda data: reverse('user:friend_list'),
+    'sent_friend_requests': lambda data: reverse('user:sent_friend_request_list'),
+    'received_friend_requests': lambda data: reverse('user:received_friend_request_list'),
+}
+
+
+class RollbackSeed(Exception):
+    """시드 데이터를 되돌리기 위해 트랜잭션을 빠져나갈 때 사용"""
+
+
+class Command(BaseCommand):
+    help = (
+        'REST 엔드포인트 쿼리 수 회귀 검사: 여러 데이터 크기로 사용자, 친구, 채팅방, 메시지를 생성하고 '
+        '엔드포인트별 쿼리 수, DB 시간, 응답 시간을 기록합니다. 쿼리 수가 데이터 크기에 따라 늘어나면 실패합니다.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='5,50,200',
+                            help='쉼표로 구분한 데이터 크기 (친구/친구 요청/채팅방 수, 메시지가 가장 많은 채팅방의 메시지 수)')
+        parser.add_argument('--messages-per-room', type=int, default=3, help='나머지 채팅방의 메시지 수')
+        parser.add_argument('--repeat', type=int, default=3, help='엔드포인트별 반복 요청 수 (첫 요청은 캐시 워밍업)')
+        parser.add_argument('--query-slack', type=int, default=0,
+                            help='가장 작은 크기 대비 허용하는 쿼리 수 증가량')
+        parser.add_argument('--output', help='결과 JSON 경로 (기본: bench_results/endpoints-<rev>-<time>.json)')
+        parser.add_argument('--compare', help='비교할 이전 결과 JSON 경로')
+        parser.add_argument('--max-regression', type=float,
+                            help='--compare 시 이 비율(%%) 이상 나빠진 지표가 있으면 실패')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError('--sizes는 쉼표로 구분한 정수여야 합니다.')
+        if len(sizes) < 2 or sizes[0] < 1:
+            raise CommandError('--sizes에는 1 이상의 크기가 두 개 이상 필요합니다.')
+
+        endpoints = {name: {} for name in ENDPOINTS}
+        for size in sizes:
+            for name, measurement in self.measure_size(size, options).items():
+                endpoints[name][str(size)] = measurement
+
+        failures = []
+        for name, by_size in endpoints.items():
+            smallest, largest = by_size[str(sizes[0])], by_size[str(sizes[-1])]
+            if largest['queries'] > smallest['queries'] + options['query_slack']:
+                failures.append(
+                    f"{name}: 쿼리 수가 데이터 크기에 따라 증가 "
+                    f"({sizes[0]} → {smallest['queries']}, {sizes[-1]} → {largest['queries']})"
+                )
+
+        results = {
+            'benchmark': 'endpoints',
+            'revision': git_revision(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'database': connection.vendor,
+            'sizes': sizes,
+            'endpoints': endpoints,
+            'failures': failures,
+        }
+        path = save_results(results, options['output'] or default_output_path('endpoints'))
+
+        self.stdout.write(self.format_table(endpoints, sizes))
+        self.stdout.write(self.style.SUCCESS(f'결과 저장: {path}'))
+
+        if options['compare']:
+            metrics = {
+                f'endpoints.{name}.{size}.{metric}': LOWER_IS_BETTER
+                for name in endpoints for size in sizes for metric in ('queries', 'wall_ms')
+            }
+            rows = compare_results(results, load_results(options['compare']), metrics, options['max_regression'])
+            self.stdout.write(format_comparison(rows))
+            if any(row[4] for row in rows):
+                failures.append('이전 결과 대비 성능 회귀가 감지되었습니다.')
+
+        if failures:
+            raise CommandError('\n'.join(failures))
+
+    def measure_size(self, size, options):
+        """크기별 데이터를 트랜잭션 안에서 생성하고 측정한 뒤 롤백"""
+        measurements = {}
+        created_user_ids = []
+        try:
+            with transaction.atomic():
+                data = self.seed(size, options['messages_per_room'])
+                created_user_ids = data['user_ids']
+                client = APIClient()
+                client.force_authenticate(user=data['user'])
+                for name, build_url in ENDPOINTS.items():
+                    measurements[name] = self.measure(client, build_url(data), options['repeat'])
+                raise RollbackSeed()
+        except RollbackSeed:
+            pass
+        finally:
+            # 롤백된 사용자의 친구 그래프가 Redis에 남지 않도록 제거
+            if created_user_ids:
+                friend_graph.invalidate(*created_user_ids)
+        return measurements
+
+    def measure(self, client, url, repeat):
+        runs = []
+        for _ in range(max(1, repeat)):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url, secure=True)
+                wall = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'{url} 응답 코드 {response.status_code}: {response.content[:200]!r}')
+            runs.append({
+                'queries': len(context.captured_queries),
+                'db_ms': sum(float(query['time']) for query in context.captured_queries) * 1000,
+                'wall_ms': wall * 1000,
+            })
+        warm = runs[1:] or runs
+        return {
+            'cold_queries': runs[0]['queries'],
+            'queries': max(run['queries'] for run in warm),
+            'db_ms': statistics.median(run['db_ms'] for run in warm),
+            'wall_ms': statistics.median(run['wall_ms'] for run in warm),
+            'response_bytes': len(response.content),
+        }
+
+    def seed(self, size, messages_per_room):
+        """size명의 친구(각각 1대1 채팅방), 보낸/받은 친구 요청 size건, 메시지 size건인 채팅방 생성"""
+        prefix = f"bench_ep_{uuid.uuid4().hex[:8]}_"
+        users = []
+        for i in range(size * 3 + 1):
+            user = User(email=f'{prefix}{i}@bench.local', username=f'{prefix}{i}')
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users)
+        me, friends = users[0], users[1:size + 1]
+        sent_to, received_from = users[size + 1:2 * size + 1], users[2 * size + 1:]
+
+        Friendship.objects.bulk_create(
+            [Friendship(from_user=me, to_user=friend, accepted=True) for friend in friends]
+            + [Friendship(from_user=me, to_user=user) for user in sent_to]
+            + [Friendship(from_user=user, to_user=me) for user in received_from]
+        )
+
+        rooms = ChatRoom.objects.bulk_create([ChatRoom(room_type='direct') for _ in friends])
+        ChatParticipant.objects.bulk_create(
+            [ChatParticipant(room=room, user=me) for room in rooms]
+            + [ChatParticipant(room=room, user=friend) for room, friend in zip(rooms, friends)]
+        )
+
+        now = timezone.now()
+        messages = []
+        for index, (room, friend) in enumerate(zip(rooms, friends)):
+            count = size if index == 0 else messages_per_room
+            for k in range(count):
+                sender = friend if k % 2 else me
+                messages.append(ChatMessage(
+                    room=room,
+                    sender=sender,
+                    content=f'bench message {k}',
+                    created_at=now - timedelta(seconds=count - k)
+                ))
+        messages = ChatMessage.objects.bulk_create(messages)
+        record_new_messages(messages)
+
+        return {
+            'user': me,
+            'user_ids': [user.id for user in users],
+            'busy_room_id': rooms[0].id,
+        }
+
+    def format_table(self, endpoints, sizes):
+        header = f"{'endpoint':<28}" + ''.join(f"{'size ' + str(size):>22}" for size in sizes)
+        lines = [header, f"{'':<28}" + ''.join(f"{'queries / db ms / ms':>22}" for _ in sizes)]
+        for name, by_size in endpoints.items():
+            cells = ''.join(
+                f"{by_size[str(size)]['queries']:>6} /{by_size[str(size)]['db_ms']:>6.1f} /{by_size[str(size)]['wall_ms']:>6.1f}"
+                for size in sizes
+            )
+            lines.append(f"{name:<28}{cells}")
+        return '\n'.join(lines)
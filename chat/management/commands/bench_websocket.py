@@ -0,0 +1,240 @@
+import asyncio
+import json
+import time
+import tracemalloc
+import uuid
+
+import msgpack
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.message_buffer import get_message_buffer, is_write_behind_enabled
+from chat.models import ChatMessage, ChatParticipant, ChatRoom
+from realtime.protocol import MSGPACK_SUBPROTOCOL
+from user.models import Friendship, User
+from user.serializers import CustomObtainPairSerializer
+
+from ._bench_utils import (
+    HIGHER_IS_BETTER, LOWER_IS_BETTER, QueryCounter, compare_results, default_output_path,
+    format_comparison, git_revision, load_results, save_results, summarize,
+)
+
+# --compare 시 비교할 지표
+COMPARED_METRICS = {
+    'latency_ms.p50': LOWER_IS_BETTER,
+    'latency_ms.p99': LOWER_IS_BETTER,
+    'messages_per_second': HIGHER_IS_BETTER,
+    'db_queries_per_message': LOWER_IS_BETTER,
+    'memory_per_connection_kb': LOWER_IS_BETTER,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'WebSocket 부하 테스트: N명의 사용자가 상태/사이드바/채팅방 소켓을 연결하고 메시지를 주고받으며 '
+        '전달 지연 백분위수, 초당 메시지 수, 메시지당 DB 쿼리 수, 연결당 메모리를 측정합니다.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='동시 사용자 수 (2명씩 1대1 채팅방 구성)')
+        parser.add_argument('--messages', type=int, default=20, help='사용자당 보낼 메시지 수')
+        parser.add_argument('--rate', type=float, default=5.0, help='사용자당 초당 메시지 수')
+        parser.add_argument('--layer', choices=['inmemory', 'settings'], default='inmemory',
+                            help='채널 레이어 (inmemory: 프로세스 내, settings: CHANNEL_LAYERS 설정 사용)')
+        parser.add_argument('--msgpack', action='store_true', help='MessagePack 서브프로토콜 사용')
+        parser.add_argument('--fanout', choices=['groups', 'inbox'],
+                            help='상태 이벤트 fan-out 방식 (기본: CHAT_FANOUT_MODE 설정)')
+        parser.add_argument('--timeout', type=float, default=30.0, help='전송 완료 후 전달을 기다리는 최대 시간 (초)')
+        parser.add_argument('--output', help='결과 JSON 경로 (기본: bench_results/websocket-<rev>-<time>.json)')
+        parser.add_argument('--compare', help='비교할 이전 결과 JSON 경로')
+        parser.add_argument('--max-regression', type=float,
+                            help='--compare 시 이 비율(%%) 이상 나빠진 지표가 있으면 실패')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['users'] % 2:
+            raise CommandError('--users는 2 이상의 짝수여야 합니다.')
+
+        if options['layer'] == 'inmemory':
+            settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+            channel_layers.backends = {}
+        if options['fanout']:
+            settings.CHAT_FANOUT_MODE = options['fanout']
+
+        from chat_project.asgi import application
+
+        prefix = f"bench_ws_{uuid.uuid4().hex[:8]}_"
+        clients = self.seed(prefix, options['users'])
+        try:
+            results = asyncio.run(self.run_benchmark(application, clients, options))
+        finally:
+            self.cleanup(prefix)
+
+        results.update({
+            'benchmark': 'websocket',
+            'revision': git_revision(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'options': {key: options[key] for key in ('users', 'messages', 'rate', 'layer', 'msgpack')},
+            'write_behind': is_write_behind_enabled(),
+            'fanout': getattr(settings, 'CHAT_FANOUT_MODE', 'groups'),
+        })
+        path = save_results(results, options['output'] or default_output_path('websocket'))
+
+        self.stdout.write(json.dumps(results, indent=2, default=str))
+        self.stdout.write(self.style.SUCCESS(f'결과 저장: {path}'))
+
+        if options['compare']:
+            rows = compare_results(results, load_results(options['compare']), COMPARED_METRICS, options['max_regression'])
+            self.stdout.write(format_comparison(rows))
+            if any(row[4] for row in rows):
+                raise CommandError('성능 회귀가 감지되었습니다.')
+
+    def seed(self, prefix, count):
+        """벤치마크용 사용자, 친구 관계, 1대1 채팅방 생성"""
+        users = []
+        for i in range(count):
+            user = User(email=f'{prefix}{i}@bench.local', username=f'{prefix}{i}')
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users)
+
+        clients = []
+        for i in range(0, count, 2):
+            a, b = users[i], users[i + 1]
+            Friendship.objects.create(from_user=a, to_user=b, accepted=True)
+            room = ChatRoom.objects.create(room_type='direct')
+            ChatParticipant.objects.bulk_create([
+                ChatParticipant(room=room, user=a),
+                ChatParticipant(room=room, user=b),
+            ])
+            for user in (a, b):
+                token = str(CustomObtainPairSerializer.get_token(user).access_token)
+                clients.append({'user_id': user.id, 'room_id': room.id, 'token': token})
+        return clients
+
+    def cleanup(self, prefix):
+        user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+        room_ids = list(ChatParticipant.objects.filter(user_id__in=user_ids).values_list('room_id', flat=True))
+        ChatRoom.objects.filter(id__in=room_ids).update(last_message=None)
+        ChatMessage.objects.filter(room_id__in=room_ids).delete()
+        ChatRoom.objects.filter(id__in=room_ids).delete()
+        User.objects.filter(id__in=user_ids).delete()
+
+    async def connect(self, application, path, token, use_msgpack):
+        communicator = WebsocketCommunicator(
+            application,
+            f"{path}?token={token}",
+            headers=[(b'origin', b'http://localhost')],
+            subprotocols=[MSGPACK_SUBPROTOCOL] if use_msgpack else None,
+        )
+        connected, _ = await communicator.connect(timeout=10)
+        if not connected:
+            raise CommandError(f'WebSocket 연결 실패: {path}')
+        return communicator
+
+    async def run_benchmark(self, application, clients, options):
+        use_msgpack = options['msgpack']
+        total_messages = len(clients) * options['messages']
+
+        # 연결당 메모리: 모든 소켓을 연결하는 동안 할당된 Python 메모리
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        connect_started = time.perf_counter()
+        for client in clients:
+            client['status'] = await self.connect(application, '/ws/user/status/', client['token'], use_msgpack)
+            client['sidebar'] = await self.connect(application, '/ws/chat/sidebar/', client['token'], use_msgpack)
+            client['room'] = await self.connect(application, f"/ws/chat/{client['room_id']}/", client['token'], use_msgpack)
+        connect_seconds = time.perf_counter() - connect_started
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        connections = len(clients) * 3
+
+        sent_at = {}
+        latencies = []
+        frame_counts = {'status': 0, 'sidebar': 0, 'room': 0}
+        delivered = asyncio.Event()
+        timing = {'first_send': None, 'last_delivery': None}
+
+        def decode(event):
+            if event.get('bytes') is not None:
+                return msgpack.unpackb(event['bytes'], raw=False)
+            return json.loads(event['text'])
+
+        async def read(client, kind):
+            communicator = client[kind]
+            while True:
+                event = await communicator.receive_output(timeout=3600)
+                if event.get('type') != 'websocket.send':
+                    continue
+                frame_counts[kind] += 1
+                if kind != 'room':
+                    continue
+                payload = decode(event)
+                message = payload.get('message') if payload.get('type') == 'message' else None
+                if not isinstance(message, dict):
+                    continue
+                content = message.get('content', '')
+                sender_id = int(content.split('-')[1]) if content.startswith('bench-') else None
+                # 상대방 소켓에 도착한 시점을 전달 시간으로 측정
+                if sender_id is None or sender_id == client['user_id'] or content not in sent_at:
+                    continue
+                now = time.perf_counter()
+                latencies.append((now - sent_at[content]) * 1000)
+                timing['last_delivery'] = now
+                if len(latencies) >= total_messages:
+                    delivered.set()
+
+        readers = [
+            asyncio.ensure_future(read(client, kind))
+            for client in clients for kind in ('status', 'sidebar', 'room')
+        ]
+
+        async def send(client):
+            interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+            for k in range(options['messages']):
+                content = f"bench-{client['user_id']}-{k}"
+                data = {'type': 'message', 'message': content}
+                sent_at[content] = time.perf_counter()
+                if timing['first_send'] is None:
+                    timing['first_send'] = sent_at[content]
+                if use_msgpack:
+                    await client['room'].send_input({'type': 'websocket.receive', 'bytes': msgpack.packb(data)})
+                else:
+                    await client['room'].send_to(text_data=json.dumps(data))
+                await asyncio.sleep(interval)
+
+        # 연결 직후 초기 메시지(참여자 정보, 채팅방 목록)가 지나가도록 잠시 대기
+        await asyncio.sleep(0.5)
+
+        counter = QueryCounter()
+        with counter:
+            await asyncio.gather(*(send(client) for client in clients))
+            try:
+                await asyncio.wait_for(delivered.wait(), timeout=options['timeout'])
+            except asyncio.TimeoutError:
+                pass
+            if is_write_behind_enabled():
+                await get_message_buffer().drain()
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for client in clients:
+            for kind in ('room', 'sidebar', 'status'):
+                await client[kind].disconnect()
+
+        elapsed = (timing['last_delivery'] or time.perf_counter()) - (timing['first_send'] or time.perf_counter())
+        return {
+            'connections': connections,
+            'connect_seconds': connect_seconds,
+            'messages_sent': total_messages,
+            'messages_delivered': len(latencies),
+            'messages_lost': total_messages - len(latencies),
+            'latency_ms': summarize(latencies),
+            'messages_per_second': len(latencies) / elapsed if elapsed > 0 else None,
+            'db_queries_per_message': counter.count / total_messages if total_messages else None,
+            'db_time_per_message_ms': counter.duration * 1000 / total_messages if total_messages else None,
+            'memory_per_connection_kb': (memory_after - memory_before) / connections / 1024,
+            'frames_received': frame_counts,
+        }
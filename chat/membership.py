@@ -0,0 +1,175 @@
+"""
+채팅방 참여자 캐시 (room_id → 참여자 ID)
+
+프로세스 단위 LRU에 채팅방 종류와 참여자 ID를 보관하고, 컨슈머와 REST 뷰가 함께 사용한다.
+참여자가 바뀌면 시그널에서 Redis의 채팅방 버전(room_members:version:{id})을 올린다.
+각 프로세스는 ROOM_MEMBERSHIP_CHECK_INTERVAL초마다 버전만 다시 확인하고, 버전이 달라졌을
+때만 DB에서 참여자를 다시 읽는다. 같은 프로세스의 변경은 즉시 반영되고 다른 프로세스의
+변경은 최대 그 시간만큼 늦게 반영된다. Redis 장애 시에는 캐시하지 않고 DB에서 직접 조회한다.
+버전을 올리지 못한 변경(INCR 실패)이 계속 남지 않도록, DB에서 읽은 지 ROOM_MEMBERSHIP_MAX_AGE초가
+지난 항목은 버전이 같아도 다시 읽는다.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .models import ChatParticipant, ChatRoom
+
+logger = logging.getLogger(__name__)
+
+
+def _version_key(room_id):
+    return f"room_members:version:{room_id}"
+
+
+class RoomMembership:
+    """캐시된 채팅방 정보 (변경하지 않는 값 객체)"""
+
+    __slots__ = ('room_id', 'room_type', 'participant_ids')
+
+    def __init__(self, room_id, room_type, participant_ids):
+        self.room_id = room_id
+        self.room_type = room_type
+        self.participant_ids = frozenset(participant_ids)
+
+    def has(self, user_id):
+        return user_id in self.participant_ids
+
+    def others(self, user_id):
+        """user_id를 제외한 참여자 ID (정렬)"""
+        return sorted(pid for pid in self.participant_ids if pid != user_id)
+
+    def other(self, user_id):
+        """1대1 채팅방의 상대방 ID (없으면 None)"""
+        others = self.others(user_id)
+        return others[0] if others else None
+
+
+class RoomMembershipCache:
+    def __init__(self, max_size=10000, check_interval=2.0, max_age=60.0):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._entries = OrderedDict()  # room_id -> (version, checked_at, RoomMembership, loaded_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+        }
+
+    def get(self, room_id):
+        """채팅방 정보 반환 (채팅방이 없으면 None)"""
+        room_id = int(room_id)
+        with self._lock:
+            entry = self._entries.get(room_id)
+            if entry is not None and time.monotonic() - entry[1] < self.check_interval:
+                self._entries.move_to_end(room_id)
+                self.hits += 1
+                return entry[2]
+
+        try:
+            version = self._read_version(room_id)
+        except Exception as e:
+            logger.error(f"Room membership version lookup error for room {room_id}: {str(e)}")
+            return self._load_from_db(room_id)
+
+        if entry is not None and entry[0] == version and time.monotonic() - entry[3] < self.max_age:
+            # 버전이 그대로면 DB를 읽지 않고 확인 시각만 갱신
+            self.revalidations += 1
+            self._store(room_id, version, entry[2], loaded_at=entry[3])
+            return entry[2]
+
+        self.misses += 1
+        # 버전을 먼저 읽고 DB를 읽어야, 그 사이의 변경이 이전 버전으로 기록되어 다음 확인 때 다시 읽힘
+        membership = self._load_from_db(room_id)
+        if membership is not None:
+            self._store(room_id, version, membership)
+        return membership
+
+    def peek(self, room_id):
+        """I/O 없이 사용할 수 있는 캐시 항목 (없거나 재확인 시각이 지났으면 None)"""
+        entry = self._entries.get(int(room_id))
+        if entry is None or time.monotonic() - entry[1] >= self.check_interval:
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def invalidate(self, *room_ids):
+        """참여자 변경 시 버전을 올리고 이 프로세스의 항목을 제거"""
+        room_ids = [int(room_id) for room_id in room_ids]
+        with self._lock:
+            for room_id in room_ids:
+                self._entries.pop(room_id, None)
+        if not room_ids:
+            return
+        try:
+            pipe = get_redis_connection("default").pipeline(transaction=False)
+            for room_id in room_ids:
+                pipe.incr(_version_key(room_id))
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Room membership invalidation error for rooms {room_ids}: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _read_version(self, room_id):
+        return int(get_redis_connection("default").get(_version_key(room_id)) or 0)
+
+    def _store(self, room_id, version, membership, loaded_at=None):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[room_id] = (version, now, membership, now if loaded_at is None else loaded_at)
+            self._entries.move_to_end(room_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load_from_db(self, room_id):
+        room_type = ChatRoom.objects.filter(id=room_id).values_list('room_type', flat=True).first()
+        if room_type is None:
+            return None
+        participant_ids = ChatParticipant.objects.filter(room_id=room_id).values_list('user_id', flat=True)
+        return RoomMembership(room_id, room_type, participant_ids)
+
+
+room_membership_cache = RoomMembershipCache(
+    max_size=getattr(settings, 'ROOM_MEMBERSHIP_CACHE_SIZE', 10000),
+    check_interval=getattr(settings, 'ROOM_MEMBERSHIP_CHECK_INTERVAL', 2.0),
+    max_age=getattr(settings, 'ROOM_MEMBERSHIP_MAX_AGE', 60.0),
+)
+
+
+def get_membership(room_id):
+    return room_membership_cache.get(room_id)
+
+
+def get_participant_ids(room_id):
+    membership = room_membership_cache.get(room_id)
+    return membership.participant_ids if membership is not None else frozenset()
+
+
+def is_participant(room_id, user_id):
+    membership = room_membership_cache.get(room_id)
+    return membership is not None and membership.has(user_id)
+
+
+def get_other_participant_id(room_id, user_id):
+    membership = room_membership_cache.get(room_id)
+    return membership.other(user_id) if membership is not None else None
+
+
+def invalidate(*room_ids):
+    room_membership_cache.invalidate(*room_ids)
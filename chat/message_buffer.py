@@ -0,0 +1,277 @@
+import asyncio
+import atexit
+import logging
+import time
+from collections import deque
+
+from metrics.db import database_sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import ChatMessage
+from .utils import record_new_messages
+
+logger = logging.getLogger(__name__)
+
+
+def is_write_behind_enabled():
+    """write-behind 모드 사용 여부 (PK 시퀀스 예약이 필요하므로 PostgreSQL 전용)"""
+    return getattr(settings, 'CHAT_WRITE_BEHIND_ENABLED', False) and connection.vendor == 'postgresql'
+
+
+class MessageWriteBuffer:
+    """
+    채팅 메시지 write-behind 버퍼
+
+    메시지에 ID와 생성 시간을 미리 부여해 바로 브로드캐스트할 수 있게 하고,
+    실제 INSERT는 프로세스당 하나의 flusher가 bulk_create로 묶어서 처리한다.
+    큐는 FIFO로만 비워지므로 채팅방별 메시지 순서가 유지된다.
+
+    ID는 프로세스마다 시퀀스에서 블록 단위로 예약하므로 여러 프로세스 사이에서는 ID 순서가
+    메시지 순서와 같지 않다. 메시지 순서는 항상 (created_at, id)로 판단해야 한다.
+
+    같은 배치가 max_retries번 연속 실패하면 한 건씩 기록해, 제약 조건 위반 등으로 기록할 수
+    없는 메시지만 로그로 남기고 버린다(dead letter). DB 장애처럼 모든 기록이 실패하면 큐에
+    남겨 두고 재시도하며, 큐가 max_pending에 도달하면 add()가 자리가 날 때까지 기다린다.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.05, id_block_size=500, max_retries=3, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block_size = id_block_size
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+
+        self._pending = deque()
+        self._inflight = []
+        self._positions = {}  # 아직 기록되지 않은 메시지 ID -> (room_id, created_at)
+        self._ids = deque()
+        self._id_lock = None
+        self._flush_lock = None
+        self._has_items = None
+        self._batch_full = None
+        self._has_space = None
+        self._task = None
+        self._consecutive_failures = 0
+
+        # 모니터링용 통계
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.failure_count = 0
+        self.dead_letter_count = 0
+        self.backpressure_waits = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    @property
+    def queue_depth(self):
+        """아직 DB에 기록되지 않은 메시지 수"""
+        return len(self._pending) + len(self._inflight)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'flushed_total': self.flushed_total,
+            'flush_count': self.flush_count,
+            'failure_count': self.failure_count,
+            'dead_letter_count': self.dead_letter_count,
+            'backpressure_waits': self.backpressure_waits,
+            'last_flush_latency': self.last_flush_latency,
+            'max_flush_latency': self.max_flush_latency,
+        }
+
+    def pending_position(self, message_id):
+        """아직 기록되지 않은 메시지의 (room_id, created_at) (없으면 None)"""
+        return self._positions.get(message_id)
+
+    async def add(self, message):
+        """메시지에 ID와 생성 시간을 부여하고 쓰기 큐에 추가"""
+        self._ensure_started()
+        # 큐가 가득 차면 flusher가 자리를 만들 때까지 대기 (DB 장애 시 메모리가 계속 늘지 않도록)
+        while self.queue_depth >= self.max_pending:
+            self.backpressure_waits += 1
+            self._has_space.clear()
+            await self._has_space.wait()
+        message.id = await self._next_id()
+        # ID 할당과 시간 지정 사이에 await가 없어야 (created_at, id) 순서가 일치함
+        message.created_at = timezone.now()
+        self._positions[message.id] = (message.room_id, message.created_at)
+        self._pending.append(message)
+
+        self._has_items.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        return message
+
+    async def drain(self):
+        """대기 중인 메시지를 모두 기록"""
+        while self.queue_depth:
+            await self._flush_batch()
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        if self._pending:
+            self._has_items.set()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _next_id(self):
+        if not self._ids:
+            async with self._id_lock:
+                if not self._ids:
+                    self._ids.extend(await database_sync_to_async(self._reserve_ids)())
+        return self._ids.popleft()
+
+    def _reserve_ids(self):
+        """PK 시퀀스에서 ID 블록을 한 번에 예약"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [ChatMessage._meta.db_table, self.id_block_size],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            # 배치가 가득 차거나 flush_interval이 지날 때까지 모아서 기록
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush_batch()
+
+    async def _flush_batch(self):
+        # flusher와 drain()이 동시에 기록하지 않도록 직렬화
+        async with self._flush_lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self):
+        count = min(len(self._pending), self.batch_size)
+        self._inflight = [self._pending.popleft() for _ in range(count)]
+        if not self._pending:
+            self._has_items.clear()
+        self._batch_full.clear()
+        if not self._inflight:
+            return
+
+        started = time.monotonic()
+        try:
+            if self._consecutive_failures >= self.max_retries:
+                # 같은 배치가 계속 실패하면 한 건씩 기록해 문제 있는 메시지만 걸러냄
+                written, remaining = await database_sync_to_async(self._write_one_by_one)(self._inflight)
+            else:
+                await database_sync_to_async(self._write)(self._inflight)
+                written, remaining = self._inflight, []
+        except Exception as e:
+            written, remaining = [], self._inflight
+            logger.error(f"채팅 메시지 일괄 저장 실패 ({len(self._inflight)}건): {str(e)}")
+
+        try:
+            remaining_ids = {message.id for message in remaining}
+            for message in self._inflight:
+                if message.id not in remaining_ids:
+                    self._positions.pop(message.id, None)
+            if remaining:
+                # 기록하지 못한 메시지는 순서를 유지한 채 큐 앞쪽으로 되돌리고 잠시 후 재시도
+                self.failure_count += 1
+                self._consecutive_failures += 1
+                self._pending.extendleft(reversed(remaining))
+                self._has_items.set()
+                await asyncio.sleep(min(1.0, self.flush_interval * (2 ** min(self._consecutive_failures, 5))))
+            else:
+                latency = time.monotonic() - started
+                self._consecutive_failures = 0
+                self.flush_count += 1
+                self.last_flush_latency = latency
+                self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.flushed_total += len(written)
+        finally:
+            self._inflight = []
+            if self.queue_depth < self.max_pending:
+                self._has_space.set()
+
+    def _write(self, messages, skip_existing=False):
+        with transaction.atomic():
+            if skip_existing:
+                # 이미 기록된 메시지는 요약(안 읽은 수, 마지막 메시지)에 다시 반영하지 않도록 제외
+                existing = set(
+                    ChatMessage.objects.filter(id__in=[message.id for message in messages]).values_list('id', flat=True)
+                )
+                messages = [message for message in messages if message.id not in existing]
+                if not messages:
+                    return
+            ChatMessage.objects.bulk_create(messages)
+            record_new_messages(messages)
+
+    def _write_one_by_one(self, messages, skip_existing=False):
+        """
+        메시지를 한 건씩 기록하고 (기록된 메시지, 다시 시도할 메시지) 반환
+
+        데이터 자체의 문제(IntegrityError, DataError)로 실패한 메시지는 dead letter로 로그에 남기고
+        버린다. 그 밖의 오류(연결 끊김 등)가 나면 그 메시지부터 남은 메시지를 모두 다시 시도한다.
+        """
+        written = []
+        for index, message in enumerate(messages):
+            try:
+                self._write([message], skip_existing=skip_existing)
+            except (IntegrityError, DataError) as e:
+                self.dead_letter_count += 1
+                logger.error(
+                    f"채팅 메시지 저장 불가로 폐기 (dead letter): id={message.id} room={message.room_id} "
+                    f"sender={message.sender_id} created_at={message.created_at.isoformat()} "
+                    f"content={message.content!r}: {str(e)}"
+                )
+            except Exception as e:
+                logger.error(f"채팅 메시지 개별 저장 실패 (id={message.id}): {str(e)}")
+                return written, messages[index:]
+            else:
+                written.append(message)
+        return written, []
+
+    def flush_sync(self):
+        """프로세스 종료 시 남은 메시지를 동기적으로 모두 기록"""
+        messages = self._inflight + list(self._pending)
+        if not messages:
+            return
+        try:
+            # 종료 직전 처리 중이던 배치가 이미 기록됐을 수 있으므로 기록된 메시지는 건너뜀
+            for start in range(0, len(messages), self.batch_size):
+                batch = messages[start:start + self.batch_size]
+                try:
+                    self._write(batch, skip_existing=True)
+                except (IntegrityError, DataError):
+                    # 기록할 수 없는 메시지가 섞인 배치는 한 건씩 기록
+                    self._write_one_by_one(batch, skip_existing=True)
+            self._pending.clear()
+            self._inflight = []
+            self._positions.clear()
+            logger.info(f"종료 전 채팅 메시지 {len(messages)}건 저장 완료")
+        except Exception as e:
+            logger.error(f"종료 전 채팅 메시지 저장 실패 ({len(messages)}건): {str(e)}")
+
+
+_message_buffer = None
+
+
+def get_message_buffer():
+    """프로세스 단위 write-behind 버퍼 반환"""
+    global _message_buffer
+    if _message_buffer is None:
+        _message_buffer = MessageWriteBuffer(
+            batch_size=getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 200),
+            flush_interval=getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.05),
+            id_block_size=getattr(settings, 'CHAT_WRITE_BEHIND_ID_BLOCK_SIZE', 500),
+            max_retries=getattr(settings, 'CHAT_WRITE_BEHIND_MAX_RETRIES', 3),
+            max_pending=getattr(settings, 'CHAT_WRITE_BEHIND_MAX_PENDING', 10000),
+        )
+        atexit.register(_message_buffer.flush_sync)
+    return _message_buffer
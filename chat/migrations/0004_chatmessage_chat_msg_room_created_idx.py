@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_alter_chatmessage_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'created_at', 'id'], name='chat_msg_room_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_chatparticipant_chatroom_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatparticipant',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
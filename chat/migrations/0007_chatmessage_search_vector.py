@@ -0,0 +1,88 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:00
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# 한국어는 형태소 사전이 없으므로 'simple' 설정으로 어절 단위 색인을 만들고,
+# 조사가 붙은 어절 등 부분 문자열 검색은 pg_trgm 인덱스로 처리한다.
+# (pg_trgm이 한글을 색인하려면 DB가 UTF-8 로케일이어야 함)
+# icontains는 UPPER("content"::text) LIKE UPPER(...)로 변환되므로 trigram 인덱스도 같은 식으로 만든다.
+CREATE_TRIGGER_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION chat_message_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple', coalesce(NEW.content, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER chat_message_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF content ON chat_chatmessage
+    FOR EACH ROW EXECUTE FUNCTION chat_message_search_vector_update();
+    """,
+]
+
+CREATE_INDEX_SQL = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_msg_search_idx ON chat_chatmessage USING gin (search_vector);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_msg_content_trgm_idx "
+    "ON chat_chatmessage USING gin ((UPPER(content::text)) gin_trgm_ops);",
+]
+
+DROP_SEARCH_SQL = [
+    "DROP INDEX IF EXISTS chat_msg_content_trgm_idx;",
+    "DROP INDEX IF EXISTS chat_msg_search_idx;",
+    "DROP TRIGGER IF EXISTS chat_message_search_vector_trigger ON chat_chatmessage;",
+    "DROP FUNCTION IF EXISTS chat_message_search_vector_update();",
+]
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+    # 기존 메시지 색인. 마이그레이션이 atomic이 아니므로 id 구간마다 따로 커밋되어
+    # 행 잠금은 구간 하나를 처리하는 동안만 유지된다.
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    last_id = ChatMessage.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(
+            "UPDATE chat_chatmessage SET search_vector = to_tsvector('simple', coalesce(content, '')) "
+            "WHERE id >= %s AND id < %s",
+            [start, start + BACKFILL_BATCH_SIZE],
+        )
+
+    # 색인이 채워진 뒤 쓰기를 막지 않고 인덱스 생성
+    for sql in CREATE_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SEARCH_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # 백필 구간별 커밋과 CREATE INDEX CONCURRENTLY를 위해 트랜잭션 밖에서 실행
+    atomic = False
+
+    dependencies = [
+        ('chat', '0006_chatparticipant_read_watermark'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
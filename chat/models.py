@@ -1,16 +1,51 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 from user.models import User
 
+class ChatRoomQuerySet(models.QuerySet):
+    def with_summary(self, user):
+        """
+        채팅방 목록용: 한 번의 쿼리로 마지막 메시지, 사용자의 안 읽은 메시지 수, 상대방 ID를 함께 조회
+
+        마지막 메시지는 비정규화된 last_message 포인터를 join하므로 메시지 기록을 읽지 않고,
+        참여자는 상대방 ID만 subquery로 가져오므로 메모리 사용량은 채팅방 수에만 비례한다.
+        """
+        user_id = getattr(user, 'pk', user)
+        unread_count = ChatParticipant.objects.filter(
+            room=OuterRef('pk'),
+            user_id=user_id
+        ).values('unread_count')[:1]
+        other_participant = ChatParticipant.objects.filter(
+            room=OuterRef('pk')
+        ).exclude(user_id=user_id).order_by('user_id').values('user_id')[:1]
+        return self.select_related('last_message').defer('last_message__search_vector').annotate(
+            my_unread_count=Subquery(unread_count),
+            other_participant_id=Subquery(other_participant)
+        )
+
+
 class ChatRoom(models.Model):
     ROOM_TYPES = (
         ('direct', 'Direct Message'),
         ('group', 'Group Chat')
     )
     room_type = models.CharField(max_length=10, choices=ROOM_TYPES, default='direct')
-    participants = models.ManyToManyField(User, related_name='chat_rooms')
+    participants = models.ManyToManyField(User, through='ChatParticipant', related_name='chat_rooms')
+    # 목록 조회 시 메시지 테이블을 읽지 않도록 마지막 메시지를 비정규화하여 저장
+    last_message = models.ForeignKey(
+        'ChatMessage',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ChatRoomQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
 
@@ -25,15 +60,48 @@ class ChatRoom(models.Model):
             return ', '.join([participant.username for participant in self.participants.all()])
 
 
+class ChatParticipant(models.Model):
+    """채팅방 참여자 (기존 participants 중계 테이블을 그대로 사용)"""
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='memberships', db_column='chatroom_id')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memberships', db_column='user_id')
+    unread_count = models.PositiveIntegerField(default=0)
+    # 읽음 watermark: 이 메시지의 (created_at, id)까지 읽음
+    # write-behind 모드에서는 아직 기록되지 않은 메시지를 가리킬 수 있으므로 FK를 사용하지 않음
+    last_read_message_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'chat_chatroom_participants'
+        unique_together = [('room', 'user')]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.room_id} (unread {self.unread_count})"
+
+
+class ChatMessageManager(models.Manager):
+    def get_queryset(self):
+        # 검색 전용 컬럼은 일반 조회에서 읽지 않음
+        return super().get_queryset().defer('search_vector')
+
+
 class ChatMessage(models.Model):
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # write-behind 모드에서는 브로드캐스트 시점에 시간을 미리 지정하므로 auto_now_add 대신 default 사용
+    created_at = models.DateTimeField(default=timezone.now)
     is_read = models.BooleanField(default=False)
+    # 전문 검색용 tsvector (DB 트리거가 INSERT/UPDATE 시 자동으로 채움)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ChatMessageManager()
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # 채팅 기록 keyset 페이지네이션용 인덱스
+            models.Index(fields=['room', 'created_at', 'id'], name='chat_msg_room_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.content[:50]}"
\ No newline at end of file
@@ -0,0 +1,88 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    """메시지의 (created_at, id)를 커서 문자열로 변환"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """커서 문자열을 (created_at, id)로 변환"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, binascii.Error, UnicodeError):
+        raise InvalidCursor("잘못된 커서입니다.")
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """limit 쿼리 파라미터 검증"""
+    if value in (None, ''):
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("limit은 숫자여야 합니다.")
+    return max(1, min(size, maximum))
+
+
+def paginate_messages(queryset, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    (created_at, id) 기준 keyset 페이지네이션
+
+    커서가 없으면 가장 최근 메시지 limit개, before가 있으면 그 이전 메시지,
+    after가 있으면 그 이후 메시지를 가져온다. (room_id, created_at, id) 인덱스를
+    따라 limit + 1개만 읽으므로 채팅 기록 길이와 관계없이 비용이 일정하다.
+    after 모드의 has_older는 커서 이전 메시지가 있는지 EXISTS 쿼리 한 번으로 확인한다.
+    before와 after는 함께 사용할 수 없다(InvalidCursor).
+    반환되는 메시지는 항상 오래된 순으로 정렬된다.
+    """
+    if before and after:
+        raise InvalidCursor("before와 after는 함께 사용할 수 없습니다.")
+    if after:
+        created_at, message_id = decode_cursor(after)
+        # created_at__gte 조건은 인덱스 범위 검색을 위해 중복으로 추가
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(id__gt=message_id))
+            .order_by('created_at', 'id')[:limit + 1]
+        )
+        has_newer = len(rows) > limit
+        rows = rows[:limit]
+        # 커서와 첫 행 사이에는 메시지가 없으므로 커서 위치까지의 메시지만 확인
+        has_older = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lte=message_id)
+        ).exists()
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=message_id)
+            )
+        rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        has_newer = bool(before)
+
+    return {
+        'messages': rows,
+        'has_older': has_older,
+        'has_newer': has_newer,
+        'before_cursor': encode_cursor(rows[0]) if rows and has_older else None,
+        # 최신 페이지에서도 이후 새 메시지를 이어서 받을 수 있도록 항상 제공
+        'after_cursor': encode_cursor(rows[-1]) if rows else after,
+    }
@@ -0,0 +1,120 @@
+"""
+Redis 기반 채팅 상대 캐시
+
+사용자별로 같은 채팅방에 참여 중인 다른 사용자 ID를 set(chat_partners:user:{id})에 저장한다.
+친구 그래프(user/friend_graph.py)와 같은 방식으로, 처음 조회할 때 DB에서 한 번 읽어 임시 키에
+채운 뒤 DB를 읽기 전의 버전(chat_partners:version:{id})이 그대로일 때만 RENAME으로 교체한다.
+참여자가 바뀌면 채팅방 참여자 캐시와 함께 시그널에서 커밋 후 관련 사용자 set을 지우고 버전을
+올린다(나간 사용자는 다른 채팅방에서 여전히 상대일 수 있어 증분으로 빼지 않음). 빈 목록과 아직 읽지
+않은 상태를 구분하기 위해 set에는 항상 표시용 멤버(_LOADED)가 들어 있다. Redis 장애 시에는
+DB에서 직접 조회한다.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .models import ChatParticipant
+
+logger = logging.getLogger(__name__)
+
+_LOADED = '-'
+
+# DB를 읽기 전의 버전이 그대로일 때만 임시 키를 실제 키로 교체 (아니면 임시 키 폐기)
+_STORE_IF_CURRENT = """
+if (redis.call('GET', KEYS[3]) or '0') == ARGV[1] then
+    redis.call('RENAME', KEYS[2], KEYS[1])
+    return 1
+end
+redis.call('DEL', KEYS[2])
+return 0
+"""
+
+
+def get_ttl():
+    return getattr(settings, 'CHAT_PARTNER_CACHE_TTL', 86400)
+
+
+def _key(user_id):
+    return f"chat_partners:user:{user_id}"
+
+
+def _version_key(user_id):
+    return f"chat_partners:version:{user_id}"
+
+
+def _load_from_db(user_id):
+    room_ids = ChatParticipant.objects.filter(user_id=user_id).values('room_id')
+    return set(
+        ChatParticipant.objects.filter(room_id__in=room_ids)
+        .exclude(user_id=user_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def _to_ids(members):
+    return {int(member) for member in members if member != _LOADED.encode()}
+
+
+def _load(redis, user_id):
+    """DB에서 읽어 캐시를 채우고 채팅 상대 ID set 반환"""
+    # 버전을 먼저 읽어야 DB를 읽는 동안의 변경을 알아챌 수 있음
+    version = int(redis.get(_version_key(user_id)) or 0)
+    partner_ids = _load_from_db(user_id)
+
+    temp_key = f"{_key(user_id)}:loading:{uuid.uuid4().hex}"
+    pipe = redis.pipeline()
+    pipe.sadd(temp_key, _LOADED, *partner_ids)
+    pipe.expire(temp_key, get_ttl())
+    pipe.execute()
+    store_if_current = redis.register_script(_STORE_IF_CURRENT)
+    store_if_current(keys=[_key(user_id), temp_key, _version_key(user_id)], args=[version])
+    return partner_ids
+
+
+def get_partner_ids(user_id):
+    """같은 채팅방에 참여 중인 다른 사용자 ID set (캐시에 없으면 DB에서 채움)"""
+    try:
+        redis = get_redis_connection("default")
+        members = redis.smembers(_key(user_id))
+        if not members:
+            return _load(redis, user_id)
+        return _to_ids(members)
+    except Exception as e:
+        logger.error(f"Chat partner lookup error for user {user_id}: {str(e)}")
+        return _load_from_db(user_id)
+
+
+def get_cached_partner_ids(user_id):
+    """캐시된 채팅 상대 ID set (캐시에 없거나 Redis 장애 시 None, DB 조회 없음)"""
+    try:
+        members = get_redis_connection("default").smembers(_key(user_id))
+    except Exception as e:
+        logger.error(f"Chat partner cache lookup error for user {user_id}: {str(e)}")
+        return None
+    return _to_ids(members) if members else None
+
+
+def invalidate(*user_ids):
+    """캐시를 지우고 버전을 올림 (다음 조회 때 DB에서 다시 채움)"""
+    if not user_ids:
+        return
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        for user_id in user_ids:
+            pipe.incr(_version_key(user_id))
+            pipe.expire(_version_key(user_id), get_ttl())
+            pipe.delete(_key(user_id))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Chat partner invalidate error for users {user_ids}: {str(e)}")
+
+
+def invalidate_rooms(room_ids, user_ids=()):
+    """채팅방 참여자 변경 시 현재 참여자와 user_ids(나간 사용자 등)의 캐시 제거"""
+    affected = set(user_ids) | set(
+        ChatParticipant.objects.filter(room_id__in=room_ids).values_list('user_id', flat=True)
+    )
+    invalidate(*affected)
@@ -0,0 +1,57 @@
+import html
+import re
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import ChatMessage, ChatParticipant
+from .pagination import paginate_messages
+
+MAX_QUERY_LENGTH = 100
+
+
+def search_messages(user, query, before=None, limit=20):
+    """
+    사용자가 참여한 채팅방의 메시지 검색 (최신순, keyset 페이지네이션)
+
+    PostgreSQL에서는 tsvector GIN 인덱스(어절 일치)와 pg_trgm GIN 인덱스(부분 문자열)를
+    함께 사용한다. 메시지 내용은 escape되어 저장되므로 검색어도 같은 방식으로 변환한다.
+    """
+    term = escape(query.strip())
+    room_ids = ChatParticipant.objects.filter(user=user).values('room_id')
+    # 보낸 사람 정보는 시리얼라이저가 프로필 스냅샷 캐시에서 한 번에 조회
+    queryset = ChatMessage.objects.filter(room_id__in=room_ids)
+
+    if connection.vendor == 'postgresql':
+        condition = Q(search_vector=SearchQuery(term, config='simple', search_type='websearch')) | Q(content__icontains=term)
+    else:
+        condition = Q(content__icontains=term)
+
+    page = paginate_messages(queryset.filter(condition), before=before, limit=limit)
+    # paginate_messages는 오래된 순으로 반환하므로 검색 결과는 최신순으로 뒤집음
+    page['messages'].reverse()
+    return page
+
+
+def highlight(content, query):
+    """
+    검색어의 각 단어와 일치하는 부분을 <mark>로 감싸기
+
+    content는 escape된 상태로 저장되어 있으므로 원문으로 되돌려 검색어와 비교하고, 나뉜 조각을
+    각각 다시 escape한다. 검색어가 엔티티(&amp; 등)의 일부와 일치해 HTML이 깨지지 않는다.
+    """
+    words = sorted(set(query.split()), key=len, reverse=True)
+    if not words:
+        return content
+    text = html.unescape(content)
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    pieces = []
+    position = 0
+    for match in pattern.finditer(text):
+        pieces.append(escape(text[position:match.start()]))
+        pieces.append(f"<mark>{escape(match.group(0))}</mark>")
+        position = match.end()
+    pieces.append(escape(text[position:]))
+    return ''.join(pieces)
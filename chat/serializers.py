@@ -1,26 +1,87 @@
 from rest_framework import serializers
-from .models import ChatMessage, ChatRoom
+from user import presence, profile_cache
+from user.serializers import PresenceSerializerMixin, ProfileListSerializer, ProfileSnapshotMixin
+from . import membership
+from .models import ChatMessage, ChatRoom, ChatParticipant
+from .search import highlight
 
-class ChatMessageSerializer(serializers.ModelSerializer):
-    sender_name = serializers.CharField(source='sender.username', read_only=True)
+_created_at_field = serializers.DateTimeField()
+
+def build_message_payload(message):
+    """
+    새 메시지 브로드캐스트용 데이터
+
+    ChatMessageSerializer와 같은 형식을 DRF 필드 처리 없이 바로 만든다.
+    방금 보낸 메시지이므로 is_read는 항상 False.
+    """
+    # 로컬 프로필 스냅샷이 있으면 사용 (연결 시점의 scope user보다 최신), 없으면 메시지의 sender로 생성
+    profile = profile_cache.peek(message.sender_id) or profile_cache.build_snapshot(message.sender)
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender_name': profile['username'],
+        'sender_profile_image': profile_cache.image_url(profile, 'avatar') if profile_cache.has_image(profile) else None,
+        'created_at': _created_at_field.to_representation(message.created_at),
+        'is_read': False,
+    }
+
+class ChatMessageSerializer(ProfileSnapshotMixin, serializers.ModelSerializer):
+    sender_name = serializers.SerializerMethodField(read_only=True)
     sender_profile_image = serializers.SerializerMethodField(read_only=True)
+    is_read = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
         model = ChatMessage
         fields = ['id', 'content', 'sender_name', 'sender_profile_image', 'created_at', 'is_read']
         read_only_fields = ['sender_name', 'sender_profile_image', 'created_at', 'is_read']
+        # 목록의 보낸 사람 프로필은 스냅샷 캐시에서 한 번에 조회
+        list_serializer_class = ProfileListSerializer
+
+    def get_profile_ids(self, obj):
+        return [obj.sender_id]
+
+    def get_sender_name(self, obj):
+        profile = self.get_profile(obj.sender_id)
+        return profile['username'] if profile else None
+
+    def get_is_read(self, obj):
+        """보낸 사람 외의 참여자 watermark가 이 메시지 이후에 있으면 읽음"""
+        watermarks = self.context.get('read_watermarks')
+        if watermarks is None:
+            return obj.is_read
+        position = (obj.created_at, obj.id)
+        return any(
+            user_id != obj.sender_id and last_read_at is not None and position <= (last_read_at, last_read_message_id)
+            for user_id, (last_read_at, last_read_message_id) in watermarks.items()
+        )
     
     def get_sender_profile_image(self, obj):
-        """사용자 프로필 이미지 URL 반환"""
-        if hasattr(obj.sender, 'image'):
-            # User 모델에 직접 image 필드가 있는 경우
-            return obj.sender.image.url if obj.sender.image else None
-        elif hasattr(obj.sender, 'profile') and hasattr(obj.sender.profile, 'image'):
-            # profile을 통해 image에 접근하는 경우
-            return obj.sender.profile.image.url if obj.sender.profile.image else None
-        return None
+        """사용자 프로필 이미지 URL 반환 (메시지 목록은 avatar 크기)"""
+        profile = self.get_profile(obj.sender_id)
+        return profile_cache.image_url(profile, 'avatar') if profile_cache.has_image(profile) else None
 
-class ChatRoomSerializer(serializers.ModelSerializer):
+class MessageSearchResultSerializer(ChatMessageSerializer):
+    room_id = serializers.IntegerField(read_only=True)
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(ChatMessageSerializer.Meta):
+        fields = ChatMessageSerializer.Meta.fields + ['room_id', 'highlight']
+
+    def get_highlight(self, obj):
+        return highlight(obj.content, self.context.get('query', ''))
+
+def get_other_participant_id(room, user_id):
+    """1대1 채팅방의 상대방 ID (with_summary로 조회했으면 annotate된 값, 아니면 참여자 캐시 사용)"""
+    if hasattr(room, 'other_participant_id'):
+        return room.other_participant_id
+    return membership.get_other_participant_id(room.id, user_id)
+
+def get_room_online_map(chat_rooms, user):
+    """채팅방 목록의 상대방 접속 상태를 한 번에 조회"""
+    other_ids = [get_other_participant_id(room, user.id) for room in chat_rooms]
+    return presence.get_many([other_id for other_id in other_ids if other_id is not None])
+
+class ChatRoomSerializer(ProfileSnapshotMixin, PresenceSerializerMixin, serializers.ModelSerializer):
     last_message = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
@@ -28,18 +89,34 @@ class ChatRoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatRoom
         fields = ['id', 'other_participant', 'last_message', 'unread_count', 'updated_at']
+        # 상대방과 마지막 메시지 보낸 사람의 프로필은 스냅샷 캐시에서 한 번에 조회
+        list_serializer_class = ProfileListSerializer
+
+    def get_profile_ids(self, obj):
+        request = self.context.get('request')
+        return [
+            get_other_participant_id(obj, request.user.id),
+            obj.last_message.sender_id if obj.last_message else None,
+        ]
     
     def get_last_message(self, obj):
-        last_message = obj.messages.last()
-        if last_message:
-            return ChatMessageSerializer(last_message).data
+        # 비정규화된 마지막 메시지 포인터 사용 (with_summary에서 select_related)
+        if obj.last_message:
+            return ChatMessageSerializer(obj.last_message, context=self.context).data
         return None
     
     def get_other_participant(self, obj):
         request = self.context.get('request')
-        other_user = obj.participants.exclude(id=request.user.id).first()
-        return {'id': other_user.id, 'username': other_user.username, 'is_online': other_user.is_online, 'image': str(other_user.image)} if other_user else None
+        # prefetch된 참여 정보에서 상대방 ID를 고르고 프로필은 스냅샷에서 조회 (추가 쿼리 없음)
+        profile = self.get_profile(get_other_participant_id(obj, request.user.id))
+        if profile is None:
+            return None
+        return {'id': profile['id'], 'username': profile['username'], 'is_online': self.is_user_online(profile['id']), 'image': profile_cache.image_path(profile, 'sidebar')}
     
     def get_unread_count(self, obj):
+        # with_summary로 조회한 경우 annotate된 값 사용
+        if hasattr(obj, 'my_unread_count'):
+            return obj.my_unread_count or 0
         request = self.context.get('request')
-        return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
\ No newline at end of file
+        unread_count = ChatParticipant.objects.filter(room=obj, user=request.user).values_list('unread_count', flat=True).first()
+        return unread_count or 0
\ No newline at end of file
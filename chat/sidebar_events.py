@@ -0,0 +1,61 @@
+"""
+사이드바 이벤트 전송과 사용자별 순번
+
+사이드바 그룹(sidebar_chat_{user_id})으로 가는 이벤트는 만드는 쪽에서 Redis INCR
+(sidebar:seq:{user_id})로 순번을 붙인다. SidebarChatConsumer는 순번이 건너뛰면 채널 레이어가
+중간 이벤트를 버린 것(capacity 초과 등)으로 보고 전체 목록을 다시 보낸다. 순번은 delta와
+snapshot 프레임에 그대로 실려 클라이언트도 같은 비교를 할 수 있다.
+
+순번 키는 만료시키지 않는다. 만료 후 1부터 다시 시작하면 오래 연결된 소켓이 새 이벤트를
+이미 반영한 이벤트로 오인하기 때문이다(사용자당 정수 하나). 접속 상태 이벤트는 여러 사용자가
+함께 구독하는 그룹으로 가는 절대값이라 순번을 붙이지 않는다.
+"""
+
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+def sidebar_group(user_id):
+    return f"sidebar_chat_{user_id}"
+
+
+def _key(user_id):
+    return f"sidebar:seq:{user_id}"
+
+
+def next_sequences(user_ids):
+    """사용자별 다음 순번 ({user_id: seq})"""
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.incr(_key(user_id))
+    return dict(zip(user_ids, pipe.execute()))
+
+
+def current_sequence(user_id):
+    """사용자의 마지막 순번 (snapshot에 담아 이후 delta와 비교)"""
+    return int(get_redis_connection("default").get(_key(user_id)) or 0)
+
+
+async def send_to_sidebars(channel_layer, user_ids, event):
+    """
+    각 사용자의 사이드바 그룹에 순번을 붙여 이벤트 전송
+
+    Redis 장애로 순번을 받지 못하면 seq 없이 보내고, consumer는 이를 전체 목록 재전송으로 처리한다.
+    """
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id is not None]
+    if not user_ids:
+        return
+    try:
+        sequences = await sync_to_async(next_sequences)(user_ids)
+    except Exception as e:
+        logger.error(f"Sidebar sequence error for users {user_ids}: {str(e)}")
+        sequences = {}
+    await asyncio.gather(*(
+        channel_layer.group_send(sidebar_group(user_id), {**event, 'seq': sequences.get(user_id)})
+        for user_id in user_ids
+    ))
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from chat import membership, partners
+from chat.models import ChatParticipant, ChatRoom
+
+def _invalidate_rooms(room_ids, user_ids=()):
+    # 커밋된 뒤에 참여자 캐시 버전과 관련 사용자의 채팅 상대 캐시를 갱신
+    # (커밋 전에 다른 프로세스가 이전 참여자를 다시 캐시하지 않도록)
+    def run():
+        membership.invalidate(*room_ids)
+        partners.invalidate_rooms(room_ids, user_ids)
+    transaction.on_commit(run)
+
+@receiver(post_save, sender=ChatParticipant)
+@receiver(post_delete, sender=ChatParticipant)
+def invalidate_membership_on_participant_change(sender, instance, **kwargs):
+    _invalidate_rooms([instance.room_id], [instance.user_id])
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def invalidate_membership_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # room.participants.add()/remove()/clear()와 user.chat_rooms.add() 등은 post_save를 보내지 않음
+    if action == 'pre_clear':
+        # clear 후에는 대상 ID를 알 수 없으므로 미리 수집해 두고 post_clear에서 반영
+        if reverse:
+            instance._cleared_memberships = (list(instance.chat_rooms.values_list('id', flat=True)), [instance.pk])
+        else:
+            instance._cleared_memberships = ([instance.pk], list(instance.participants.values_list('id', flat=True)))
+        return
+    if action == 'post_clear':
+        room_ids, user_ids = instance.__dict__.pop('_cleared_memberships', ([], []))
+    elif action in ('post_add', 'post_remove'):
+        room_ids, user_ids = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+    else:
+        return
+    if room_ids:
+        _invalidate_rooms(room_ids, user_ids)
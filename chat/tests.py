@@ -1,3 +1,1002 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from channels.layers import InMemoryChannelLayer
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from metrics.channels import instrument_layer
+from metrics.registry import (
+    CHANNEL_LAYER_ERRORS, CHANNEL_LAYER_SECONDS, HTTP_REQUEST_SECONDS, HTTP_VIEW_DB_QUERIES, REGISTRY,
+    Counter, Gauge, Histogram, Registry,
+)
+from middlewares.metrics_middleware import ViewMetricsMiddleware
+from realtime.groups import group_add_many, group_discard_many
+from realtime.protocol import ProtocolConsumer, encode_frames, msgpack_frame
+from user import profile_cache
+from user.models import User
+
+from .coalescer import EventCoalescer
+from .consumers import SidebarChatConsumer
+from .membership import RoomMembership, RoomMembershipCache
+from .message_buffer import MessageWriteBuffer
+from .models import ChatMessage, ChatParticipant, ChatRoom
+from .search import highlight
+from .sidebar_events import send_to_sidebars
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_messages, parse_page_size
+from .utils import mark_room_read, record_new_messages
+
+
+def _direct(func):
+    """database_sync_to_async 대신 같은 스레드에서 바로 실행"""
+    async def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _message(message_id, content='hello'):
+    return ChatMessage(id=message_id, room_id=1, sender_id=1, content=content, created_at=timezone.now())
+
+
+@mock.patch('chat.message_buffer.database_sync_to_async', _direct)
+class MessageWriteBufferTests(SimpleTestCase):
+    def make_buffer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 0)
+        buffer = MessageWriteBuffer(**kwargs)
+        # flusher 태스크 없이 이벤트와 락만 준비
+        buffer._task = mock.Mock(done=mock.Mock(return_value=False))
+        buffer._id_lock = asyncio.Lock()
+        buffer._flush_lock = asyncio.Lock()
+        buffer._has_items = asyncio.Event()
+        buffer._batch_full = asyncio.Event()
+        buffer._has_space = asyncio.Event()
+        buffer._has_space.set()
+        return buffer
+
+    def run_async(self, coro_func):
+        return asyncio.run(coro_func())
+
+    def test_failed_batch_is_retried_in_order(self):
+        written = []
+        calls = {'count': 0}
+
+        def write(messages, skip_existing=False):
+            calls['count'] += 1
+            if calls['count'] == 1:
+                raise OperationalError('connection lost')
+            written.extend(message.id for message in messages)
+
+        async def scenario():
+            buffer = self.make_buffer()
+            buffer._write = write
+            buffer._pending.extend([_message(1), _message(2), _message(3)])
+            await buffer._flush_batch()
+            self.assertEqual([message.id for message in buffer._pending], [1, 2, 3])
+            self.assertEqual(buffer.failure_count, 1)
+            await buffer._flush_batch()
+            return buffer
+
+        buffer = self.run_async(scenario)
+        self.assertEqual(written, [1, 2, 3])
+        self.assertEqual(buffer.queue_depth, 0)
+        self.assertEqual(buffer.flushed_total, 3)
+
+    def test_bad_row_is_dead_lettered_after_max_retries(self):
+        written = []
+
+        def write(messages, skip_existing=False):
+            if any(message.content == 'bad' for message in messages):
+                raise IntegrityError('violates constraint')
+            written.extend(message.id for message in messages)
+
+        async def scenario():
+            buffer = self.make_buffer(max_retries=2)
+            buffer._write = write
+            buffer._pending.extend([_message(1), _message(2, 'bad'), _message(3)])
+            for _ in range(3):
+                await buffer._flush_batch()
+            return buffer
+
+        buffer = self.run_async(scenario)
+        self.assertEqual(written, [1, 3])
+        self.assertEqual(buffer.dead_letter_count, 1)
+        self.assertEqual(buffer.queue_depth, 0)
+
+    def test_outage_keeps_messages_queued(self):
+        def write(messages, skip_existing=False):
+            raise OperationalError('database is down')
+
+        async def scenario():
+            buffer = self.make_buffer(max_retries=1)
+            buffer._write = write
+            buffer._pending.extend([_message(1), _message(2)])
+            for _ in range(3):
+                await buffer._flush_batch()
+            return buffer
+
+        buffer = self.run_async(scenario)
+        self.assertEqual([message.id for message in buffer._pending], [1, 2])
+        self.assertEqual(buffer.dead_letter_count, 0)
+
+    def test_add_waits_while_queue_is_full(self):
+        async def scenario():
+            buffer = self.make_buffer(max_pending=1)
+            buffer._ids.extend([1, 2])
+            await buffer.add(ChatMessage(room_id=1, sender_id=1, content='first'))
+            waiting = asyncio.ensure_future(buffer.add(ChatMessage(room_id=1, sender_id=1, content='second')))
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(asyncio.shield(waiting), timeout=0.05)
+            buffer._write = lambda messages, skip_existing=False: None
+            await buffer._flush_batch()
+            await asyncio.wait_for(waiting, timeout=1)
+            return buffer
+
+        buffer = self.run_async(scenario)
+        self.assertEqual([message.content for message in buffer._pending], ['second'])
+        self.assertEqual(buffer.backpressure_waits, 1)
+
+
+class MessageWriteBufferFlushSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.reader = User.objects.bulk_create([
+            User(email='flush_sender@test.local', username='flush_sender'),
+            User(email='flush_reader@test.local', username='flush_reader'),
+        ])
+        cls.room = ChatRoom.objects.create(room_type='direct')
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(room=cls.room, user=cls.sender),
+            ChatParticipant(room=cls.room, user=cls.reader),
+        ])
+
+    def make_message(self, message_id, content, seconds=0):
+        return ChatMessage(
+            id=message_id, room=self.room, sender=self.sender, content=content,
+            created_at=timezone.now() + timedelta(seconds=seconds)
+        )
+
+    def reader_unread_count(self):
+        return ChatParticipant.objects.get(room=self.room, user=self.reader).unread_count
+
+    def test_already_written_inflight_message_is_not_counted_twice(self):
+        buffer = MessageWriteBuffer()
+        written = self.make_message(900001, 'written')
+        buffer._write([written])
+        self.assertEqual(self.reader_unread_count(), 1)
+
+        # 종료 직전 flusher가 이미 커밋한 배치가 in-flight로 남아 있는 상황
+        buffer._inflight = [written]
+        buffer.flush_sync()
+        self.assertEqual(self.reader_unread_count(), 1)
+        self.assertEqual(ChatMessage.objects.filter(room=self.room).count(), 1)
+
+    def test_pending_messages_are_written_after_inflight(self):
+        buffer = MessageWriteBuffer()
+        written = self.make_message(900001, 'written')
+        buffer._write([written])
+        pending = self.make_message(900002, 'pending', seconds=1)
+        buffer._inflight = [written]
+        buffer._pending.append(pending)
+        buffer.flush_sync()
+
+        self.assertEqual(self.reader_unread_count(), 2)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, pending.id)
+        self.assertEqual(buffer.queue_depth, 0)
+
+
+class RoomMembershipCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.version = 0
+        self.loads = 0
+        patcher = mock.patch('chat.membership.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_cache(self, **kwargs):
+        cache = RoomMembershipCache(check_interval=2, max_age=60, **kwargs)
+        cache._read_version = lambda room_id: self.version
+        cache._load_from_db = self.load
+        return cache
+
+    def load(self, room_id):
+        self.loads += 1
+        return RoomMembership(room_id, 'direct', [1, 2])
+
+    def test_entry_is_reused_within_check_interval(self):
+        cache = self.make_cache()
+        cache.get(1)
+        self.now += 1
+        cache.get(1)
+        self.assertEqual((self.loads, cache.hits), (1, 1))
+
+    def test_same_version_revalidates_without_db(self):
+        cache = self.make_cache()
+        cache.get(1)
+        self.now += 5
+        cache.get(1)
+        self.assertEqual((self.loads, cache.revalidations), (1, 1))
+
+    def test_new_version_reloads(self):
+        cache = self.make_cache()
+        cache.get(1)
+        self.version += 1
+        self.now += 5
+        cache.get(1)
+        self.assertEqual(self.loads, 2)
+
+    def test_max_age_forces_reload_with_same_version(self):
+        cache = self.make_cache()
+        cache.get(1)
+        for _ in range(20):
+            self.now += 5
+            cache.get(1)
+        # 버전이 한 번도 바뀌지 않아도 60초마다 DB에서 다시 읽음
+        self.assertEqual(self.loads, 2)
+
+    def test_invalidate_drops_local_entry_when_redis_is_down(self):
+        cache = self.make_cache()
+        cache.get(1)
+        with mock.patch('chat.membership.get_redis_connection', side_effect=ConnectionError('redis down')):
+            cache.invalidate(1)
+        self.assertIsNone(cache.peek(1))
+        cache.get(1)
+        self.assertEqual(self.loads, 2)
+
+
+class GroupHelperTests(SimpleTestCase):
+    def test_add_and_discard_many_round_trip(self):
+        async def scenario():
+            layer = InMemoryChannelLayer()
+            channel = await layer.new_channel()
+            await group_add_many(layer, ['user_1', 'user_2', 'user_1'], channel)
+            groups_after_add = {group for group, channels in layer.groups.items() if channel in channels}
+
+            await layer.group_send('user_2', {'type': 'status_message', 'user_id': 2})
+            received = await asyncio.wait_for(layer.receive(channel), timeout=1)
+
+            await group_discard_many(layer, ['user_1', 'user_2'], channel)
+            await layer.group_send('user_1', {'type': 'status_message', 'user_id': 1})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), timeout=0.05)
+            return groups_after_add, received, layer.groups
+
+        groups_after_add, received, groups_after_discard = asyncio.run(scenario())
+        self.assertEqual(groups_after_add, {'user_1', 'user_2'})
+        self.assertEqual(received['user_id'], 2)
+        self.assertFalse(any(groups_after_discard.values()))
+
+    def test_empty_group_list_is_a_no_op(self):
+        layer = InMemoryChannelLayer()
+        asyncio.run(group_add_many(layer, [], 'test.channel'))
+        self.assertEqual(layer.groups, {})
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        message = _message(42)
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.created_at, 42))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'aGVsbG8=', ''):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(parse_page_size(None), 100)
+        self.assertEqual(parse_page_size('0'), 1)
+        self.assertEqual(parse_page_size('1000'), 200)
+        with self.assertRaises(InvalidCursor):
+            parse_page_size('ten')
+
+
+class HighlightTests(SimpleTestCase):
+    def test_marks_each_word(self):
+        self.assertEqual(highlight('Hello world', 'hello WORLD'), '<mark>Hello</mark> <mark>world</mark>')
+
+    def test_does_not_match_inside_entities(self):
+        # 저장된 내용은 escape되어 있으므로 'amp'가 &amp; 안에서 일치하면 안 됨
+        self.assertEqual(highlight('a &amp; b', 'amp'), 'a &amp; b')
+
+    def test_special_characters_in_query(self):
+        self.assertEqual(highlight('x &lt;b&gt; y', '<b>'), 'x <mark>&lt;b&gt;</mark> y')
+
+    def test_empty_query(self):
+        self.assertEqual(highlight('a &amp; b', '  '), 'a &amp; b')
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = User.objects.bulk_create([
+            User(email='page@test.local', username='page_user'),
+            User(email='page_other@test.local', username='page_other'),
+        ])
+        cls.room = ChatRoom.objects.create(room_type='direct')
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(room=cls.room, user=cls.user),
+            ChatParticipant(room=cls.room, user=cls.other),
+        ])
+        now = timezone.now()
+        # 마지막 두 메시지는 created_at이 같아 id로 순서를 구분
+        times = [now - timedelta(seconds=3), now - timedelta(seconds=2), now - timedelta(seconds=1), now, now]
+        ChatMessage.objects.bulk_create([
+            ChatMessage(room=cls.room, sender=cls.user, content=f'm{i}', created_at=created_at)
+            for i, created_at in enumerate(times)
+        ])
+        cls.ordered = list(ChatMessage.objects.filter(room=cls.room).order_by('created_at', 'id'))
+
+    def page(self, **kwargs):
+        return paginate_messages(ChatMessage.objects.filter(room=self.room), **kwargs)
+
+    def test_latest_page(self):
+        page = self.page(limit=2)
+        self.assertEqual(page['messages'], self.ordered[-2:])
+        self.assertTrue(page['has_older'])
+        self.assertFalse(page['has_newer'])
+        self.assertEqual(page['after_cursor'], encode_cursor(self.ordered[-1]))
+
+    def test_walk_backwards_without_gaps_or_duplicates(self):
+        seen = []
+        page = self.page(limit=2)
+        seen = page['messages'] + seen
+        while page['has_older']:
+            page = self.page(before=page['before_cursor'], limit=2)
+            self.assertTrue(page['has_newer'])
+            seen = page['messages'] + seen
+        self.assertEqual(seen, self.ordered)
+        self.assertIsNone(page['before_cursor'])
+
+    def test_after_cursor_at_same_timestamp(self):
+        page = self.page(after=encode_cursor(self.ordered[-2]), limit=10)
+        self.assertEqual(page['messages'], self.ordered[-1:])
+        self.assertFalse(page['has_newer'])
+
+    def test_after_last_message_is_empty(self):
+        cursor = encode_cursor(self.ordered[-1])
+        page = self.page(after=cursor, limit=10)
+        self.assertEqual(page['messages'], [])
+        self.assertEqual(page['after_cursor'], cursor)
+        self.assertTrue(page['has_older'])
+
+    def test_after_cursor_before_first_message_has_no_older(self):
+        first = self.ordered[0]
+        cursor = encode_cursor(ChatMessage(id=0, created_at=first.created_at - timedelta(seconds=1)))
+        page = self.page(after=cursor, limit=2)
+        self.assertEqual(page['messages'], self.ordered[:2])
+        self.assertFalse(page['has_older'])
+        self.assertIsNone(page['before_cursor'])
+        self.assertTrue(page['has_newer'])
+
+    def test_after_first_message_has_older(self):
+        page = self.page(after=encode_cursor(self.ordered[0]), limit=2)
+        self.assertEqual(page['messages'], self.ordered[1:3])
+        self.assertTrue(page['has_older'])
+        self.assertEqual(page['before_cursor'], encode_cursor(self.ordered[1]))
+
+    def test_before_and_after_together_are_rejected(self):
+        cursor = encode_cursor(self.ordered[2])
+        with self.assertRaises(InvalidCursor):
+            self.page(before=cursor, after=cursor)
+
+    def test_view_rejects_both_cursors(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cursor = encode_cursor(self.ordered[2])
+        response = client.get(
+            reverse('chat:direct_room_messages', args=[self.room.id]), {'before': cursor, 'after': cursor}
+        )
+        self.assertEqual(response.status_code, 400)
+        # 잘못된 요청으로 읽음 처리가 일어나지 않음
+        self.assertEqual(ChatParticipant.objects.get(room=self.room, user=self.user).last_read_message_id, 0)
+
+
+class MarkRoomReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.reader = User.objects.bulk_create([
+            User(email='sender@test.local', username='sender'),
+            User(email='reader@test.local', username='reader'),
+        ])
+        cls.room = ChatRoom.objects.create(room_type='direct')
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(room=cls.room, user=cls.sender),
+            ChatParticipant(room=cls.room, user=cls.reader),
+        ])
+        now = timezone.now()
+        cls.messages = [
+            ChatMessage(room=cls.room, sender=cls.sender, content=f'm{i}', created_at=now - timedelta(seconds=10 - i))
+            for i in range(3)
+        ]
+        ChatMessage.objects.bulk_create(cls.messages)
+        record_new_messages(cls.messages)
+
+    def participant(self, user):
+        return ChatParticipant.objects.get(room=self.room, user=user)
+
+    def test_watermark_advances_and_recounts_unread(self):
+        self.assertEqual(self.participant(self.reader).unread_count, 3)
+        watermark = mark_room_read(self.room.id, self.reader.id, self.messages[0].id)
+        self.assertEqual(watermark, (self.messages[0].id, self.messages[0].created_at))
+        participant = self.participant(self.reader)
+        self.assertEqual(participant.last_read_message_id, self.messages[0].id)
+        self.assertEqual(participant.unread_count, 2)
+
+    def test_watermark_never_moves_backwards(self):
+        self.assertIsNotNone(mark_room_read(self.room.id, self.reader.id))
+        self.assertIsNone(mark_room_read(self.room.id, self.reader.id, self.messages[0].id))
+        participant = self.participant(self.reader)
+        self.assertEqual(participant.last_read_message_id, self.messages[-1].id)
+        self.assertEqual(participant.unread_count, 0)
+
+    def test_unknown_message_is_ignored(self):
+        self.assertIsNone(mark_room_read(self.room.id, self.reader.id, self.messages[-1].id + 1000))
+        self.assertEqual(self.participant(self.reader).last_read_message_id, 0)
+
+    def test_pending_message_can_be_read_before_it_is_written(self):
+        pending = ChatMessage(
+            id=self.messages[-1].id + 1000, room=self.room, sender=self.sender, content='pending',
+            created_at=timezone.now()
+        )
+        buffer = mock.Mock(pending_position=mock.Mock(return_value=(self.room.id, pending.created_at)))
+        with mock.patch('chat.message_buffer.is_write_behind_enabled', return_value=True), \
+                mock.patch('chat.message_buffer.get_message_buffer', return_value=buffer):
+            watermark = mark_room_read(self.room.id, self.reader.id, pending.id)
+        self.assertEqual(watermark, (pending.id, pending.created_at))
+        self.assertEqual(self.participant(self.reader).unread_count, 0)
+
+        # 버퍼가 나중에 기록해도 이미 읽은 메시지는 안 읽은 수에 더해지지 않음
+        ChatMessage.objects.bulk_create([pending])
+        record_new_messages([pending])
+        self.assertEqual(self.participant(self.reader).unread_count, 0)
+        self.assertEqual(self.participant(self.sender).unread_count, 0)
+
+
+class RoomSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = User.objects.bulk_create([
+            User(email='alice@test.local', username='alice'),
+            User(email='bob@test.local', username='bob'),
+            User(email='carol@test.local', username='carol'),
+        ])
+        cls.group = ChatRoom.objects.create(room_type='group')
+        cls.direct = ChatRoom.objects.create(room_type='direct')
+        ChatParticipant.objects.bulk_create(
+            [ChatParticipant(room=cls.group, user=user) for user in (cls.alice, cls.bob, cls.carol)]
+            + [ChatParticipant(room=cls.direct, user=user) for user in (cls.alice, cls.bob)]
+        )
+        cls.now = timezone.now()
+
+    def save_messages(self, *specs):
+        """(채팅방, 보낸 사람, 초) 목록으로 메시지를 저장하고 요약에 반영"""
+        messages = ChatMessage.objects.bulk_create([
+            ChatMessage(room=room, sender=sender, content='m', created_at=self.now + timedelta(seconds=seconds))
+            for room, sender, seconds in specs
+        ])
+        record_new_messages(messages)
+        return messages
+
+    def unread(self, room):
+        return dict(ChatParticipant.objects.filter(room=room).values_list('user_id', 'unread_count'))
+
+    def last_message_id(self, room):
+        return ChatRoom.objects.values_list('last_message_id', flat=True).get(id=room.id)
+
+    def test_unread_increment_excludes_sender(self):
+        self.save_messages((self.group, self.alice, 0), (self.group, self.alice, 1), (self.group, self.bob, 2))
+        self.assertEqual(self.unread(self.group), {self.alice.id: 1, self.bob.id: 2, self.carol.id: 3})
+
+    def test_batch_updates_each_room_separately(self):
+        group_message, direct_message = self.save_messages((self.group, self.alice, 0), (self.direct, self.bob, 1))
+        self.assertEqual(self.unread(self.group), {self.alice.id: 0, self.bob.id: 1, self.carol.id: 1})
+        self.assertEqual(self.unread(self.direct), {self.alice.id: 1, self.bob.id: 0})
+        self.assertEqual(self.last_message_id(self.group), group_message.id)
+        self.assertEqual(self.last_message_id(self.direct), direct_message.id)
+
+    def test_last_message_pointer_does_not_move_backwards(self):
+        newer, = self.save_messages((self.group, self.alice, 10))
+        # 다른 프로세스가 더 오래된 메시지를 나중에 기록한 경우
+        self.save_messages((self.group, self.bob, 5))
+        self.assertEqual(self.last_message_id(self.group), newer.id)
+        self.assertEqual(self.unread(self.group)[self.carol.id], 2)
+
+    def test_backfill_room_summaries(self):
+        first, second, third = ChatMessage.objects.bulk_create([
+            ChatMessage(room=self.direct, sender=self.alice, content='a', created_at=self.now, is_read=True),
+            ChatMessage(room=self.direct, sender=self.bob, content='b', created_at=self.now + timedelta(seconds=1)),
+            ChatMessage(room=self.direct, sender=self.alice, content='c', created_at=self.now + timedelta(seconds=2)),
+        ])
+        call_command('backfill_room_summaries', stdout=StringIO())
+
+        self.assertEqual(self.last_message_id(self.direct), third.id)
+        self.assertEqual(self.unread(self.direct), {self.alice.id: 1, self.bob.id: 1})
+        bob = ChatParticipant.objects.get(room=self.direct, user=self.bob)
+        self.assertEqual((bob.last_read_message_id, bob.last_read_at), (first.id, first.created_at))
+        alice = ChatParticipant.objects.get(room=self.direct, user=self.alice)
+        self.assertEqual((alice.last_read_message_id, alice.last_read_at), (0, None))
+        # 메시지가 없는 채팅방은 포인터가 비어 있음
+        self.assertIsNone(self.last_message_id(self.group))
+
+
+class RoomListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.bulk_create([User(email='list@test.local', username='list_user')])[0]
+        cls.partners = User.objects.bulk_create([
+            User(email=f'list_partner{i}@test.local', username=f'list_partner{i}') for i in range(6)
+        ])
+
+    def setUp(self):
+        self.rooms = 0
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(self.reset_profiles)
+
+    def reset_profiles(self):
+        profile_cache.invalidate(self.user.id, *[partner.id for partner in self.partners])
+
+    def add_rooms(self, count):
+        for partner in self.partners[self.rooms:self.rooms + count]:
+            room = ChatRoom.objects.create(room_type='direct')
+            ChatParticipant.objects.bulk_create([
+                ChatParticipant(room=room, user=self.user, unread_count=1),
+                ChatParticipant(room=room, user=partner),
+            ])
+            message = ChatMessage.objects.bulk_create([ChatMessage(room=room, sender=partner, content='hi')])[0]
+            ChatRoom.objects.filter(id=room.id).update(last_message=message)
+        self.rooms += count
+
+    def list_rooms(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse('direct_room_list'))
+        self.assertEqual(len(response.data), self.rooms)
+        return response.data
+
+    def test_room_list_queries_do_not_grow_with_room_count(self):
+        for count in (1, 5):
+            self.add_rooms(count)
+            self.reset_profiles()
+            # 채팅방 목록 한 번 + 캐시에 없는 프로필 한 번
+            rooms = self.list_rooms(2)
+            self.assertTrue(all(room['last_message'] and room['unread_count'] == 1 for room in rooms))
+            # 프로필이 캐시되어 있으면 채팅방 목록 쿼리 하나뿐
+            self.list_rooms(1)
+
+    def test_sidebar_snapshot_queries_do_not_grow_with_room_count(self):
+        consumer = SidebarChatConsumer()
+        consumer.scope = {'user': self.user}
+        for count in (1, 5):
+            self.add_rooms(count)
+            self.reset_profiles()
+            with self.assertNumQueries(2):
+                rooms = consumer.serialize_chat_rooms(
+                    ChatRoom.objects.filter(participants=self.user, room_type='direct').with_summary(self.user)
+                )
+            self.assertEqual(len(rooms), self.rooms)
+
+
+class SidebarSequenceTests(SimpleTestCase):
+    def make_consumer(self):
+        consumer = SidebarChatConsumer()
+        consumer.scope = {'user': User(id=1, email='me@test.local', username='me')}
+        consumer.seq = 0
+        consumer.rooms = {}
+        consumer.room_updates = EventCoalescer(consumer.flush_room_updates, window=0, max_delay=0)
+        consumer.profile_updates = EventCoalescer(consumer.flush_profile_updates, window=0, max_delay=0)
+        consumer.pending_profiles = {}
+        consumer.get_chat_rooms_with_status = mock.AsyncMock(
+            return_value=[{'id': 10, 'other_participant': {'id': 2}, 'unread_count': 0}]
+        )
+        consumer.send_data = mock.AsyncMock()
+        return consumer
+
+    def frames(self, consumer):
+        frames = [call.args[0] for call in consumer.send_data.await_args_list]
+        consumer.send_data.reset_mock()
+        return [(frame['type'], frame['seq']) for frame in frames], frames
+
+    def message_event(self, seq):
+        return {'type': 'chat_message', 'room_id': 10, 'sender_id': 2, 'message': {'content': 'hi'}, 'seq': seq}
+
+    async def settle(self):
+        # 병합기 callback이 실행될 때까지 대기
+        await asyncio.sleep(0.01)
+
+    def test_snapshot_delta_and_resync_on_gap(self):
+        consumer = self.make_consumer()
+
+        async def scenario():
+            with mock.patch('chat.consumers.current_sequence', return_value=3):
+                await consumer.send_chat_room_list()
+            snapshot = self.frames(consumer)[0]
+
+            await consumer.chat_message(self.message_event(4))
+            await self.settle()
+            delta, delta_frames = self.frames(consumer)
+
+            # 이미 반영한 순번은 무시
+            await consumer.chat_message(self.message_event(4))
+            await self.settle()
+            duplicate = self.frames(consumer)[0]
+
+            # 5번 이벤트가 유실됨 → 전체 목록 재전송
+            with mock.patch('chat.consumers.current_sequence', return_value=6):
+                await consumer.chat_message(self.message_event(6))
+            await self.settle()
+            resync = self.frames(consumer)[0]
+            return snapshot, delta, delta_frames, duplicate, resync
+
+        snapshot, delta, delta_frames, duplicate, resync = asyncio.run(scenario())
+        self.assertEqual(snapshot, [('chat_room_list', 3)])
+        self.assertEqual(delta, [('room_update', 4)])
+        self.assertEqual(delta_frames[0]['unread_count'], 1)
+        self.assertEqual(duplicate, [])
+        self.assertEqual(resync, [('chat_room_list', 6)])
+        self.assertEqual(consumer.seq, 6)
+
+    def test_room_read_resets_unread_count(self):
+        consumer = self.make_consumer()
+
+        async def scenario():
+            with mock.patch('chat.consumers.current_sequence', return_value=0):
+                await consumer.send_chat_room_list()
+            await consumer.chat_message(self.message_event(1))
+            await consumer.chat_message(self.message_event(2))
+            await self.settle()
+            self.frames(consumer)
+            await consumer.room_read({'type': 'room_read', 'room_id': 10, 'seq': 3})
+            await self.settle()
+            return self.frames(consumer)
+
+        summary, frames = asyncio.run(scenario())
+        self.assertEqual(summary, [('room_update', 3)])
+        self.assertEqual(frames[0]['unread_count'], 0)
+
+    def test_event_without_sequence_triggers_resync(self):
+        consumer = self.make_consumer()
+
+        async def scenario():
+            with mock.patch('chat.consumers.current_sequence', return_value=5):
+                await consumer.send_chat_room_list()
+                self.frames(consumer)
+                await consumer.room_read({'type': 'room_read', 'room_id': 10, 'seq': None})
+            return self.frames(consumer)[0]
+
+        self.assertEqual(asyncio.run(scenario()), [('chat_room_list', 5)])
+
+    def test_send_to_sidebars_assigns_sequence_per_user(self):
+        async def scenario():
+            layer = InMemoryChannelLayer()
+            channels = {}
+            for user_id in (1, 2):
+                channels[user_id] = await layer.new_channel()
+                await layer.group_add(f"sidebar_chat_{user_id}", channels[user_id])
+            with mock.patch('chat.sidebar_events.next_sequences', return_value={1: 7, 2: 3}):
+                await send_to_sidebars(layer, [1, 2, None, 1], {'type': 'room_read', 'room_id': 10})
+            return {user_id: await asyncio.wait_for(layer.receive(channel), timeout=1) for user_id, channel in channels.items()}
+
+        received = asyncio.run(scenario())
+        self.assertEqual(received[1]['seq'], 7)
+        self.assertEqual(received[2]['seq'], 3)
+
+
+class EventCoalescerTests(SimpleTestCase):
+    def test_burst_for_same_key_merges_into_one_callback(self):
+        calls = []
+
+        async def callback(keys):
+            calls.append(keys)
+
+        async def scenario():
+            coalescer = EventCoalescer(callback, window=0.02, max_delay=1)
+            for _ in range(5):
+                coalescer.trigger('room')
+            coalescer.trigger('other')
+            await asyncio.sleep(0.1)
+            return coalescer
+
+        coalescer = asyncio.run(scenario())
+        self.assertEqual(calls, [{'room', 'other'}])
+        self.assertEqual(coalescer.stats(), {'triggered': 6, 'merged': 5, 'flushed': 1})
+
+    def test_max_delay_bounds_a_steady_stream(self):
+        fired_at = []
+
+        async def callback(keys):
+            fired_at.append(asyncio.get_running_loop().time())
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            coalescer = EventCoalescer(callback, window=0.05, max_delay=0.1)
+            started = loop.time()
+            # window보다 짧은 간격으로 계속 이벤트가 들어와도 max_delay마다 실행됨
+            while loop.time() - started < 0.35:
+                coalescer.trigger('room')
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            return started
+
+        started = asyncio.run(scenario())
+        self.assertGreaterEqual(len(fired_at), 3)
+        self.assertLess(fired_at[0] - started, 0.1 + 0.05)
+
+    def test_cancel_stops_pending_callbacks(self):
+        calls = []
+
+        async def callback(keys):
+            calls.append(keys)
+
+        async def scenario():
+            coalescer = EventCoalescer(callback, window=0.02, max_delay=1)
+            coalescer.trigger('room')
+            coalescer.cancel()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(scenario())
+        self.assertEqual(calls, [])
+
+    def test_cancel_stops_running_callback(self):
+        finished = []
+
+        async def callback(keys):
+            await asyncio.sleep(1)
+            finished.append(keys)
+
+        async def scenario():
+            coalescer = EventCoalescer(callback, window=0, max_delay=0)
+            coalescer.trigger('room')
+            await asyncio.sleep(0.02)
+            coalescer.cancel()
+            await asyncio.sleep(0.02)
+            return coalescer
+
+        coalescer = asyncio.run(scenario())
+        self.assertEqual(finished, [])
+        self.assertEqual(coalescer._tasks, set())
+
+    def test_callbacks_do_not_overlap(self):
+        active = []
+        overlaps = []
+
+        async def callback(keys):
+            if active:
+                overlaps.append(keys)
+            active.append(keys)
+            await asyncio.sleep(0.05)
+            active.pop()
+
+        async def scenario():
+            coalescer = EventCoalescer(callback, window=0, max_delay=0)
+            coalescer.trigger('a')
+            await asyncio.sleep(0.01)
+            coalescer.trigger('b')
+            await asyncio.sleep(0.2)
+
+        asyncio.run(scenario())
+        self.assertEqual(overlaps, [])
+
+
+class EchoConsumer(ProtocolConsumer):
+    async def connect(self):
+        await self.accept()
+
+    async def receive_data(self, data):
+        await self.send_data({'type': 'echo', 'data': data})
+
+    async def receive_invalid(self, error):
+        await self.send_data({'type': 'error'})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ProtocolConsumerTests(SimpleTestCase):
+    def exchange(self, subprotocols, **message):
+        async def scenario():
+            communicator = WebsocketCommunicator(EchoConsumer.as_asgi(), '/ws/test/', subprotocols=subprotocols)
+            connected, subprotocol = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_to(**message)
+            response = await communicator.receive_output(timeout=1)
+            await communicator.disconnect()
+            return subprotocol, response
+
+        return asyncio.run(scenario())
+
+    def test_msgpack_subprotocol_is_negotiated_and_binary_is_received(self):
+        subprotocol, response = self.exchange(
+            ['msgpack'], bytes_data=msgpack.packb({'type': 'ping', 'n': 1}, use_bin_type=True)
+        )
+        self.assertEqual(subprotocol, 'msgpack')
+        self.assertIsNone(response.get('text'))
+        self.assertEqual(msgpack.unpackb(response['bytes'], raw=False), {'type': 'echo', 'data': {'type': 'ping', 'n': 1}})
+
+    def test_json_is_used_without_subprotocol(self):
+        subprotocol, response = self.exchange(None, text_data='{"type": "ping"}')
+        self.assertIsNone(subprotocol)
+        self.assertEqual(json.loads(response['text']), {'type': 'echo', 'data': {'type': 'ping'}})
+
+    def test_unknown_subprotocol_falls_back_to_json(self):
+        subprotocol, response = self.exchange(['cbor'], text_data='{"type": "ping"}')
+        self.assertIsNone(subprotocol)
+        self.assertEqual(json.loads(response['text'])['type'], 'echo')
+
+    def test_non_object_message_is_invalid(self):
+        _, response = self.exchange(['msgpack'], bytes_data=msgpack.packb([1, 2]))
+        self.assertEqual(msgpack.unpackb(response['bytes'], raw=False), {'type': 'error'})
+
+
+class BroadcastFrameTests(SimpleTestCase):
+    payload = {'type': 'message', 'message': {'id': 1, 'content': '안녕'}}
+
+    def make_consumer(self, codec):
+        consumer = EchoConsumer()
+        consumer.codec = codec
+        consumer.send = mock.AsyncMock()
+        return consumer
+
+    def test_sender_encodes_json_only(self):
+        with mock.patch('realtime.protocol.msgpack.packb') as packb:
+            frames = encode_frames(self.payload)
+        packb.assert_not_called()
+        self.assertEqual(json.loads(frames['json']), self.payload)
+
+    def test_msgpack_frame_is_built_on_receive_once_per_broadcast(self):
+        frames = encode_frames(self.payload)
+        consumers = [self.make_consumer('msgpack') for _ in range(3)] + [self.make_consumer('json')]
+        msgpack_frame.cache_clear()
+
+        async def scenario():
+            for consumer in consumers:
+                await consumer.send_frames(frames)
+
+        asyncio.run(scenario())
+        for consumer in consumers[:3]:
+            sent = consumer.send.await_args.kwargs['bytes_data']
+            self.assertEqual(msgpack.unpackb(sent, raw=False), self.payload)
+        self.assertEqual(consumers[3].send.await_args.kwargs, {'text_data': frames['json']})
+        self.assertEqual(msgpack_frame.cache_info().misses, 1)
+
+
+# Prometheus text format 0.0.4의 샘플 한 줄: 이름{라벨="값",...} 값
+SAMPLE_LINE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*")*\})?'
+    r' (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$'
+)
+
+
+def _sample(metric, name, **labels):
+    """metric의 샘플 중 이름과 라벨이 일치하는 값 (없으면 0)"""
+    for sample_name, sample_labels, value in metric.samples():
+        if sample_name == name and dict(sample_labels) == labels:
+            return value
+    return 0
+
+
+def _assert_valid_exposition(test, text):
+    test.assertTrue(text.endswith('\n'))
+    for line in text.splitlines():
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            continue
+        test.assertRegex(line, SAMPLE_LINE)
+
+
+class RegistryRenderTests(SimpleTestCase):
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        counter = Counter('test_events_total', '테스트 이벤트 수', ['path'], registry=registry)
+        counter.inc(path='a"b\\c\nd')
+        text = registry.render()
+        self.assertIn('test_events_total{path="a\\"b\\\\c\\nd"} 1\n', text)
+        _assert_valid_exposition(self, text)
+
+    def test_histogram_buckets_are_cumulative_and_end_with_inf(self):
+        registry = Registry()
+        histogram = Histogram('test_seconds', '테스트 시간', ['op'], buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, op='x')
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP test_seconds 테스트 시간', '# TYPE test_seconds histogram'])
+        self.assertEqual(lines[2:], [
+            'test_seconds_bucket{op="x",le="0.1"} 1',
+            'test_seconds_bucket{op="x",le="1"} 2',
+            'test_seconds_bucket{op="x",le="+Inf"} 3',
+            'test_seconds_sum{op="x"} 5.55',
+            'test_seconds_count{op="x"} 3',
+        ])
+
+    def test_failing_gauge_function_is_skipped(self):
+        registry = Registry()
+        gauge = Gauge('test_depth', '테스트 값', ['name'], registry=registry)
+        gauge.set(2, name='fixed')
+        gauge.set_function(lambda: 1 / 0, name='broken')
+        gauge.set_function(lambda: 7, name='live')
+        text = registry.render()
+        self.assertIn('test_depth{name="fixed"} 2\n', text)
+        self.assertIn('test_depth{name="live"} 7\n', text)
+        self.assertNotIn('broken', text)
+
+    def test_process_registry_renders_valid_text(self):
+        _assert_valid_exposition(self, REGISTRY.render())
+
+
+class MetricsViewTests(SimpleTestCase):
+    url = reverse('metrics')
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='', METRICS_ALLOW_ANONYMOUS=False)
+    def test_hidden_without_token_or_anonymous_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='', METRICS_ALLOW_ANONYMOUS=True)
+    def test_anonymous_access_when_allowed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        _assert_valid_exposition(self, response.content.decode())
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='secret', METRICS_ALLOW_ANONYMOUS=True)
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_X_METRICS_TOKEN='wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_X_METRICS_TOKEN='secret').status_code, 200)
+
+
+class FailingLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        raise ConnectionError('redis down')
+
+
+class ChannelLayerInstrumentationTests(SimpleTestCase):
+    def test_calls_and_errors_are_counted(self):
+        layer = instrument_layer(FailingLayer())
+        # 두 번 적용해도 한 번만 기록
+        instrument_layer(layer)
+        errors = _sample(CHANNEL_LAYER_ERRORS, 'chat_channel_layer_errors_total', operation='group_send')
+        calls = _sample(CHANNEL_LAYER_SECONDS, 'chat_channel_layer_seconds_count', operation='group_send')
+        adds = _sample(CHANNEL_LAYER_SECONDS, 'chat_channel_layer_seconds_count', operation='group_add')
+
+        async def scenario():
+            await layer.group_add('metrics_test', 'metrics_test.channel')
+            with self.assertRaises(ConnectionError):
+                await layer.group_send('metrics_test', {'type': 'noop'})
+
+        asyncio.run(scenario())
+        self.assertEqual(
+            _sample(CHANNEL_LAYER_ERRORS, 'chat_channel_layer_errors_total', operation='group_send'), errors + 1
+        )
+        self.assertEqual(
+            _sample(CHANNEL_LAYER_SECONDS, 'chat_channel_layer_seconds_count', operation='group_send'), calls + 1
+        )
+        self.assertEqual(
+            _sample(CHANNEL_LAYER_SECONDS, 'chat_channel_layer_seconds_count', operation='group_add'), adds + 1
+        )
+
+
+class ViewMetricsMiddlewareTests(SimpleTestCase):
+    def test_request_is_recorded_by_view_name(self):
+        def get_response(request):
+            request.resolver_match = SimpleNamespace(view_name='metrics_test_view')
+            return 'response'
+
+        before = _sample(HTTP_REQUEST_SECONDS, 'chat_http_request_seconds_count', view='metrics_test_view', method='GET')
+        response = ViewMetricsMiddleware(get_response)(RequestFactory().get('/'))
+        self.assertEqual(response, 'response')
+        self.assertEqual(
+            _sample(HTTP_REQUEST_SECONDS, 'chat_http_request_seconds_count', view='metrics_test_view', method='GET'),
+            before + 1,
+        )
+        self.assertEqual(
+            _sample(HTTP_VIEW_DB_QUERIES, 'chat_http_view_db_queries_bucket', view='metrics_test_view', le='0'), 1
+        )
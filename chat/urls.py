@@ -7,4 +7,5 @@ urlpatterns = [
     path('direct/rooms/', views.DirectChatRoomListView.as_view(), name='direct_room_list'),
     path('direct/rooms/create/', views.CreateDirectChatRoomView.as_view(), name='create_direct_room'),
     path('direct/rooms/<int:room_id>/messages/', views.DirectChatMessageView.as_view(), name='direct_room_messages'),
+    path('messages/search/', views.MessageSearchView.as_view(), name='message_search'),
 ]
\ No newline at end of file
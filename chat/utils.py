@@ -0,0 +1,142 @@
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ChatRoom, ChatParticipant, ChatMessage
+
+
+def record_new_messages(messages):
+    """
+    새로 저장된 메시지를 채팅방 요약에 반영
+
+    채팅방별로 마지막 메시지 포인터를 갱신하고, 보낸 사람을 제외한 참여자의
+    안 읽은 메시지 수를 UPDATE 한 번으로 증가시킨다. 메시지 저장과 같은
+    트랜잭션 안에서 호출해야 한다. write-behind 버퍼에 있던 메시지를 이미 읽은
+    참여자는 증가시키지 않고 watermark 이후 메시지로 다시 계산한다.
+    """
+    messages_by_room = defaultdict(list)
+    for message in messages:
+        messages_by_room[message.room_id].append(message)
+
+    now = timezone.now()
+    for room_id, room_messages in messages_by_room.items():
+        last_message = max(room_messages, key=lambda m: (m.created_at, m.id))
+
+        # 다른 프로세스가 더 최신 메시지를 먼저 기록했다면 포인터를 되돌리지 않음
+        ChatRoom.objects.filter(id=room_id).filter(
+            Q(last_message__isnull=True) | Q(last_message__created_at__lte=last_message.created_at)
+        ).update(last_message_id=last_message.id, updated_at=now)
+
+        # 참여자별 증가량 = 전체 메시지 수 - 본인이 보낸 메시지 수
+        total = len(room_messages)
+        sent_counts = Counter(message.sender_id for message in room_messages)
+        increment = Case(
+            *[When(user_id=sender_id, then=Value(total - count)) for sender_id, count in sent_counts.items()],
+            default=Value(total)
+        )
+        first_message = min(room_messages, key=lambda m: (m.created_at, m.id))
+        read_ahead = Q(last_read_at__gt=first_message.created_at) | Q(
+            last_read_at=first_message.created_at, last_read_message_id__gte=first_message.id
+        )
+        participants = ChatParticipant.objects.filter(room_id=room_id)
+        participants.exclude(read_ahead).update(unread_count=F('unread_count') + increment)
+
+        # 기록 전에 읽음 처리된 참여자 (드묾)
+        unread_after = ChatMessage.objects.filter(
+            room_id=room_id, created_at__gte=OuterRef('last_read_at')
+        ).filter(
+            Q(created_at__gt=OuterRef('last_read_at')) | Q(id__gt=OuterRef('last_read_message_id'))
+        ).exclude(sender_id=OuterRef('user_id')).order_by().values('room_id').annotate(
+            count=Count('id')
+        ).values('count')
+        participants.filter(read_ahead).update(unread_count=Coalesce(Subquery(unread_after), 0))
+
+
+def messages_after(room_id, created_at, message_id):
+    """(created_at, id) 기준으로 watermark 이후의 메시지"""
+    queryset = ChatMessage.objects.filter(room_id=room_id)
+    if created_at is None:
+        return queryset
+    return queryset.filter(created_at__gte=created_at).filter(
+        Q(created_at__gt=created_at) | Q(id__gt=message_id)
+    )
+
+
+def _last_message_target(room_id):
+    return ChatRoom.objects.filter(id=room_id).values_list(
+        'last_message_id', 'last_message__created_at'
+    ).first()
+
+
+def _pending_target(room_id, message_id):
+    """
+    아직 DB에 기록되지 않은 메시지의 읽음 대상 (write-behind 모드)
+
+    이 프로세스의 버퍼에 있는 메시지면 그 위치를 그대로 사용한다. 다른 프로세스가 예약한
+    ID일 수 있는 값(시퀀스 high-water mark 이하)이면 채팅방에 기록된 마지막 메시지로 낮춘다.
+    """
+    from .message_buffer import get_message_buffer, is_write_behind_enabled
+
+    if not is_write_behind_enabled():
+        return None
+    position = get_message_buffer().pending_position(message_id)
+    if position is not None:
+        pending_room_id, created_at = position
+        return (message_id, created_at) if pending_room_id == room_id else None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass)",
+            [ChatMessage._meta.db_table]
+        )
+        high_water = cursor.fetchone()[0]
+    if high_water is None or message_id > high_water:
+        return None
+    return _last_message_target(room_id)
+
+
+def mark_room_read(room_id, user_id, message_id=None):
+    """
+    읽음 watermark를 message_id(없으면 채팅방 마지막 메시지)까지 전진
+
+    참여자 행 하나만 UPDATE하므로 읽지 않은 메시지가 얼마나 쌓였든 비용이 일정하다.
+    안 읽은 메시지 수는 같은 UPDATE에서 새 watermark 이후 메시지로 다시 계산한다.
+    write-behind 버퍼에 있어 아직 기록되지 않은 메시지도 읽음 대상으로 받는다.
+    watermark가 앞으로 이동했으면 (last_read_message_id, last_read_at), 아니면 None 반환
+    """
+    if message_id is None:
+        target = _last_message_target(room_id)
+    else:
+        target = ChatMessage.objects.filter(id=message_id, room_id=room_id).values_list(
+            'id', 'created_at'
+        ).first() or _pending_target(room_id, message_id)
+    if not target or target[0] is None:
+        return None
+    target_id, target_at = target
+
+    unread_after = messages_after(room_id, target_at, target_id).exclude(
+        sender_id=user_id
+    ).order_by().values('room_id').annotate(count=Count('id')).values('count')
+
+    updated = ChatParticipant.objects.filter(room_id=room_id, user_id=user_id).filter(
+        Q(last_read_at__isnull=True)
+        | Q(last_read_at__lt=target_at)
+        | Q(last_read_at=target_at, last_read_message_id__lt=target_id)
+    ).update(
+        last_read_message_id=target_id,
+        last_read_at=target_at,
+        unread_count=Coalesce(Subquery(unread_after), 0)
+    )
+    return (target_id, target_at) if updated else None
+
+
+def get_read_watermarks(room_id):
+    """채팅방 참여자별 읽음 watermark ({user_id: (last_read_at, last_read_message_id)})"""
+    return {
+        user_id: (last_read_at, last_read_message_id)
+        for user_id, last_read_at, last_read_message_id in ChatParticipant.objects.filter(
+            room_id=room_id
+        ).values_list('user_id', 'last_read_at', 'last_read_message_id')
+    }
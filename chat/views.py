@@ -2,12 +2,18 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from asgiref.sync import async_to_sync
 from user.models import User
-from .models import ChatRoom
-from .serializers import ChatRoomSerializer, ChatMessageSerializer
-from chat.consumers import send_sidebar_update
+from .models import ChatRoom, ChatMessage
+from .membership import get_membership
+from user import presence
+from .serializers import ChatRoomSerializer, ChatMessageSerializer, MessageSearchResultSerializer, get_room_online_map
+from .search import MAX_QUERY_LENGTH, search_messages
+from .pagination import InvalidCursor, paginate_messages, parse_page_size
+from .utils import mark_room_read, get_read_watermarks
+from chat.consumers import send_sidebar_update, send_room_read, send_read_receipt
 
 class DirectChatRoomListView(APIView):
     """1대1 채팅방 목록을 조회하는 뷰"""
@@ -15,8 +21,9 @@ class DirectChatRoomListView(APIView):
     
     def get(self, request):
         # 사용자가 참여하고 있는 1대1 채팅방만 가져옴
-        chat_rooms = ChatRoom.objects.filter(participants=request.user, room_type='direct').prefetch_related('participants')
-        serializer = ChatRoomSerializer(chat_rooms, many=True, context={'request': request})
+        chat_rooms = list(ChatRoom.objects.filter(participants=request.user, room_type='direct').with_summary(request.user))
+        online_map = get_room_online_map(chat_rooms, request.user)
+        serializer = ChatRoomSerializer(chat_rooms, many=True, context={'request': request, 'online_map': online_map})
         return Response(serializer.data)
 
 class CreateDirectChatRoomView(APIView):
@@ -44,7 +51,7 @@ class CreateDirectChatRoomView(APIView):
             chat_room.participants.add(request.user, other_user)
 
             # WebSocket 사이드바 업데이트
-            async_to_sync(send_sidebar_update)(request.user, other_user)
+            async_to_sync(send_sidebar_update)(request.user.id, other_user.id, room_id=chat_room.id)
 
             serializer = ChatRoomSerializer(chat_room, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -57,32 +64,87 @@ class DirectChatMessageView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, room_id):
-        # 해당 채팅방이 1대1 채팅방이고 사용자가 참여자인지 확인
-        chat_room = get_object_or_404(ChatRoom, id=room_id, room_type='direct', participants=request.user)
+        # 해당 채팅방이 1대1 채팅방이고 사용자가 참여자인지 확인 (참여자 캐시 사용)
+        membership = get_membership(room_id)
+        if membership is None or membership.room_type != 'direct' or not membership.has(request.user.id):
+            raise Http404
         
         # 상대방 정보 가져오기
-        other_participant = chat_room.participants.exclude(id=request.user.id).first()
+        other_participant_id = membership.other(request.user.id)
+        other_participant = User.objects.filter(id=other_participant_id).first() if other_participant_id else None
         if not other_participant:
             return Response({"error": "상대방 정보를 가져올 수 없습니다."}, status=400)
         
-        # 메시지 읽음 처리
-        unread_messages = chat_room.messages.filter(is_read=False).exclude(sender=request.user)
-        unread_messages.update(is_read=True)
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        if before and after:
+            return Response({"error": "before와 after는 함께 사용할 수 없습니다."}, status=400)
+
+        # 메시지 읽음 처리 (읽음 watermark를 마지막 메시지까지 전진)
+        watermark = mark_room_read(membership.room_id, request.user.id)
+        if watermark:
+            async_to_sync(send_read_receipt)(membership.room_id, request.user.id, watermark)
+            async_to_sync(send_room_read)(request.user.id, membership.room_id)
         
-        # 최근 100개의 메시지만 조회
-        messages = chat_room.messages.all()[:100]
-        serializer = ChatMessageSerializer(messages, many=True)
+        # 커서 기반으로 메시지 조회 (before: 이전 메시지, after: 이후 메시지)
+        try:
+            page = paginate_messages(
+                ChatMessage.objects.filter(room_id=membership.room_id),
+                before=before,
+                after=after,
+                limit=parse_page_size(request.query_params.get('limit')),
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+        serializer = ChatMessageSerializer(
+            page['messages'],
+            many=True,
+            context={'read_watermarks': get_read_watermarks(membership.room_id)}
+        )
         
         # 상대방 정보 추가
         response_data = {
             "messages": serializer.data,
+            "has_older": page['has_older'],
+            "has_newer": page['has_newer'],
+            "before_cursor": page['before_cursor'],
+            "after_cursor": page['after_cursor'],
             "other_participant": {
                 "id": other_participant.id,
                 "username": other_participant.username,
-                "is_online": other_participant.is_online,
+                "is_online": presence.is_online(other_participant.id),
                 "created_at": other_participant.created_at,
                 "image": str(other_participant.image)
             }
         }
         
-        return Response(response_data)
\ No newline at end of file
+        return Response(response_data)
+
+class MessageSearchView(APIView):
+    """참여 중인 채팅방의 메시지를 검색하는 뷰"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "검색어가 필요합니다."}, status=400)
+        if len(query) > MAX_QUERY_LENGTH:
+            return Response({"error": f"검색어는 {MAX_QUERY_LENGTH}자 이하로 입력해주세요."}, status=400)
+
+        # 최신 메시지부터 before 커서로 다음 페이지 조회
+        try:
+            page = search_messages(
+                request.user,
+                query,
+                before=request.query_params.get('before'),
+                limit=parse_page_size(request.query_params.get('limit'), default=20, maximum=50),
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+
+        serializer = MessageSearchResultSerializer(page['messages'], many=True, context={'query': query})
+        return Response({
+            "messages": serializer.data,
+            "has_more": page['has_older'],
+            "next_cursor": page['before_cursor'],
+        })
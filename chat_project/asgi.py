@@ -8,9 +8,13 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from middlewares.jwt_middleware import JWTWebSocketMiddleware
+from metrics.channels import instrument_channel_layers
 from user import routing as user_routing
 from chat import routing as chat_routing
 
+# group_send/group_add 등 채널 레이어 호출 시간 기록
+instrument_channel_layers()
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),  # HTTP 요청 처리
     "websocket": AllowedHostsOriginValidator(
@@ -23,10 +23,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
-    'rest_framework_simplejwt.token_blacklist',
     'user',
     'chat',
     'channels',
@@ -38,7 +38,7 @@ REST_USE_JWT = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'middlewares.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -48,8 +48,9 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=100),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-    'BLACKLIST_TOKENS': True,  # 블랙리스트 기능 활성화
-    'BLACKLIST_AFTER_ROTATION': True,  # Refresh Token을 블랙리스트에 추가
+    # 토큰 폐기는 사용자별 세대 번호(user.token_generation)로 처리하므로 블랙리스트 미사용
+    # 회전으로 대체된 refresh token의 재사용은 세션별 최신 jti(user/refresh_sessions.py)로 거부
+    'BLACKLIST_AFTER_ROTATION': False,
     'ROTATE_REFRESH_TOKENS': True,
     'UPDATE_LAST_LOGIN': False,
 
@@ -78,7 +79,18 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# 토큰(jti) → 사용자 캐시 설정 (프로세스 단위)
+JWT_USER_CACHE_SIZE = int(os.environ.get('JWT_USER_CACHE_SIZE', 10000))
+# 캐시 항목 유지 시간 (초), 기본값은 access token 수명 (토큰당 프로세스별 DB 조회 최대 한 번)
+# 다른 프로세스의 사용자 변경은 세대 번호와 함께 읽는 프로필 버전으로 확인하므로 TTL과 무관
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()))
+# 토큰 세대 번호/프로필 버전을 프로세스에서 재사용하는 시간 (초). 다른 프로세스의 로그아웃과 사용자 변경은 최대 이 시간 뒤 반영
+JWT_GENERATION_CHECK_INTERVAL = float(os.environ.get('JWT_GENERATION_CHECK_INTERVAL', 5))
+# Redis에 캐시한 세대 번호 TTL (초), 원본은 User.token_generation
+JWT_GENERATION_REDIS_TTL = int(os.environ.get('JWT_GENERATION_REDIS_TTL', 3600))
+
 MIDDLEWARE = [
+    'middlewares.metrics_middleware.ViewMetricsMiddleware',  # view별 처리 시간/DB 시간 기록
     'corsheaders.middleware.CorsMiddleware', # cors setting
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -128,6 +140,62 @@ CACHES = {
     }
 }
 
+# 채팅 메시지 write-behind 설정 (PostgreSQL에서만 동작)
+# 활성화하면 메시지를 먼저 브로드캐스트하고 bulk_create로 묶어서 저장
+CHAT_WRITE_BEHIND_ENABLED = os.environ.get('CHAT_WRITE_BEHIND_ENABLED', 'False') == 'True'
+# 한 번에 저장할 최대 메시지 수
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('CHAT_WRITE_BEHIND_BATCH_SIZE', 200))
+# 배치가 차지 않아도 저장할 최대 대기 시간 (초)
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', 0.05))
+# 시퀀스에서 한 번에 예약할 메시지 ID 수
+CHAT_WRITE_BEHIND_ID_BLOCK_SIZE = int(os.environ.get('CHAT_WRITE_BEHIND_ID_BLOCK_SIZE', 500))
+# 같은 배치가 이 횟수만큼 연속 실패하면 한 건씩 기록하고 기록할 수 없는 메시지는 버림
+CHAT_WRITE_BEHIND_MAX_RETRIES = int(os.environ.get('CHAT_WRITE_BEHIND_MAX_RETRIES', 3))
+# 기록 대기 메시지 최대 수 (가득 차면 새 메시지는 자리가 날 때까지 대기)
+CHAT_WRITE_BEHIND_MAX_PENDING = int(os.environ.get('CHAT_WRITE_BEHIND_MAX_PENDING', 10000))
+
+# 연결 단위 갱신 이벤트 병합 설정 (초)
+# window 안에 들어온 이벤트는 한 번으로 합치고, max_delay 이상은 지연시키지 않음
+CHAT_COALESCE_WINDOW = float(os.environ.get('CHAT_COALESCE_WINDOW', 0.1))
+CHAT_COALESCE_MAX_DELAY = float(os.environ.get('CHAT_COALESCE_MAX_DELAY', 0.5))
+
+# 접속 상태(presence) 설정 (초)
+# 연결별 heartbeat가 PRESENCE_TTL 안에 갱신되지 않으면 오프라인으로 간주
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 60))
+PRESENCE_HEARTBEAT_INTERVAL = int(os.environ.get('PRESENCE_HEARTBEAT_INTERVAL', 20))
+
+# 상태 이벤트 fan-out 방식 (모든 프로세스가 같은 값을 사용해야 함)
+# groups: 친구/채팅 상대마다 user_{id} 그룹 가입, inbox: 자신의 inbox_{id} 그룹만 가입하고 이벤트를 받는 사용자별로 전송
+CHAT_FANOUT_MODE = os.environ.get('CHAT_FANOUT_MODE', 'groups')
+
+# 친구 그래프 캐시 TTL (초). 시그널을 거치지 않은 변경(update/bulk 등)도 이 시간이 지나면 DB에서 다시 채움
+FRIEND_GRAPH_TTL = int(os.environ.get('FRIEND_GRAPH_TTL', 86400))
+# 채팅 상대 캐시 TTL (초). 시그널을 거치지 않은 참여자 변경도 이 시간이 지나면 DB에서 다시 채움
+CHAT_PARTNER_CACHE_TTL = int(os.environ.get('CHAT_PARTNER_CACHE_TTL', 86400))
+
+# 프로필 스냅샷 캐시 설정
+# Redis TTL (초), 프로세스 로컬 캐시 유지 시간 (초)과 최대 항목 수
+PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 600))
+PROFILE_CACHE_LOCAL_TTL = float(os.environ.get('PROFILE_CACHE_LOCAL_TTL', 5))
+PROFILE_CACHE_LOCAL_SIZE = int(os.environ.get('PROFILE_CACHE_LOCAL_SIZE', 10000))
+
+# 채팅방 참여자 캐시 설정
+# 프로세스당 캐시할 채팅방 수와 Redis 버전 재확인 간격 (초)
+ROOM_MEMBERSHIP_CACHE_SIZE = int(os.environ.get('ROOM_MEMBERSHIP_CACHE_SIZE', 10000))
+ROOM_MEMBERSHIP_CHECK_INTERVAL = float(os.environ.get('ROOM_MEMBERSHIP_CHECK_INTERVAL', 2))
+# 버전이 같아도 DB에서 다시 읽는 항목 최대 수명 (초). 버전 증가에 실패한 변경도 이 시간 안에 반영
+ROOM_MEMBERSHIP_MAX_AGE = float(os.environ.get('ROOM_MEMBERSHIP_MAX_AGE', 60))
+
+# /metrics/ 접근 토큰 (X-Metrics-Token 헤더가 일치해야 함, 없으면 /metrics/는 404)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# 토큰 없이 /metrics/를 공개할지 여부 (DEBUG가 아니면 명시적으로 켜야 함)
+METRICS_ALLOW_ANONYMOUS = os.environ.get('METRICS_ALLOW_ANONYMOUS', 'False') == 'True'
+
+# 사용자 검색 설정
+# 접두어 검색 후보 캐시 TTL (초)과 접두어당 후보 수
+USER_SEARCH_CACHE_TTL = int(os.environ.get('USER_SEARCH_CACHE_TTL', 30))
+USER_SEARCH_PREFIX_CANDIDATES = int(os.environ.get('USER_SEARCH_PREFIX_CANDIDATES', 200))
+
 ASGI_APPLICATION = 'chat_project.asgi.application'
 
 WSGI_APPLICATION = 'chat_project.wsgi.application'
@@ -197,13 +265,20 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 PROFILE_IMAGE_DIR = 'profile/'
 DEFAULT_PROFILE_IMAGE_PATH = 'default/profile.jpg'
+# 프로필 이미지 처리 (WEBP 또는 JPEG), 백그라운드 처리 스레드 수
+PROFILE_IMAGE_FORMAT = os.environ.get('PROFILE_IMAGE_FORMAT', 'WEBP')
+PROFILE_IMAGE_QUALITY = int(os.environ.get('PROFILE_IMAGE_QUALITY', 82))
+PROFILE_IMAGE_WORKERS = int(os.environ.get('PROFILE_IMAGE_WORKERS', 2))
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'user.User'
 # email 설정
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# 테스트/개발 환경에서는 console, filebased, locmem 백엔드로 교체 가능
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+# filebased 백엔드 사용 시 메일 저장 경로
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'tmp', 'mail'))
 # 메일을 보내는 호스트 서버
 EMAIL_HOST = 'smtp.gmail.com'
 # ENAIL_HOST에 정의된 SMTP 서버가 사용하는 포트 (587: TLS/STARTTLS용 포트)
@@ -214,6 +289,19 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = True
 # 사이트와 관련한 자동응답을 받을 이메일 주소
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# SMTP 연결 제한 시간 (초), 느린 서버가 발송 스레드를 오래 붙잡지 않도록
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 10))
+
+# 이메일 인증 설정 (Redis에 저장, TTL이 지나면 자동 삭제)
+EMAIL_VERIFICATION_TTL = int(os.environ.get('EMAIL_VERIFICATION_TTL', 600))
+# 인증번호를 이 횟수만큼 틀리면 새 인증번호를 요청해야 함
+EMAIL_VERIFICATION_MAX_ATTEMPTS = int(os.environ.get('EMAIL_VERIFICATION_MAX_ATTEMPTS', 5))
+
+# 발송 메일 큐 설정
+# 실패 시 MAIL_QUEUE_RETRY_DELAY부터 두 배씩 늘려 재시도, 쓰이지 않는 SMTP 연결은 IDLE_TIMEOUT 후 종료
+MAIL_QUEUE_MAX_RETRIES = int(os.environ.get('MAIL_QUEUE_MAX_RETRIES', 5))
+MAIL_QUEUE_RETRY_DELAY = float(os.environ.get('MAIL_QUEUE_RETRY_DELAY', 1.0))
+MAIL_QUEUE_IDLE_TIMEOUT = float(os.environ.get('MAIL_QUEUE_IDLE_TIMEOUT', 30.0))
 
 CORS_ORIGIN_WHITELIST = [
     'https://13.209.15.78',
@@ -2,9 +2,11 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
+from metrics.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('user/', include('user.urls')),
     path('chat/', include('chat.urls')),
+    path('metrics/', metrics_view, name='metrics'),  # Prometheus 메트릭
 ]
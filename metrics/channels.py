@@ -0,0 +1,51 @@
+import functools
+import logging
+import time
+
+from channels.layers import ChannelLayerManager
+
+from .registry import CHANNEL_LAYER_ERRORS, CHANNEL_LAYER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTED_OPERATIONS = ('send', 'group_send', 'group_add', 'group_discard')
+
+
+def _instrument(method, operation):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            CHANNEL_LAYER_ERRORS.inc(operation=operation)
+            raise
+        finally:
+            CHANNEL_LAYER_SECONDS.observe(time.perf_counter() - started, operation=operation)
+    return wrapper
+
+
+def instrument_layer(layer):
+    """채널 레이어 인스턴스의 send/group_* 호출 시간과 실패 수 기록"""
+    if getattr(layer, '_metrics_instrumented', False):
+        return layer
+    for operation in INSTRUMENTED_OPERATIONS:
+        method = getattr(layer, operation, None)
+        if method is not None:
+            setattr(layer, operation, _instrument(method, operation))
+    layer._metrics_instrumented = True
+    return layer
+
+
+def instrument_channel_layers():
+    """이후 생성되는 모든 채널 레이어에 계측 적용 (asgi.py에서 한 번 호출)"""
+    if getattr(ChannelLayerManager, '_metrics_instrumented', False):
+        return
+    make_backend = ChannelLayerManager._make_backend
+
+    @functools.wraps(make_backend)
+    def instrumented_make_backend(self, name, config):
+        return instrument_layer(make_backend(self, name, config))
+
+    ChannelLayerManager._make_backend = instrumented_make_backend
+    ChannelLayerManager._metrics_instrumented = True
@@ -0,0 +1,42 @@
+import contextvars
+import functools
+import time
+
+from channels.db import database_sync_to_async as _database_sync_to_async
+
+from .registry import DB_SYNC_EXEC_SECONDS, DB_SYNC_QUEUE_WAIT_SECONDS
+
+# 호출 시각. SyncToAsync가 실행 스레드로 context를 복사하므로 스레드에서도 읽을 수 있다.
+_enqueued_at = contextvars.ContextVar('db_sync_enqueued_at', default=None)
+
+
+def database_sync_to_async(func):
+    """
+    channels.db.database_sync_to_async와 같지만 스레드 풀 대기 시간과 실행 시간을 기록
+
+    대기 시간이 늘어나면 DB 스레드가 부족한 것이고, 실행 시간이 늘어나면 쿼리가 느린 것이다.
+    """
+    name = getattr(func, '__qualname__', repr(func))
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        enqueued_at = _enqueued_at.get()
+        if enqueued_at is not None:
+            DB_SYNC_QUEUE_WAIT_SECONDS.observe(started - enqueued_at, function=name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_SYNC_EXEC_SECONDS.observe(time.perf_counter() - started, function=name)
+
+    run_in_thread = _database_sync_to_async(timed)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _enqueued_at.set(time.perf_counter())
+        try:
+            return await run_in_thread(*args, **kwargs)
+        finally:
+            _enqueued_at.reset(token)
+
+    return wrapper
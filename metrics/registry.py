@@ -0,0 +1,234 @@
+"""
+프로세스 내 메트릭 레지스트리 (Prometheus text format 0.0.4)
+
+외부 의존성 없이 Counter, Gauge, Histogram만 제공한다. 모든 메트릭은 모듈 로드 시
+REGISTRY에 등록되며 /metrics/ 뷰에서 render()로 내보낸다. 값은 프로세스 단위이므로
+여러 워커를 운영할 때는 워커별로 수집해 Prometheus에서 합산한다.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function, **labels):
+        """수집 시점에 function()을 호출해 값을 구함"""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                continue
+            if value is not None:
+                yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + [('le', _format_value(float(bound)))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+# WebSocket consumer
+CONSUMER_HANDLER_SECONDS = Histogram(
+    'chat_consumer_handler_seconds',
+    'Consumer 이벤트 처리 시간 (핸들러별)',
+    ['consumer', 'handler']
+)
+CONSUMER_HANDLER_ERRORS = Counter(
+    'chat_consumer_handler_errors_total',
+    'Consumer 이벤트 처리 중 발생한 예외 수',
+    ['consumer', 'handler']
+)
+CONSUMER_CONNECTIONS = Gauge(
+    'chat_consumer_connections',
+    '현재 연결된 WebSocket 수 (consumer별)',
+    ['consumer']
+)
+
+# 채널 레이어
+CHANNEL_LAYER_SECONDS = Histogram(
+    'chat_channel_layer_seconds',
+    '채널 레이어 호출 시간 (group_send, group_add 등, 호출 수는 _count)',
+    ['operation']
+)
+CHANNEL_LAYER_ERRORS = Counter(
+    'chat_channel_layer_errors_total',
+    '채널 레이어 호출 실패 수',
+    ['operation']
+)
+
+# database_sync_to_async
+DB_SYNC_QUEUE_WAIT_SECONDS = Histogram(
+    'chat_db_sync_queue_wait_seconds',
+    'database_sync_to_async 호출이 스레드에서 실행되기까지 기다린 시간',
+    ['function']
+)
+DB_SYNC_EXEC_SECONDS = Histogram(
+    'chat_db_sync_exec_seconds',
+    'database_sync_to_async 함수 실행 시간',
+    ['function']
+)
+
+# HTTP view
+HTTP_REQUEST_SECONDS = Histogram(
+    'chat_http_request_seconds',
+    'HTTP 요청 처리 시간 (view별)',
+    ['view', 'method']
+)
+HTTP_VIEW_DB_SECONDS = Histogram(
+    'chat_http_view_db_seconds',
+    'HTTP 요청 하나에서 DB 쿼리에 쓴 시간 합계 (view별)',
+    ['view']
+)
+HTTP_VIEW_DB_QUERIES = Histogram(
+    'chat_http_view_db_queries',
+    'HTTP 요청 하나에서 실행한 DB 쿼리 수 (view별)',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200)
+)
+
+# 프로세스 내 큐/캐시 (수집 시점에 값을 읽음)
+RUNTIME_GAUGE = Gauge(
+    'chat_runtime_value',
+    '프로세스 내 큐 길이, 캐시 적중 수 등 (name별)',
+    ['name']
+)
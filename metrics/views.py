@@ -0,0 +1,45 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+from .registry import REGISTRY, RUNTIME_GAUGE
+
+
+def _update_runtime_values():
+    """프로세스 내 큐/캐시 통계를 수집 시점 값으로 갱신"""
+    from chat import message_buffer
+    from chat.coalescer import EventCoalescer
+    from chat.membership import room_membership_cache
+    from middlewares.token_cache import token_user_cache
+    from user import mail_queue
+
+    RUNTIME_GAUGE.set(token_user_cache.hits, name='token_cache_hits')
+    RUNTIME_GAUGE.set(token_user_cache.misses, name='token_cache_misses')
+    for key, value in room_membership_cache.stats().items():
+        RUNTIME_GAUGE.set(value, name=f'room_membership_{key}')
+    for key, value in EventCoalescer.totals.items():
+        RUNTIME_GAUGE.set(value, name=f'coalescer_{key}')
+    if message_buffer._message_buffer is not None:
+        for key, value in message_buffer._message_buffer.stats().items():
+            RUNTIME_GAUGE.set(value, name=f'message_buffer_{key}')
+    if mail_queue._mail_queue is not None:
+        for key, value in mail_queue._mail_queue.stats().items():
+            RUNTIME_GAUGE.set(value, name=f'mail_queue_{key}')
+
+
+def metrics_view(request):
+    """
+    Prometheus text format으로 메트릭 반환
+
+    METRICS_TOKEN이 설정되어 있으면 X-Metrics-Token 헤더가 일치해야 한다. 토큰이 없으면
+    DEBUG이거나 METRICS_ALLOW_ANONYMOUS를 켠 경우에만 공개하고, 그 외에는 404를 반환한다.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not (settings.DEBUG or getattr(settings, 'METRICS_ALLOW_ANONYMOUS', False)):
+            return HttpResponseNotFound()
+    elif not hmac.compare_digest(request.headers.get('X-Metrics-Token', ''), token):
+        return HttpResponseForbidden()
+    _update_runtime_values()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
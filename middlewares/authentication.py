@@ -0,0 +1,23 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from middlewares.token_cache import User, get_user_for_token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """토큰 → 사용자 조회를 프로세스 캐시로 처리하는 DRF JWT 인증"""
+
+    def get_user(self, validated_token):
+        try:
+            user = get_user_for_token(validated_token)
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
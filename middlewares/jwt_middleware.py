@@ -1,12 +1,15 @@
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import AccessToken
+import logging
 from django.contrib.auth.models import AnonymousUser
-from channels.db import database_sync_to_async
+from metrics.db import database_sync_to_async
 from urllib.parse import parse_qs
 from django.utils.deprecation import MiddlewareMixin
 from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from middlewares.token_cache import authenticate_token, get_user_for_token, token_user_cache
+from user import token_generation
 
-User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class UniversalJWTAuthMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -15,13 +18,10 @@ class UniversalJWTAuthMiddleware(MiddlewareMixin):
         if auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
             try:
-                validated_token = AccessToken(token)
-                user_id = validated_token['user_id']
-                user = User.objects.get(id=user_id)
-                request.user = user
-                print(f"JWT Middleware (HTTP): User authenticated - {user}")
+                # 토큰별 사용자 캐시 사용 (캐시에 없을 때만 DB 조회)
+                request.user = authenticate_token(token)
             except Exception as e:
-                print(f"JWT Authentication Error (HTTP): {e}")
+                logger.info(f"JWT Authentication Error (HTTP): {e}")
                 request.user = AnonymousUser()
         else:
             request.user = AnonymousUser()
@@ -56,18 +56,24 @@ class JWTWebSocketMiddleware(BaseMiddleware):
         
         return await super().__call__(scope, receive, send)
 
-    @database_sync_to_async
-    def authenticate_websocket(self, token):
+    async def authenticate_websocket(self, token):
         # WebSocket 인증 로직
         if not token:
             return AnonymousUser()
         
         try:
-            validated_token = AccessToken(token)
-            user_id = validated_token['user_id']
-            user = User.objects.get(id=user_id)
-            print(f"JWT Middleware (WebSocket): User authenticated - {user}")
-            return user
+            # 캐시에 없을 때만 스레드 풀을 거쳐 DB 조회
+            return await self.resolve_user(token)
         except Exception as e:
-            print(f"JWT Authentication Error (WebSocket): {e}")
-            return AnonymousUser()
\ No newline at end of file
+            logger.info(f"JWT Authentication Error (WebSocket): {e}")
+            return AnonymousUser()
+
+    async def resolve_user(self, token):
+        validated_token = AccessToken(token)
+        # 사용자, 세대 번호, 프로필 버전이 모두 프로세스에 있으면 스레드 풀을 거치지 않음
+        version = token_generation.peek_profile_version(validated_token[api_settings.USER_ID_CLAIM])
+        if version is not None and token_generation.is_current_cached(validated_token):
+            user = token_user_cache.get(validated_token[api_settings.JTI_CLAIM], version=version)
+            if user is not None:
+                return user
+        return await database_sync_to_async(get_user_for_token)(validated_token)
\ No newline at end of file
@@ -0,0 +1,42 @@
+import time
+
+from django.db import connection
+
+from metrics.registry import HTTP_REQUEST_SECONDS, HTTP_VIEW_DB_QUERIES, HTTP_VIEW_DB_SECONDS
+
+
+class _QueryTimer:
+    """요청 하나에서 실행된 쿼리 수와 시간 합계"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class ViewMetricsMiddleware:
+    """view별 요청 처리 시간, DB 쿼리 수와 DB 시간을 metrics에 기록"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        HTTP_VIEW_DB_SECONDS.observe(timer.duration, view=view)
+        HTTP_VIEW_DB_QUERIES.observe(timer.count, view=view)
+        return response
@@ -0,0 +1,127 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user import token_generation
+
+User = get_user_model()
+
+
+class TokenUserCache:
+    """
+    access token(jti) → User 캐시 (프로세스 단위 LRU + TTL)
+
+    항목은 설정된 TTL(기본값은 access token 수명)과 토큰 만료 시각 중 빠른 시각에 만료되므로
+    토큰 하나당 프로세스별 DB 조회는 최대 한 번이다. 로그아웃/토큰 폐기 시 invalidate_token(),
+    프로필 변경 시 invalidate_user()로 제거한다. invalidate_user()는 이 프로세스에만 적용되므로
+    항목에 저장할 때의 프로필 버전을 함께 기록하고, get()에 넘긴 버전과 다르면 다시 읽게 한다.
+    버전은 토큰 세대 번호와 같은 조회로 얻으므로 다른 프로세스의 변경도 최대
+    JWT_GENERATION_CHECK_INTERVAL초 뒤 반영된다.
+
+    요청끼리 같은 User 객체를 공유하지 않도록 저장할 때와 반환할 때 모두 복사본을 사용한다.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # jti -> (expires_at, user, version)
+        self._user_tokens = {}  # user_id -> set(jti)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, jti, version=None):
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user, stored_version = entry
+            # 저장 이후 다른 프로세스에서 사용자가 바뀌었으면 다시 읽음
+            if expires_at <= time.time() or stored_version != version:
+                self._remove(jti)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(jti)
+            self.hits += 1
+        # 요청에서 속성을 바꿔도 캐시된 스냅샷에 남지 않도록 복사본 반환
+        return copy.deepcopy(user)
+
+    def set(self, jti, user, token_exp=None, version=None):
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        # 호출한 쪽이 이후 객체를 바꿔도 캐시에 영향이 없도록 스냅샷 저장
+        user = copy.deepcopy(user)
+        with self._lock:
+            self._remove(jti)
+            self._entries[jti] = (expires_at, user, version)
+            self._user_tokens.setdefault(user.id, set()).add(jti)
+            while len(self._entries) > self.max_size:
+                oldest_jti = next(iter(self._entries))
+                self._remove(oldest_jti)
+
+    def invalidate_token(self, jti):
+        with self._lock:
+            self._remove(jti)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for jti in list(self._user_tokens.get(user_id, ())):
+                self._remove(jti)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def _remove(self, jti):
+        entry = self._entries.pop(jti, None)
+        if entry is None:
+            return
+        user_id = entry[1].id
+        tokens = self._user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(jti)
+            if not tokens:
+                del self._user_tokens[user_id]
+
+
+token_user_cache = TokenUserCache(
+    max_size=getattr(settings, 'JWT_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())),
+)
+
+
+def get_user_for_token(validated_token):
+    """검증된 토큰의 사용자 반환 (캐시에 없거나 프로필 버전이 바뀌었을 때만 DB 조회)"""
+    # 로그아웃 등으로 세대 번호가 바뀐 토큰은 거부
+    if not token_generation.is_current(validated_token):
+        raise InvalidToken("Token has been revoked")
+
+    jti = validated_token[api_settings.JTI_CLAIM]
+    user_id = validated_token[api_settings.USER_ID_CLAIM]
+    # 세대 번호와 함께 읽어 둔 값이라 추가 I/O 없음 (Redis 장애로 모르면 캐시 미사용)
+    version = token_generation.get_profile_version(user_id)
+    if version is not None:
+        user = token_user_cache.get(jti, version=version)
+        if user is not None:
+            return user
+
+    # 버전은 DB를 읽기 전 값이므로 읽는 사이의 변경은 다음 확인 때 반영됨
+    user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    if version is not None:
+        token_user_cache.set(jti, user, token_exp=validated_token.get('exp'), version=version)
+    return user
+
+
+def authenticate_token(raw_token):
+    """문자열 access token을 검증하고 사용자 반환 (실패 시 예외 발생)"""
+    return get_user_for_token(AccessToken(raw_token))
@@ -0,0 +1,78 @@
+"""
+사용자 상태 이벤트 fan-out 방식
+
+groups (기본): 각 연결이 친구/채팅 상대마다 user_{id} 그룹에 가입하고, 상태 이벤트는
+    user_{id} 그룹에 한 번 보낸다. 그룹 가입 수가 연결 수 × 친구 수만큼 늘어난다.
+inbox: 각 연결은 자신의 inbox_{user_id} 그룹 하나에만 가입하고, 상태 이벤트는 친구 그래프와
+    채팅 상대 캐시(Redis set)로 받을 사용자를 찾아 각자의 inbox에 한 번씩 보낸다. 두 set이 모두
+    캐시되어 있으면 DB를 거치지 않는다. 연결당 Redis 상태가 O(1)이라 연결/해제가 가볍고,
+    받는 쪽 consumer가 관심 없는 사용자의 이벤트를 걸러낸다.
+
+CHAT_FANOUT_MODE 설정으로 선택하며, 모든 프로세스가 같은 방식을 사용해야 한다.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from chat import partners
+from metrics.db import database_sync_to_async
+from user import friend_graph
+
+GROUPS = 'groups'
+INBOX = 'inbox'
+
+
+def get_mode():
+    return getattr(settings, 'CHAT_FANOUT_MODE', GROUPS)
+
+
+def is_inbox_mode():
+    return get_mode() == INBOX
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def inbox_group(user_id):
+    return f"inbox_{user_id}"
+
+
+def subscription_groups(user_id, target_ids):
+    """user_id의 연결이 target_ids의 상태 이벤트를 받기 위해 가입할 그룹 목록"""
+    if is_inbox_mode():
+        return [inbox_group(user_id)]
+    return [user_group(target_id) for target_id in target_ids]
+
+
+def get_status_audience(user_id):
+    """user_id의 상태 이벤트를 받을 사용자 ID set (본인, 친구, 채팅 상대, 캐시에 없으면 DB에서 채움)"""
+    return {user_id} | friend_graph.get_friend_ids(user_id) | partners.get_partner_ids(user_id)
+
+
+def get_cached_status_audience(user_id):
+    """캐시만으로 구한 수신자 (친구나 채팅 상대 set이 캐시에 없으면 None, DB 조회 없음)"""
+    friend_ids = friend_graph.get_cached_friend_ids(user_id)
+    if friend_ids is None:
+        return None
+    partner_ids = partners.get_cached_partner_ids(user_id)
+    if partner_ids is None:
+        return None
+    return {user_id} | friend_ids | partner_ids
+
+
+async def publish_user_event(channel_layer, user_id, event):
+    """user_id에 관한 상태/프로필 이벤트 전송"""
+    if not is_inbox_mode():
+        await channel_layer.group_send(user_group(user_id), event)
+        return
+    # DB 스레드를 기다리지 않도록 Redis 조회는 별도 스레드에서, 캐시에 없을 때만 DB 조회
+    audience = await sync_to_async(get_cached_status_audience, thread_sensitive=False)(user_id)
+    if audience is None:
+        audience = await database_sync_to_async(get_status_audience)(user_id)
+    await asyncio.gather(*(
+        channel_layer.group_send(inbox_group(target_id), event)
+        for target_id in audience
+    ))
@@ -0,0 +1,76 @@
+"""
+여러 그룹 구독/해제를 한 번에 처리하는 채널 레이어 헬퍼
+
+channels_redis의 RedisChannelLayer는 group_add/group_discard마다 Redis 왕복이 1~2번
+필요해서 친구가 많은 사용자는 연결/해제 시간이 친구 수에 비례해 늘어난다. 여기서는
+그룹을 샤드(consistent_hash)별로 묶어 샤드당 pipeline 한 번으로 처리하고, 샤드끼리는
+동시에 실행한다. Redis 키 형식과 만료 처리는 channels_redis와 같으므로 group_send와 그대로
+호환된다. 다른 레이어(InMemoryChannelLayer 등)는 기존 group_add/group_discard를 동시에 호출한다.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+
+from metrics.registry import CHANNEL_LAYER_ERRORS, CHANNEL_LAYER_SECONDS
+
+
+def _supports_pipeline(layer):
+    """channels_redis RedisChannelLayer 호환 여부 (샤드 연결과 그룹 키 규칙을 사용할 수 있는지)"""
+    return all(hasattr(layer, name) for name in ('_group_key', 'consistent_hash', 'connection', 'group_expiry'))
+
+
+def _by_shard(layer, groups):
+    shards = defaultdict(list)
+    for group in groups:
+        assert layer.valid_group_name(group), "Group name not valid"
+        shards[layer.consistent_hash(group)].append(group)
+    return shards
+
+
+async def _pipeline_add(layer, index, groups, channel):
+    now = time.time()
+    pipe = layer.connection(index).pipeline(transaction=False)
+    for group in groups:
+        group_key = layer._group_key(group)
+        pipe.zadd(group_key, {channel: now})
+        pipe.expire(group_key, layer.group_expiry)
+    await pipe.execute()
+
+
+async def _pipeline_discard(layer, index, groups, channel):
+    pipe = layer.connection(index).pipeline(transaction=False)
+    for group in groups:
+        pipe.zrem(layer._group_key(group), channel)
+    await pipe.execute()
+
+
+async def _run(layer, operation, groups, channel, pipelined, fallback):
+    groups = list(dict.fromkeys(groups))  # 순서를 유지하며 중복 제거
+    if not groups:
+        return
+    started = time.perf_counter()
+    try:
+        if _supports_pipeline(layer):
+            assert layer.valid_channel_name(channel), "Channel name not valid"
+            await asyncio.gather(*(
+                pipelined(layer, index, shard_groups, channel)
+                for index, shard_groups in _by_shard(layer, groups).items()
+            ))
+        else:
+            await asyncio.gather(*(fallback(group, channel) for group in groups))
+    except Exception:
+        CHANNEL_LAYER_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        CHANNEL_LAYER_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+
+async def group_add_many(layer, groups, channel):
+    """channel을 여러 그룹에 한 번에 추가"""
+    await _run(layer, 'group_add_many', groups, channel, _pipeline_add, layer.group_add)
+
+
+async def group_discard_many(layer, groups, channel):
+    """channel을 여러 그룹에서 한 번에 제거"""
+    await _run(layer, 'group_discard_many', groups, channel, _pipeline_discard, layer.group_discard)
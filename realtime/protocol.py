@@ -0,0 +1,116 @@
+import json
+import time
+from functools import lru_cache
+
+import msgpack
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from metrics.registry import CONSUMER_CONNECTIONS, CONSUMER_HANDLER_ERRORS, CONSUMER_HANDLER_SECONDS
+
+# 클라이언트가 핸드셰이크 시 Sec-WebSocket-Protocol로 요청하는 서브프로토콜 이름
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+def encode_frames(payload):
+    """
+    브로드캐스트용 프레임을 JSON으로 한 번 인코딩
+
+    MessagePack 프레임은 msgpack 연결이 실제로 받을 때 수신 측에서 만든다(msgpack_frame).
+    대부분의 연결이 JSON이므로 보내는 쪽에서 두 형식을 모두 만들지 않는다.
+    """
+    return {'json': json.dumps(payload)}
+
+
+@lru_cache(maxsize=256)
+def msgpack_frame(json_frame):
+    """
+    JSON 프레임을 MessagePack으로 변환
+
+    같은 방송을 받는 이 프로세스의 msgpack 연결들은 같은 JSON 문자열을 받으므로 변환은 한 번뿐이다.
+    """
+    return msgpack.packb(json.loads(json_frame), use_bin_type=True)
+
+
+class ProtocolConsumer(AsyncWebsocketConsumer):
+    """
+    JSON(text) / MessagePack(binary) 프로토콜을 지원하는 WebSocket Consumer
+
+    핸드셰이크 때 클라이언트가 'msgpack' 서브프로토콜을 요청하면 바이너리 MessagePack
+    프레임으로, 아니면 기존과 같은 JSON 텍스트 프레임으로 주고받는다. 메시지 구조는
+    두 형식이 동일하며, 하위 클래스는 receive_data()/send_data()만 사용한다.
+
+    모든 이벤트 처리 시간과 현재 연결 수는 metrics에 consumer 클래스별로 기록된다.
+    """
+    codec = 'json'
+    counted_connection = False
+
+    async def dispatch(self, message):
+        consumer = type(self).__name__
+        handler = message.get('type', '')
+        started = time.perf_counter()
+        try:
+            await super().dispatch(message)
+        except StopConsumer:
+            raise
+        except Exception:
+            CONSUMER_HANDLER_ERRORS.inc(consumer=consumer, handler=handler)
+            raise
+        finally:
+            CONSUMER_HANDLER_SECONDS.observe(time.perf_counter() - started, consumer=consumer, handler=handler)
+
+    async def websocket_connect(self, message):
+        if MSGPACK_SUBPROTOCOL in (self.scope.get('subprotocols') or []):
+            self.codec = 'msgpack'
+        await super().websocket_connect(message)
+
+    async def accept(self, subprotocol=None, *args, **kwargs):
+        if subprotocol is None and self.codec == 'msgpack':
+            subprotocol = MSGPACK_SUBPROTOCOL
+        await super().accept(subprotocol, *args, **kwargs)
+        if not self.counted_connection:
+            self.counted_connection = True
+            CONSUMER_CONNECTIONS.inc(consumer=type(self).__name__)
+
+    async def websocket_disconnect(self, message):
+        if self.counted_connection:
+            self.counted_connection = False
+            CONSUMER_CONNECTIONS.dec(consumer=type(self).__name__)
+        await super().websocket_disconnect(message)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            if bytes_data is not None:
+                data = msgpack.unpackb(bytes_data, raw=False)
+            else:
+                data = json.loads(text_data)
+        except (ValueError, TypeError) as e:
+            await self.receive_invalid(e)
+            return
+
+        if not isinstance(data, dict):
+            await self.receive_invalid(ValueError("메시지는 객체 형식이어야 합니다."))
+            return
+        await self.receive_data(data)
+
+    async def receive_data(self, data):
+        """디코딩된 클라이언트 메시지 처리 (하위 클래스에서 구현)"""
+        pass
+
+    async def receive_invalid(self, error):
+        """디코딩할 수 없는 메시지 처리 (기본: 무시)"""
+        pass
+
+    async def send_data(self, payload):
+        """협상된 형식으로 인코딩하여 전송"""
+        if self.codec == 'msgpack':
+            await self.send(bytes_data=msgpack.packb(payload, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    async def send_frames(self, frames):
+        """encode_frames()로 미리 인코딩된 프레임 전송 (msgpack 연결은 이때 변환)"""
+        if self.codec == 'msgpack':
+            await self.send(bytes_data=msgpack_frame(frames['json']))
+        else:
+            await self.send(text_data=frames['json'])
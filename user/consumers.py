@@ -1,13 +1,29 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+import asyncio
 import logging
-from channels.db import database_sync_to_async
-from django.db.models import Q
-from user.models import Friendship, User
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from metrics.db import database_sync_to_async
+from django.conf import settings
+from user.models import User
+from user import friend_graph, presence, profile_cache
+from realtime import fanout
+from realtime.groups import group_add_many, group_discard_many
+from realtime.protocol import ProtocolConsumer
 
 logger = logging.getLogger(__name__)
 
-class UserStatusConsumer(AsyncWebsocketConsumer):
+
+def session_group(user_id):
+    """사용자의 모든 상태 소켓이 가입하는 그룹 (로그아웃 시 연결 종료용)"""
+    return f"session_{user_id}"
+
+
+async def close_user_sessions(user_id):
+    """로그아웃한 사용자의 열린 상태 소켓을 모두 닫음 (heartbeat로 접속 상태가 되살아나지 않도록)"""
+    await get_channel_layer().group_send(session_group(user_id), {'type': 'session_revoked', 'user_id': user_id})
+
+
+class UserStatusConsumer(ProtocolConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.is_logged_in = False  # 기본값으로 False 설정
@@ -19,27 +35,52 @@ class UserStatusConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
             
-        self.group_name = f'user_{self.user.id}'
+        logger.info(f"WebSocket connecting for user {self.user.id}")
         
-        logger.info(f"WebSocket connecting for user {self.user.id} in group {self.group_name}")
-        
-        # 자신의 그룹에
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
-        
-        # 친구들의 그룹에도 연결
-        friend_groups = await self.get_friend_groups()
-        for friend_group in friend_groups:
-            await self.channel_layer.group_add(
-                friend_group,
-                self.channel_name
-            )
+        # 자신과 친구들의 상태를 받을 그룹에 한 번에 연결 (연결 해제 시 다시 조회하지 않도록 보관)
+        # inbox 모드에서는 자신의 inbox 그룹 하나만 가입
+        self.friend_ids = await self.get_friend_ids()
+        self.status_groups = fanout.subscription_groups(self.user.id, [self.user.id, *self.friend_ids])
+        self.status_groups.append(session_group(self.user.id))
+        await group_add_many(self.channel_layer, self.status_groups, self.channel_name)
 
         await self.accept()
         logger.info(f"WebSocket connection accepted for user {self.user.id}")
 
+        # 접속 상태 등록 (첫 연결이면 친구들에게 온라인 알림)
+        try:
+            became_online = await sync_to_async(presence.connect)(self.user.id, self.channel_name)
+            self.heartbeat_task = asyncio.ensure_future(self.send_heartbeats())
+            if became_online:
+                await self.send_login_message('')
+                self.is_logged_in = True
+        except Exception as e:
+            logger.error(f"Presence connect error for user {self.user.id}: {str(e)}")
+
+    async def send_heartbeats(self):
+        """연결이 살아 있는 동안 주기적으로 presence TTL 연장"""
+        interval = getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 20)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                registered = await sync_to_async(presence.heartbeat)(self.user.id, self.channel_name)
+            except Exception as e:
+                logger.error(f"Presence heartbeat error for user {self.user.id}: {str(e)}")
+                continue
+            if not registered:
+                # 로그아웃 등으로 접속 상태에서 제거된 연결은 다시 등록하지 않고 종료
+                logger.info(f"Presence entry gone for user {self.user.id}, closing connection")
+                await self.close()
+                return
+
+    async def session_revoked(self, event):
+        """로그아웃으로 세션이 폐기되면 heartbeat를 멈추고 연결 종료"""
+        if event.get('user_id') != self.user.id:
+            return
+        if hasattr(self, 'heartbeat_task'):
+            self.heartbeat_task.cancel()
+        await self.close()
+
     @database_sync_to_async
     def get_user(self):
         # scope에서 user를 가져와서 실제 User 객체로 변환
@@ -48,54 +89,47 @@ class UserStatusConsumer(AsyncWebsocketConsumer):
         return None
 
     @database_sync_to_async
-    def get_friend_groups(self):
-        # 수락된 친구 관계만 가져오기
-        friendships = Friendship.objects.filter(
-            (Q(from_user_id=self.user.id) | Q(to_user_id=self.user.id)),
-            accepted=True
-        ).select_related('from_user', 'to_user')
-        
-        friend_groups = []
-        for friendship in friendships:
-            friend = friendship.to_user if friendship.from_user_id == self.user.id else friendship.from_user
-            friend_groups.append(f'user_{friend.id}')
-        return friend_groups
+    def get_friend_ids(self):
+        # 수락된 친구 관계는 친구 그래프 캐시에서 가져오기
+        return friend_graph.get_friend_ids(self.user.id)
 
     @database_sync_to_async
     def get_profile_image_url(self):
-        # User 모델에서 프로필 이미지 URL을 가져옴
-        # models.py에서는 필드명이 'image'로 되어 있으므로 수정
-        if hasattr(self.user, 'image') and self.user.image:
-            return self.user.image.url
-        # 기본 이미지 URL 반환 또는 None 반환
-        return '/media/default/profile.jpg'  # 기본 이미지 경로 추가
+        # 친구 목록 표시용 avatar 크기 이미지 (없으면 기본 이미지)
+        # 연결 시점의 self.user보다 최신인 프로필 스냅샷 사용
+        return profile_cache.image_url(profile_cache.get(self.user.id), 'avatar')
 
     async def disconnect(self, close_code):
         if not hasattr(self, 'user') or not self.user:
             return
             
         logger.info(f"WebSocket disconnecting for user {self.user.id}")
+
+        if hasattr(self, 'heartbeat_task'):
+            self.heartbeat_task.cancel()
+
+        # 마지막 연결이 끊기면 친구들에게 오프라인 알림
+        try:
+            went_offline = await sync_to_async(presence.disconnect)(self.user.id, self.channel_name)
+            if went_offline:
+                await self.send_offline_message()
+        except Exception as e:
+            logger.error(f"Presence disconnect error for user {self.user.id}: {str(e)}")
         
-        # 자신의 그룹에서 제거
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
-        
-        # 친구들의 그룹에서도 제거
-        friend_groups = await self.get_friend_groups()
-        for friend_group in friend_groups:
-            await self.channel_layer.group_discard(
-                friend_group,
-                self.channel_name
-            )
-
-    async def receive(self, text_data):
+        # 연결 시 구독한 그룹에서 한 번에 제거
+        await group_discard_many(self.channel_layer, getattr(self, 'status_groups', []), self.channel_name)
+
+    async def receive_invalid(self, error):
+        logger.error(f"Error in receive: {str(error)}")
+        await self.send_data({
+            'error': str(error)
+        })
+
+    async def receive_data(self, data):
         if not hasattr(self, 'user') or not self.user:
             return
             
         try:
-            data = json.loads(text_data)
             message = data.get('message', '')
             
             logger.info(f"Received message for user {self.user.id}: {message}")
@@ -113,16 +147,17 @@ class UserStatusConsumer(AsyncWebsocketConsumer):
             
         except Exception as e:
             logger.error(f"Error in receive: {str(e)}")
-            await self.send(text_data=json.dumps({
+            await self.send_data({
                 'error': str(e)
-            }))
+            })
 
     async def send_login_message(self, message):
         """로그인 메시지를 한 번만 전송"""
         profile_image_url = await self.get_profile_image_url()
         
-        await self.channel_layer.group_send(
-            self.group_name,
+        await fanout.publish_user_event(
+            self.channel_layer,
+            self.user.id,
             {
                 'type': 'status_message',
                 'message': message if message else '로그인 되었습니다.',
@@ -135,10 +170,34 @@ class UserStatusConsumer(AsyncWebsocketConsumer):
         )
         logger.info(f"Login message sent for user {self.user.id}")
 
+    async def send_profile_image_update(self):
+        """프로필 이미지 변경을 친구들에게 알림 (이미지 처리가 끝나면 서버에서도 전송)"""
+        self.user = await self.get_user()
+        await self.send_login_message('프로필 이미지가 변경되었습니다.')
+
+    async def send_offline_message(self):
+        """마지막 연결 종료 시 오프라인 상태 전송"""
+        await fanout.publish_user_event(
+            self.channel_layer,
+            self.user.id,
+            {
+                'type': 'status_message',
+                'message': '오프라인 되었습니다.',
+                'is_online': False,
+                'user_id': self.user.id,
+                'username': self.user.username,
+                'updated_at': self.user.updated_at.isoformat()
+            }
+        )
+        logger.info(f"Offline message sent for user {self.user.id}")
+
     async def status_message(self, event):
+        # inbox에는 채팅 상대의 이벤트도 들어오므로 본인과 친구의 이벤트만 전달
+        if event.get('user_id') != self.user.id and event.get('user_id') not in self.friend_ids:
+            return
         try:
             logger.info(f"Sending status message: {event}")
-            await self.send(text_data=json.dumps({
+            await self.send_data({
                 'type': 'status_update',
                 'message': event['message'],
                 'is_online': event['is_online'],
@@ -146,6 +205,6 @@ class UserStatusConsumer(AsyncWebsocketConsumer):
                 'username': event['username'],
                 'profile_image_url': event.get('profile_image_url'),  # 프로필 이미지 URL 추가
                 'updated_at': event['updated_at']
-            }))
+            })
         except Exception as e:
             logger.error(f"Error in status_message: {str(e)}")
\ No newline at end of file
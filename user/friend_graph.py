@@ -0,0 +1,179 @@
+"""
+Redis 기반 친구 관계 그래프 캐시
+
+사용자별로 수락된 친구 ID를 set(friends:user:{id})에 저장한다. 처음 조회할 때
+DB에서 한 번 읽어 임시 키에 채운 뒤 RENAME으로 교체하고, 이후에는 Friendship 저장/삭제
+시그널이 커밋 후 양쪽 사용자의 set에 SADD/SREM으로 증분 반영한다. 반영할 때 같은 스크립트에서
+버전(friends:version:{id})도 올리고, 채우는 쪽은 DB를 읽기 전의 버전이 그대로일 때만 교체하므로
+읽는 도중 반영된 변경이 오래된 set으로 덮어써지지 않는다. 아직 채워지지 않은 set은 만들지 않고
+다음 조회 때 DB에서 채운다. 빈 친구 목록과 아직 읽지 않은 상태를 구분하기 위해 set에는 항상
+표시용 멤버(_LOADED)가 들어 있다. Redis 장애 시에는 DB에서 직접 조회한다.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from user.models import Friendship
+
+logger = logging.getLogger(__name__)
+
+_LOADED = '-'
+
+# DB를 읽기 전의 버전이 그대로일 때만 임시 키를 실제 키로 교체 (아니면 임시 키 폐기)
+_STORE_IF_CURRENT = """
+if (redis.call('GET', KEYS[3]) or '0') == ARGV[1] then
+    redis.call('RENAME', KEYS[2], KEYS[1])
+    return 1
+end
+redis.call('DEL', KEYS[2])
+return 0
+"""
+
+# KEYS = [set 키, 버전 키], ARGV = ['add' 또는 'remove', 상대 ID, TTL]
+# 버전을 올리고, 이미 채워진 set에만 변경을 반영 (없는 set을 일부만 채워 만들지 않도록)
+_APPLY_CHANGE = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    if ARGV[1] == 'add' then
+        redis.call('SADD', KEYS[1], ARGV[2])
+    else
+        redis.call('SREM', KEYS[1], ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+
+
+def get_ttl():
+    return getattr(settings, 'FRIEND_GRAPH_TTL', 86400)
+
+
+def _key(user_id):
+    return f"friends:user:{user_id}"
+
+
+def _version_key(user_id):
+    return f"friends:version:{user_id}"
+
+
+def _load_from_db(user_id):
+    friend_ids = set()
+    for from_user_id, to_user_id in Friendship.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id),
+        accepted=True
+    ).values_list('from_user_id', 'to_user_id'):
+        friend_ids.add(to_user_id if from_user_id == user_id else from_user_id)
+    return friend_ids
+
+
+def _to_ids(members):
+    return {int(member) for member in members if member != _LOADED.encode()}
+
+
+def _load(redis, user_id):
+    """DB에서 읽어 캐시를 채우고 (친구 ID set, 캐시 저장 여부) 반환"""
+    # 버전을 먼저 읽어야 DB를 읽는 동안의 변경을 알아챌 수 있음
+    version = int(redis.get(_version_key(user_id)) or 0)
+    friend_ids = _load_from_db(user_id)
+
+    temp_key = f"{_key(user_id)}:loading:{uuid.uuid4().hex}"
+    pipe = redis.pipeline()
+    pipe.sadd(temp_key, _LOADED, *friend_ids)
+    pipe.expire(temp_key, get_ttl())
+    pipe.execute()
+    store_if_current = redis.register_script(_STORE_IF_CURRENT)
+    stored = store_if_current(keys=[_key(user_id), temp_key, _version_key(user_id)], args=[version])
+    return friend_ids, bool(stored)
+
+
+def _ensure_loaded(redis, user_ids):
+    """캐시에 없는 사용자의 친구 set을 DB에서 채움 (모두 채워졌으면 True)"""
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(_key(user_id))
+    missing = [user_id for user_id, exists in zip(user_ids, pipe.execute()) if not exists]
+    return all([_load(redis, user_id)[1] for user_id in missing])
+
+
+def get_friend_ids(user_id):
+    """수락된 친구 ID set"""
+    try:
+        redis = get_redis_connection("default")
+        members = redis.smembers(_key(user_id))
+        if not members:
+            return _load(redis, user_id)[0]
+        return _to_ids(members)
+    except Exception as e:
+        logger.error(f"Friend graph lookup error for user {user_id}: {str(e)}")
+        return _load_from_db(user_id)
+
+
+def get_cached_friend_ids(user_id):
+    """캐시된 친구 ID set (캐시에 없거나 Redis 장애 시 None, DB 조회 없음)"""
+    try:
+        members = get_redis_connection("default").smembers(_key(user_id))
+    except Exception as e:
+        logger.error(f"Friend graph cache lookup error for user {user_id}: {str(e)}")
+        return None
+    return _to_ids(members) if members else None
+
+
+def are_friends(user_id, other_id):
+    return other_id in get_friend_ids(user_id)
+
+
+def get_mutual_friend_ids(user_id, other_id):
+    """두 사용자의 공통 친구 ID set"""
+    try:
+        redis = get_redis_connection("default")
+        if _ensure_loaded(redis, [user_id, other_id]):
+            return _to_ids(redis.sinter(_key(user_id), _key(other_id)))
+    except Exception as e:
+        logger.error(f"Friend graph mutual lookup error for users {user_id}, {other_id}: {str(e)}")
+    # 캐시를 채우지 못했으면 (읽는 중 변경 또는 Redis 장애) DB에서 계산
+    return _load_from_db(user_id) & _load_from_db(other_id)
+
+
+def _apply_change(operation, user_id, other_id):
+    try:
+        redis = get_redis_connection("default")
+        apply_change = redis.register_script(_APPLY_CHANGE)
+        for owner_id, member_id in ((user_id, other_id), (other_id, user_id)):
+            apply_change(keys=[_key(owner_id), _version_key(owner_id)], args=[operation, member_id, get_ttl()])
+    except Exception as e:
+        logger.error(f"Friend graph {operation} error for users {user_id}, {other_id}: {str(e)}")
+
+
+def add_friendship(user_id, other_id):
+    """친구 관계 추가를 양쪽 set에 반영"""
+    _apply_change('add', user_id, other_id)
+
+
+def remove_friendship(user_id, other_id):
+    """친구 관계 삭제를 양쪽 set에 반영"""
+    _apply_change('remove', user_id, other_id)
+
+
+def invalidate(*user_ids):
+    """
+    캐시를 지우고 버전을 올림 (다음 조회 때 DB에서 다시 채움, 시그널 없이 일괄 변경한 경우 사용)
+
+    버전을 함께 올려야 변경 전에 DB를 읽고 있던 조회가 오래된 set을 다시 저장하지 못한다.
+    """
+    if not user_ids:
+        return
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        for user_id in user_ids:
+            pipe.incr(_version_key(user_id))
+            pipe.expire(_version_key(user_id), get_ttl())
+            pipe.delete(_key(user_id))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Friend graph invalidate error for users {user_ids}: {str(e)}")
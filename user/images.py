@@ -0,0 +1,192 @@
+"""
+프로필 이미지 처리
+
+업로드된 원본에서 EXIF를 제거(회전 정보는 먼저 반영)하고 용도별 크기(avatar, sidebar, full)로
+줄여 WebP(또는 JPEG)로 저장한다. 파일 이름은 내용의 해시이므로 같은 경로의 내용은 바뀌지 않아
+브라우저/CDN에서 영구 캐시할 수 있다. 처리는 요청 스레드가 아닌 백그라운드 스레드 풀에서
+트랜잭션 커밋 후 실행되며, 이전 파일 삭제도 그 스레드에서 처리한다.
+
+연달아 올린 이미지는 작업자 여러 개에서 순서와 다르게 끝날 수 있으므로, 커밋 순서대로 사용자별
+업로드 순번(Redis profile_image:seq:{id})을 붙이고 사용자 행을 잠근 상태에서 최신 순번인
+작업만 저장한다. 밀린 작업은 저장하지 않는다.
+"""
+
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django_redis import get_redis_connection
+from PIL import Image, ImageOps
+
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+# 용도별 최대 한 변 길이 (px)
+VARIANT_SIZES = getattr(settings, 'PROFILE_IMAGE_VARIANTS', {
+    'avatar': 64,
+    'sidebar': 128,
+    'full': 1024,
+})
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PROFILE_IMAGE_WORKERS', 2),
+    thread_name_prefix='profile-image'
+)
+
+
+def _encode(image):
+    """이미지를 설정된 형식으로 인코딩 (EXIF 등 메타데이터는 넘기지 않으므로 제거됨)"""
+    image_format = getattr(settings, 'PROFILE_IMAGE_FORMAT', 'WEBP').upper()
+    quality = getattr(settings, 'PROFILE_IMAGE_QUALITY', 82)
+    buffer = io.BytesIO()
+    if image_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+        return buffer.getvalue(), 'webp'
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), 'jpg'
+
+
+def render_variants(data):
+    """원본 바이트에서 용도별 이미지 생성 ({variant: (bytes, 확장자)})"""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {}
+    for variant, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = _encode(resized)
+    return variants
+
+
+def store_variant(content, extension):
+    """내용 해시를 이름으로 저장 (이미 있으면 다시 쓰지 않음). 저장 경로 반환"""
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    path = f"{settings.PROFILE_IMAGE_DIR}{digest[:2]}/{digest}.{extension}"
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(content))
+    return path
+
+
+def image_path(user, variant='full'):
+    """용도에 맞는 이미지 저장 경로 (처리 전이면 원본 경로)"""
+    variants = getattr(user, 'image_variants', None) or {}
+    if variant in variants:
+        return variants[variant]
+    return user.image.name if user.image else settings.DEFAULT_PROFILE_IMAGE_PATH
+
+
+def image_url(user, variant='full'):
+    """용도에 맞는 이미지 URL"""
+    return default_storage.url(image_path(user, variant))
+
+
+def default_image_url():
+    return default_storage.url(settings.DEFAULT_PROFILE_IMAGE_PATH)
+
+
+def _sequence_key(user_id):
+    return f"profile_image:seq:{user_id}"
+
+
+def _next_upload_sequence(user_id):
+    """사용자의 다음 업로드 순번 (Redis 장애 시 None, 순서 확인 없이 처리)"""
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        pipe.incr(_sequence_key(user_id))
+        pipe.expire(_sequence_key(user_id), getattr(settings, 'PROFILE_IMAGE_SEQUENCE_TTL', 86400))
+        return pipe.execute()[0]
+    except Exception as e:
+        logger.error(f"Profile image sequence error for user {user_id}: {str(e)}")
+        return None
+
+
+def _is_latest_upload(user_id, sequence):
+    if sequence is None:
+        return True
+    try:
+        current = get_redis_connection("default").get(_sequence_key(user_id))
+    except Exception as e:
+        logger.error(f"Profile image sequence lookup error for user {user_id}: {str(e)}")
+        return True
+    return current is None or int(current) == sequence
+
+
+def _submit(user_id, data):
+    # 순번은 커밋된 순서대로 부여 (롤백된 업로드가 순번을 차지하지 않도록)
+    _executor.submit(process_profile_image, user_id, data, _next_upload_sequence(user_id))
+
+
+def schedule_profile_image(user_id, data):
+    """커밋 후 백그라운드에서 프로필 이미지 처리"""
+    transaction.on_commit(lambda: _submit(user_id, data))
+
+
+def process_profile_image(user_id, data, sequence=None):
+    close_old_connections()
+    try:
+        # 인코딩과 파일 저장은 잠금 없이 처리
+        variants = {
+            variant: store_variant(content, extension)
+            for variant, (content, extension) in render_variants(data).items()
+        }
+
+        with transaction.atomic():
+            # 같은 사용자의 다른 업로드 작업과 저장 순서를 맞추기 위해 행 잠금
+            user = User.objects.select_for_update().filter(id=user_id).first()
+            if user is None or not _is_latest_upload(user_id, sequence):
+                # 더 최근 업로드가 있거나 탈퇴한 사용자. 이번에 만든 파일은 지우지 않음
+                # (같은 내용을 올린 최근 업로드가 store_variant에서 이 파일을 재사용했을 수 있음)
+                return
+            old_image = user.image.name if user.image else None
+            old_paths = _owned_paths(user)
+            user.image = variants['full']
+            user.image_variants = variants
+            user.save(update_fields=['image', 'image_variants', 'updated_at'])
+
+        _delete_unused(old_paths - set(variants.values()), old_image, user_id)
+        _notify(user)
+    except Exception:
+        logger.exception(f"Profile image processing failed for user {user_id}")
+    finally:
+        close_old_connections()
+
+
+def _owned_paths(user):
+    """교체 시 지울 수 있는 기존 파일 경로 (기본 이미지 제외)"""
+    paths = set((user.image_variants or {}).values())
+    if user.image:
+        paths.add(user.image.name)
+    paths.discard(settings.DEFAULT_PROFILE_IMAGE_PATH)
+    return {path for path in paths if path.startswith(settings.PROFILE_IMAGE_DIR)}
+
+
+def _delete_unused(paths, old_image, user_id):
+    """다른 사용자가 같은 내용의 이미지를 쓰고 있지 않을 때만 삭제 (같은 원본이면 모든 크기가 같은 파일)"""
+    if not paths or User.objects.filter(image=old_image).exclude(id=user_id).exists():
+        return
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except Exception as e:
+            logger.error(f"Profile image delete error for {path}: {str(e)}")
+
+
+def _notify(user):
+    """처리가 끝난 이미지를 친구와 채팅 상대에게 알림"""
+    from chat.consumers import send_profile_image_update
+
+    try:
+        async_to_sync(send_profile_image_update)(user.id)
+    except Exception as e:
+        logger.error(f"Profile image notify error for user {user.id}: {str(e)}")
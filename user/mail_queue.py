@@ -0,0 +1,161 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundMailQueue:
+    """
+    발송 메일 큐
+
+    요청 스레드는 메일을 큐에 넣고 바로 반환하며, 프로세스당 하나의 발송 스레드가
+    EMAIL_BACKEND 연결을 유지한 채로 모인 메일을 한 번에 보낸다. 연결은 idle_timeout
+    동안 쓰이지 않으면 닫는다. 실패한 메일은 backoff 후 max_retries까지 다시 보낸다.
+    배치 안의 메일은 같은 연결로 한 건씩 보내므로, 중간에 실패하면 아직 보내지 않은 메일만
+    다시 큐에 넣는다(이미 보낸 메일이 중복 발송되지 않음).
+    """
+
+    def __init__(self, max_retries=5, retry_delay=1.0, max_retry_delay=60.0, idle_timeout=30.0, batch_size=50):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue()
+        self._connection = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._consecutive_failures = 0
+
+        # 모니터링용 통계
+        self.sent_total = 0
+        self.failure_count = 0
+        self.dropped_total = 0
+
+    @property
+    def queue_depth(self):
+        """아직 발송되지 않은 메일 수"""
+        return self._queue.unfinished_tasks
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'sent_total': self.sent_total,
+            'failure_count': self.failure_count,
+            'dropped_total': self.dropped_total,
+        }
+
+    def enqueue(self, message):
+        """EmailMessage를 발송 큐에 추가"""
+        self._ensure_started()
+        self._queue.put((message, 0))
+
+    def join(self):
+        """큐에 쌓인 메일이 모두 처리될 때까지 대기 (테스트/종료용)"""
+        self._queue.join()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._close_connection()
+                continue
+
+            # 이미 쌓여 있는 메일은 같은 연결로 함께 발송
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        sent = 0
+        try:
+            if self._connection is None:
+                self._connection = get_connection(fail_silently=False)
+                self._connection.open()
+            for message, _ in batch:
+                self._connection.send_messages([message])
+                sent += 1
+        except Exception as e:
+            self.sent_total += sent
+            self.failure_count += 1
+            self._consecutive_failures += 1
+            logger.error(f"메일 발송 실패 ({len(batch) - sent}/{len(batch)}건): {str(e)}")
+            # 끊긴 연결을 재사용하지 않도록 닫고, 보내지 못한 메일만 잠시 후 다시 시도
+            self._close_connection()
+            for message, attempts in batch[sent:]:
+                if attempts + 1 >= self.max_retries:
+                    self.dropped_total += 1
+                    logger.error(f"메일 발송 포기 (수신자: {', '.join(message.to)})")
+                else:
+                    self._queue.put((message, attempts + 1))
+            time.sleep(min(self.max_retry_delay, self.retry_delay * (2 ** min(self._consecutive_failures - 1, 10))))
+        else:
+            self._consecutive_failures = 0
+            self.sent_total += len(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _close_connection(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.close()
+        except Exception as e:
+            logger.error(f"메일 연결 종료 실패: {str(e)}")
+        self._connection = None
+
+    def flush_sync(self):
+        """프로세스 종료 시 남은 메일을 한 번씩만 동기적으로 발송"""
+        messages = []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait()[0])
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        if not messages:
+            return
+        try:
+            get_connection(fail_silently=False).send_messages(messages)
+            logger.info(f"종료 전 메일 {len(messages)}건 발송 완료")
+        except Exception as e:
+            logger.error(f"종료 전 메일 발송 실패 ({len(messages)}건): {str(e)}")
+
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue():
+    """프로세스 단위 메일 큐 반환"""
+    global _mail_queue
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            _mail_queue = OutboundMailQueue(
+                max_retries=getattr(settings, 'MAIL_QUEUE_MAX_RETRIES', 5),
+                retry_delay=getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', 1.0),
+                idle_timeout=getattr(settings, 'MAIL_QUEUE_IDLE_TIMEOUT', 30.0),
+            )
+            atexit.register(_mail_queue.flush_sync)
+    return _mail_queue
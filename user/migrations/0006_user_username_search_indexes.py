@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:30
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Django는 icontains/istartswith를 UPPER("username"::text) LIKE UPPER(...)로 변환하므로
+# 같은 표현식에 인덱스를 만들어야 사용된다.
+CREATE_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS user_username_trgm_idx ON user_user USING gin (UPPER(username::text) gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS user_username_prefix_idx ON user_user (UPPER(username::text) text_pattern_ops);",
+]
+
+DROP_INDEX_SQL = [
+    "DROP INDEX IF EXISTS user_username_prefix_idx;",
+    "DROP INDEX IF EXISTS user_username_trgm_idx;",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_INDEX_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_user_image'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
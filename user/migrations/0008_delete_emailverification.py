@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_user_image_variants'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='EmailVerification',
+        ),
+    ]
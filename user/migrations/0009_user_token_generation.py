@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_delete_emailverification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -3,8 +3,6 @@ from django.conf import settings
 from django.contrib.auth.models import(BaseUserManager, AbstractBaseUser)
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
-from django.utils import timezone
-from datetime import timedelta
 import re
 
 # Django의 기본 User Manager를 확장하여 사용자 생성 로직을 커스터마이징하는 클래스.
@@ -42,16 +40,6 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
     
-class EmailVerification(models.Model):
-    email = models.EmailField(unique=True)
-    verification_code = models.CharField(max_length=6)
-    created_at = models.DateTimeField(auto_now_add=True)
-    is_verified = models.BooleanField(default=False)
-    
-    def is_expired(self):
-        # 인증번호 유효시간 설정
-        return self.created_at < timezone.now() - timedelta(minutes=10)
-    
 class User(AbstractBaseUser):
     GENDERS = (
         ('남성', 'male'),('여성', 'female'),
@@ -63,6 +51,8 @@ class User(AbstractBaseUser):
         max_length=255, 
         null=True
     )
+    # 처리된 크기별 이미지 경로 ({'avatar': ..., 'sidebar': ..., 'full': ...}), user.images에서 채움
+    image_variants = models.JSONField(default=dict, blank=True)
     email = models.EmailField(max_length=255,unique=True, verbose_name='이메일')
     username = models.CharField(max_length=50, unique=True, verbose_name='이름')
     gender = models.CharField(verbose_name='성별', max_length=6, choices=GENDERS)
@@ -71,7 +61,10 @@ class User(AbstractBaseUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_admin = models.BooleanField(default=False)
+    # 더 이상 갱신하지 않음: 접속 상태는 user.presence(Redis)에서 관리
     is_online = models.BooleanField(default=False)
+    # 토큰 세대 번호 (로그아웃 시 증가, 이전 세대의 토큰은 모두 무효), user.token_generation 참고
+    token_generation = models.PositiveIntegerField(default=0)
 
     # 사용자 생성과 관련된 로직을 처리하는 UserManager를 설정
     objects = UserManager()
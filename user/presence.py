@@ -0,0 +1,103 @@
+"""
+Redis 기반 접속 상태(presence) 관리
+
+사용자별로 sorted set(presence:user:{id})에 연결 ID를 만료 시각(score)과 함께 저장한다.
+각 WebSocket 연결은 주기적으로 heartbeat를 보내 만료 시각을 연장하고, 만료 시각이
+지난 연결은 온라인으로 세지 않는다. 여러 탭/기기는 각각 별도 연결로 계산되며,
+노드가 비정상 종료되어 disconnect가 호출되지 않아도 TTL이 지나면 자동으로 오프라인이 된다.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_ttl():
+    return getattr(settings, 'PRESENCE_TTL', 60)
+
+
+def _key(user_id):
+    return f"presence:user:{user_id}"
+
+
+def connect(user_id, connection_id):
+    """연결 등록. 오프라인 → 온라인으로 바뀌었으면 True 반환"""
+    redis = get_redis_connection("default")
+    now = time.time()
+    key = _key(user_id)
+
+    pipe = redis.pipeline()
+    pipe.zremrangebyscore(key, '-inf', now)
+    pipe.zcard(key)
+    pipe.zadd(key, {connection_id: now + get_ttl()})
+    pipe.expire(key, get_ttl() + 1)
+    _, active_before, _, _ = pipe.execute()
+    return active_before == 0
+
+
+def heartbeat(user_id, connection_id):
+    """
+    연결 만료 시각 연장. 등록된 연결이 아니면 False 반환
+
+    로그아웃(clear)이나 만료로 제거된 연결은 다시 등록하지 않는다(XX). 다시 등록하면
+    친구들에게는 오프라인으로 알린 사용자가 알림 없이 온라인으로 돌아오기 때문이다.
+    """
+    redis = get_redis_connection("default")
+    key = _key(user_id)
+
+    pipe = redis.pipeline()
+    pipe.zadd(key, {connection_id: time.time() + get_ttl()}, xx=True, ch=True)
+    pipe.expire(key, get_ttl() + 1)
+    updated, _ = pipe.execute()
+    return updated > 0
+
+
+def disconnect(user_id, connection_id):
+    """연결 해제. 등록된 마지막 연결이 끊겨 오프라인이 되었으면 True 반환"""
+    redis = get_redis_connection("default")
+    now = time.time()
+    key = _key(user_id)
+
+    pipe = redis.pipeline()
+    pipe.zrem(key, connection_id)
+    pipe.zremrangebyscore(key, '-inf', now)
+    pipe.zcard(key)
+    removed, _, remaining = pipe.execute()
+    # 로그아웃으로 이미 제거된 연결이면 오프라인 알림을 다시 보내지 않음
+    return removed > 0 and remaining == 0
+
+
+def clear(user_id):
+    """로그아웃 시 사용자의 모든 연결을 오프라인 처리"""
+    try:
+        get_redis_connection("default").delete(_key(user_id))
+    except Exception as e:
+        logger.error(f"Presence clear error for user {user_id}: {str(e)}")
+
+
+def is_online(user_id):
+    return get_many([user_id]).get(user_id, False)
+
+
+def get_many(user_ids):
+    """여러 사용자의 온라인 여부를 한 번의 Redis 왕복으로 조회 ({user_id: bool})"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    try:
+        redis = get_redis_connection("default")
+        now = time.time()
+        pipe = redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zcount(_key(user_id), now, '+inf')
+        counts = pipe.execute()
+    except Exception as e:
+        logger.error(f"Presence lookup error: {str(e)}")
+        return {user_id: False for user_id in user_ids}
+
+    return {user_id: count > 0 for user_id, count in zip(user_ids, counts)}
@@ -0,0 +1,187 @@
+"""
+사용자 프로필 스냅샷 캐시
+
+목록/메시지 렌더링에 필요한 값(사용자 이름, 크기별 이미지 경로)만 담은 스냅샷을
+프로세스 로컬 캐시(PROFILE_CACHE_LOCAL_TTL초)와 Redis(profile:user:{id}, PROFILE_CACHE_TTL초)
+두 단계로 캐시한다. get_many()는 로컬에 없는 ID를 MGET 한 번으로, Redis에도 없는 ID를
+DB 쿼리 한 번으로 채우므로 N개의 메시지/채팅방을 렌더링해도 조회는 최대 한 번씩이다.
+User 저장 시그널과 프로필 수정에서 invalidate()로 제거하며, 다른 프로세스의 로컬 캐시는
+최대 PROFILE_CACHE_LOCAL_TTL초 늦게 반영된다. 접속 상태는 자주 바뀌므로 presence에서 따로 조회한다.
+
+invalidate()는 스냅샷을 지우면서 사용자별 버전(profile:version:{id})도 올린다. DB에서 읽은
+스냅샷은 MGET 때 함께 읽은 버전이 그대로일 때만 Redis에 기록하므로, DB를 읽는 사이에 프로필이
+바뀌었다면 이전 스냅샷이 다시 저장되지 않는다. 토큰 사용자 캐시도 이 버전으로 다른 프로세스의
+변경을 확인하므로 버전 키는 토큰 캐시 항목보다 오래 유지한다.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django_redis import get_redis_connection
+
+from user import images
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+_local = {}  # user_id -> (snapshot, expires_at)
+_lock = threading.Lock()
+
+# KEYS = [스냅샷 키, 버전 키, ...], ARGV = [TTL, 기대 버전, 스냅샷, ...]
+# 버전이 읽었을 때와 같은 스냅샷만 기록하고, 기록한 사용자의 순번(0부터) 목록 반환
+_SET_IF_CURRENT = """
+local stored = {}
+for i = 1, #KEYS, 2 do
+    local index = (i - 1) / 2
+    if (redis.call('GET', KEYS[i + 1]) or '0') == ARGV[index * 2 + 2] then
+        redis.call('SET', KEYS[i], ARGV[index * 2 + 3], 'EX', ARGV[1])
+        table.insert(stored, index)
+    end
+end
+return stored
+"""
+
+
+def _key(user_id):
+    return f"profile:user:{user_id}"
+
+
+def _version_key(user_id):
+    return f"profile:version:{user_id}"
+
+
+def _redis_ttl():
+    return getattr(settings, 'PROFILE_CACHE_TTL', 600)
+
+
+def _version_ttl():
+    # 만료 후 0부터 다시 세면 이전 버전을 들고 있는 캐시 항목과 값이 겹칠 수 있음
+    return max(_redis_ttl(), getattr(settings, 'JWT_USER_CACHE_TTL', 0))
+
+
+def _local_ttl():
+    return getattr(settings, 'PROFILE_CACHE_LOCAL_TTL', 5)
+
+
+def build_snapshot(user):
+    """User에서 스냅샷 생성 ({'id', 'username', 'images': {variant: 경로}}, 이미지가 없으면 images는 빈 dict)"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'images': {variant: images.image_path(user, variant) for variant in images.VARIANT_SIZES} if user.image else {},
+    }
+
+
+def has_image(snapshot):
+    return bool(snapshot and snapshot['images'])
+
+
+def image_path(snapshot, variant='full'):
+    """스냅샷의 용도별 이미지 경로 (이미지가 없으면 기본 이미지)"""
+    if not has_image(snapshot):
+        return settings.DEFAULT_PROFILE_IMAGE_PATH
+    return snapshot['images'].get(variant) or snapshot['images'].get('full') or settings.DEFAULT_PROFILE_IMAGE_PATH
+
+
+def image_url(snapshot, variant='full'):
+    """스냅샷의 용도별 이미지 URL"""
+    return default_storage.url(image_path(snapshot, variant))
+
+
+def _remember(snapshots):
+    expires_at = time.monotonic() + _local_ttl()
+    max_size = getattr(settings, 'PROFILE_CACHE_LOCAL_SIZE', 10000)
+    with _lock:
+        if len(_local) + len(snapshots) > max_size:
+            # 크기를 넘으면 통째로 비움 (만료가 짧아 곧 다시 채워짐)
+            _local.clear()
+        for user_id, snapshot in snapshots.items():
+            _local[user_id] = (snapshot, expires_at)
+
+
+def _load_from_db(user_ids):
+    users = User.objects.filter(id__in=user_ids).only('id', 'username', 'image', 'image_variants')
+    return {user.id: build_snapshot(user) for user in users}
+
+
+def get_many(user_ids):
+    """{user_id: 스냅샷} (존재하지 않는 사용자는 제외)"""
+    result = {}
+    missing = []
+    now = time.monotonic()
+    for user_id in set(user_ids):
+        entry = _local.get(user_id)
+        if entry is not None and entry[1] > now:
+            result[user_id] = entry[0]
+        else:
+            missing.append(user_id)
+    if not missing:
+        return result
+
+    found = {}
+    unstored = {}
+    try:
+        redis = get_redis_connection("default")
+        # 스냅샷과 버전을 한 번에 읽음 (버전은 DB를 읽기 전 값이어야 함)
+        values = redis.mget([_key(user_id) for user_id in missing] + [_version_key(user_id) for user_id in missing])
+        versions = {}
+        for user_id, value, version in zip(missing, values[:len(missing)], values[len(missing):]):
+            if value is not None:
+                found[user_id] = json.loads(value)
+            versions[user_id] = int(version or 0)
+        loaded = _load_from_db([user_id for user_id in missing if user_id not in found])
+        if loaded:
+            keys, args = [], [_redis_ttl()]
+            for user_id, snapshot in loaded.items():
+                keys += [_key(user_id), _version_key(user_id)]
+                args += [versions[user_id], json.dumps(snapshot)]
+            stored = set(redis.register_script(_SET_IF_CURRENT)(keys=keys, args=args))
+            for index, (user_id, snapshot) in enumerate(loaded.items()):
+                if index in stored:
+                    found[user_id] = snapshot
+                else:
+                    unstored[user_id] = snapshot
+    except Exception as e:
+        logger.error(f"Profile cache lookup error for users {missing}: {str(e)}")
+        unstored = {}
+        found.update(_load_from_db([user_id for user_id in missing if user_id not in found]))
+
+    _remember(found)
+    result.update(found)
+    # 읽는 사이에 변경된 사용자의 스냅샷은 이번 응답에만 사용 (로컬에도 기억하지 않음)
+    result.update(unstored)
+    return result
+
+
+def get(user_id):
+    return get_many([user_id]).get(user_id)
+
+
+def peek(user_id):
+    """I/O 없이 사용할 수 있는 로컬 스냅샷 (없거나 만료됐으면 None)"""
+    entry = _local.get(user_id)
+    if entry is None or entry[1] <= time.monotonic():
+        return None
+    return entry[0]
+
+
+def invalidate(*user_ids):
+    """프로필 변경 시 로컬/Redis 스냅샷 제거 (버전을 올려 읽는 중인 이전 스냅샷이 기록되지 않게 함)"""
+    with _lock:
+        for user_id in user_ids:
+            _local.pop(user_id, None)
+    if not user_ids:
+        return
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        for user_id in user_ids:
+            pipe.incr(_version_key(user_id))
+            pipe.expire(_version_key(user_id), _version_ttl())
+        pipe.delete(*[_key(user_id) for user_id in user_ids])
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Profile cache invalidate error for users {user_ids}: {str(e)}")
@@ -0,0 +1,76 @@
+"""
+refresh token 재사용 감지
+
+블랙리스트 테이블 없이 refresh token을 회전(ROTATE_REFRESH_TOKENS)하면, 회전으로 대체된 이전
+token도 만료 전까지 다시 사용할 수 있다. 이를 막기 위해 로그인 한 번을 세션(sid 클레임, 처음
+발급된 refresh token의 jti)으로 보고, 세션에서 마지막으로 발급한 refresh jti를
+Redis(refresh:session:{sid})에 refresh token 수명만큼 저장한다. 갱신 요청의 jti가 저장된 값과
+같을 때만 새 jti로 바꾸고, 다르면 이미 대체된 token의 재사용으로 보고 세션을 폐기한다
+(탈취된 token과 정상 token 중 어느 쪽이 먼저 사용됐는지 알 수 없으므로 둘 다 거부).
+
+키가 없으면(Redis 데이터 유실, sid가 없는 이전 token) 그 요청부터 추적을 시작한다.
+Redis 장애 시에는 갱신을 막지 않고 로그만 남긴다. 로그아웃은 세대 번호(token_generation)로 처리한다.
+"""
+
+import logging
+
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+SESSION_CLAIM = 'sid'
+
+_REVOKED = 'revoked'
+
+# KEYS = [세션 키], ARGV = [요청한 jti, 새 jti, TTL, 폐기 표시]
+# 마지막으로 발급한 jti와 같거나 추적 전이면 새 jti로 교체, 아니면 세션 폐기
+_ROTATE = """
+local current = redis.call('GET', KEYS[1])
+if current == false or current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[3])
+return 0
+"""
+
+
+def _key(session_id):
+    return f"refresh:session:{session_id}"
+
+
+def _ttl():
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def start_session(refresh):
+    """로그인 시 발급한 refresh token으로 세션 시작"""
+    jti = refresh[api_settings.JTI_CLAIM]
+    refresh[SESSION_CLAIM] = jti
+    try:
+        get_redis_connection("default").set(_key(jti), jti, ex=_ttl())
+    except Exception as e:
+        logger.error(f"Refresh session start error for {jti}: {str(e)}")
+
+
+def rotate(refresh, previous_jti):
+    """
+    회전된 refresh token을 세션의 최신 token으로 기록
+
+    refresh에는 새 jti가 이미 설정되어 있어야 한다. previous_jti가 세션의 최신 token이 아니면 False.
+    """
+    session_id = refresh.get(SESSION_CLAIM) or previous_jti
+    refresh[SESSION_CLAIM] = session_id
+    try:
+        redis = get_redis_connection("default")
+        rotated = redis.register_script(_ROTATE)(
+            keys=[_key(session_id)],
+            args=[previous_jti, refresh[api_settings.JTI_CLAIM], _ttl(), _REVOKED],
+        )
+    except Exception as e:
+        logger.error(f"Refresh session rotate error for {session_id}: {str(e)}")
+        return True
+    if not rotated:
+        logger.warning(f"Refresh token reuse detected, session {session_id} revoked")
+    return bool(rotated)
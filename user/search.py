@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from user import friend_graph
+from user.models import User
+
+# 친구 → 채팅 상대 → 그 외 사용자 순으로 정렬
+RANK_FRIEND = 0
+RANK_CHAT_PARTNER = 1
+RANK_OTHER = 2
+
+# 이보다 짧은 검색어는 trigram 인덱스를 쓸 수 없으므로 접두어 검색으로 처리
+MIN_CONTAINS_LENGTH = 3
+
+
+class InvalidSearchCursor(ValueError):
+    pass
+
+
+def encode_cursor(user):
+    raw = json.dumps([user.search_rank, user.username, user.id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, username, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return int(rank), str(username), int(user_id)
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        raise InvalidSearchCursor("잘못된 커서입니다.")
+
+
+def get_related_user_ids(user):
+    """검색 결과 우선순위용 친구 ID와 채팅 상대 ID"""
+    from chat.models import ChatParticipant
+
+    friend_ids = friend_graph.get_friend_ids(user.id)
+
+    partner_ids = set(
+        ChatParticipant.objects.filter(
+            room_id__in=ChatParticipant.objects.filter(user=user).values('room_id')
+        ).exclude(user=user).values_list('user_id', flat=True)
+    )
+    return friend_ids, partner_ids - friend_ids
+
+
+def get_prefix_candidates(query):
+    """접두어가 일치하는 사용자 ID 상위 목록 (자주 쓰이는 접두어는 짧은 시간 캐시)"""
+    cache_key = f"user_search:prefix:{query.upper()}"
+    candidate_ids = cache.get(cache_key)
+    if candidate_ids is None:
+        candidate_ids = list(
+            User.objects.filter(username__istartswith=query)
+            .order_by('username')
+            .values_list('id', flat=True)[:getattr(settings, 'USER_SEARCH_PREFIX_CANDIDATES', 200)]
+        )
+        cache.set(cache_key, candidate_ids, getattr(settings, 'USER_SEARCH_CACHE_TTL', 30))
+    return candidate_ids
+
+
+def search_users(user, query, mode='contains', cursor=None, limit=20):
+    """
+    사용자 검색
+
+    mode='prefix'는 자동완성용 접두어 검색으로, 캐시된 후보 목록(username 순 상위
+    USER_SEARCH_PREFIX_CANDIDATES명)과 친구/채팅 상대 중 접두어가 일치하는 사용자만 대상으로 한다.
+    따라서 친구/채팅 상대가 아닌 사용자는 그 수를 넘으면 결과에 나오지 않는다. mode='contains'는
+    trigram 인덱스를 사용하는 부분 문자열 검색이며, MIN_CONTAINS_LENGTH보다 짧은 검색어는 prefix로
+    처리한다. 결과는 (순위, username, id) 기준 keyset 페이지로 반환하고, 실제 사용한 mode와
+    후보 상한(prefix가 아니면 None)을 함께 담는다.
+    """
+    friend_ids, partner_ids = get_related_user_ids(user)
+
+    if mode == 'prefix' or len(query) < MIN_CONTAINS_LENGTH:
+        mode = 'prefix'
+        candidate_limit = getattr(settings, 'USER_SEARCH_PREFIX_CANDIDATES', 200)
+        related_ids = friend_ids | partner_ids
+        condition = Q(id__in=get_prefix_candidates(query))
+        if related_ids:
+            condition |= Q(id__in=related_ids, username__istartswith=query)
+    else:
+        mode = 'contains'
+        candidate_limit = None
+        condition = Q(username__icontains=query)
+
+    queryset = User.objects.filter(condition).exclude(id=user.id).annotate(
+        search_rank=Case(
+            When(id__in=friend_ids, then=Value(RANK_FRIEND)),
+            When(id__in=partner_ids, then=Value(RANK_CHAT_PARTNER)),
+            default=Value(RANK_OTHER),
+            output_field=IntegerField()
+        )
+    )
+
+    if cursor:
+        rank, username, user_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(search_rank__gt=rank)
+            | Q(search_rank=rank, username__gt=username)
+            | Q(search_rank=rank, username=username, id__gt=user_id)
+        )
+
+    users = list(queryset.order_by('search_rank', 'username', 'id')[:limit + 1])
+    has_more = len(users) > limit
+    users = users[:limit]
+    return {
+        'users': users,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(users[-1]) if users and has_more else None,
+        'mode': mode,
+        'candidate_limit': candidate_limit,
+    }
@@ -1,10 +1,13 @@
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from user.models import User, EmailVerification, Friendship
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from user.models import User, Friendship
 from user.utils import send_verification_email
+from user import images, presence, profile_cache, refresh_sessions, token_generation, verification
 import re
-import random
 
 # 이메일 요청
 class EmailVerificationSerializer(serializers.Serializer):
@@ -12,14 +15,10 @@ class EmailVerificationSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         email = validated_data['email']
-        EmailVerification.objects.filter(email=email).delete()
-        verification_code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-        email_verification = EmailVerification.objects.create(
-            email=email,
-            verification_code=verification_code
-        )
+        # 인증 상태는 Redis에 TTL과 함께 저장 (이전 인증번호는 덮어씀)
+        verification_code = verification.issue_code(email)
         send_verification_email(email, verification_code)
-        return email_verification
+        return validated_data
 
 # 인증번호 유효성 검사
 class VerifyCodeSerializer(serializers.Serializer):
@@ -28,22 +27,15 @@ class VerifyCodeSerializer(serializers.Serializer):
     verification_code = serializers.CharField(max_length=6)
     # 인증번호의 유효성을 검사
     def validate(self, data):
-        try:
-            # 해당 이메일과 인증번호로 인증 레코드를 조회
-            verification = EmailVerification.objects.get(
-                email=data['email'], 
-                verification_code=data['verification_code']
-            )
-            # 인증번호 만료 확인
-            if verification.is_expired():
-                raise serializers.ValidationError("인증번호가 만료되었습니다.")
-            
-            verification.is_verified = True
-            verification.save()
-            return data
-        
-        except EmailVerification.DoesNotExist:
+        # 인증번호 확인과 사용 처리를 한 번에 수행 (틀린 횟수는 Redis에서 집계)
+        result = verification.check_code(data['email'], data['verification_code'])
+        if result == verification.EXPIRED:
+            raise serializers.ValidationError("인증번호가 만료되었습니다.")
+        if result == verification.LOCKED:
+            raise serializers.ValidationError("인증 시도 횟수를 초과했습니다. 인증번호를 다시 요청해주세요.")
+        if result == verification.MISMATCH:
             raise serializers.ValidationError("잘못된 인증번호입니다.")
+        return data
 
 # 회원가입
 class UserSerializer(serializers.ModelSerializer):  # Django REST framework의 ModelSerializer를 상속받아 사용자 정보를 직렬화하는 클래스
@@ -61,18 +53,15 @@ class UserSerializer(serializers.ModelSerializer):  # Django REST framework의 M
 
     def create(self, validated_data):  # 새 사용자를 생성하는 메서드로, 사용자 비밀번호를 안전하게 저장하도록 처리
         email = validated_data.get('email')
-        verification = EmailVerification.objects.filter(
-            email=email, 
-            is_verified=True
-        ).first()
-        
-        if not verification:
+        if not verification.is_verified(email):
             raise serializers.ValidationError("이메일 인증이 필요합니다.")
         
         user = super().create(validated_data)  # 기본 직렬화 클래스의 `create` 메서드를 호출하여 사용자 객체 생성
         user.set_password(validated_data['password'])  # 비밀번호를 해싱하여 저장. Django의 `set_password` 메서드는 암호화를 처리
         user.is_email_verified = True # 이메일 인증유무 확인
         user.save()  # 변경된 비밀번호를 포함하여 사용자 객체를 데이터베이스에 저장
+        # 인증 완료 상태는 가입이 커밋된 뒤에 사용 처리 (가입이 실패하면 다시 시도할 수 있도록)
+        transaction.on_commit(lambda: verification.consume_verified(email))
         return user  # 새로 생성된 사용자 객체를 반환
     
 class CustomObtainPairSerializer(TokenObtainPairSerializer):
@@ -81,12 +70,30 @@ class CustomObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['username'] = user.username
         token['is_admin'] = user.is_admin
-
-        user.is_online = True
-        user.save()
-
+        # 로그아웃 시 이전 토큰을 한 번에 무효화하기 위한 세대 번호
+        token[token_generation.GENERATION_CLAIM] = token_generation.get_generation(user.id, max_age=0)
+        # 회전으로 대체된 refresh token의 재사용을 막기 위한 세션 시작
+        refresh_sessions.start_session(token)
         return token
 
+# 토큰 갱신 (블랙리스트 테이블 대신 세대 번호로 폐기 여부, 세션별 최신 jti로 재사용 여부 확인)
+class GenerationTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if not token_generation.is_current(refresh):
+            raise InvalidToken("Token has been revoked")
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            previous_jti = refresh[api_settings.JTI_CLAIM]
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            if not refresh_sessions.rotate(refresh, previous_jti):
+                raise InvalidToken("Token has been reused")
+            data['refresh'] = str(refresh)
+        return data
+
 class PasswordValidator:
     @staticmethod
     def validate_password(password):
@@ -119,7 +126,7 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
             raise serializers.ValidationError("새 비밀번호가 일치하지 않습니다.")
         
         # 이메일 인증 확인
-        if not EmailVerification.objects.filter(email=data['email'], is_verified=True).exists():
+        if not verification.is_verified(data['email']):
             raise serializers.ValidationError("이메일 인증을 먼저 완료해주세요.")
         
         return data
@@ -142,12 +149,61 @@ class PasswordChangeSerializer(serializers.Serializer):
         
         return data
 
+# 접속 상태(presence) 조회용 mixin
+class PresenceSerializerMixin:
+    def is_user_online(self, user_id):
+        """context의 online_map(presence.get_many 결과)을 우선 사용하고, 없으면 개별 조회"""
+        online_map = self.context.get('online_map')
+        if online_map is not None and user_id in online_map:
+            return online_map[user_id]
+        return presence.is_online(user_id)
+
+# 프로필 스냅샷 조회용 mixin
+class ProfileSnapshotMixin:
+    def get_profile_ids(self, obj):
+        """obj를 렌더링하는 데 필요한 사용자 ID 목록 (ProfileListSerializer가 미리 조회)"""
+        return []
+
+    def get_profile(self, user_id):
+        """context의 profiles(profile_cache.get_many 결과)를 우선 사용하고, 없으면 개별 조회"""
+        if user_id is None:
+            return None
+        profiles = self.context.get('profiles')
+        if profiles is not None and user_id in profiles:
+            return profiles[user_id]
+        return profile_cache.get(user_id)
+
+class ProfileListSerializer(serializers.ListSerializer):
+    """목록 렌더링 전에 항목들에 필요한 프로필 스냅샷을 한 번에 조회"""
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        user_ids = {user_id for item in items for user_id in self.child.get_profile_ids(item) if user_id is not None}
+        profiles = self.context.setdefault('profiles', {})
+        missing = user_ids - profiles.keys()
+        if missing:
+            found = profile_cache.get_many(missing)
+            # 없는 사용자도 None으로 기록해 항목마다 다시 조회하지 않도록 함
+            profiles.update({user_id: found.get(user_id) for user_id in missing})
+        return super().to_representation(items)
+
 # 사용자 검색 및 친구 목록
-class UserSearchSerializer(serializers.ModelSerializer):
+class UserSearchSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
+    is_online = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = ['id', 'username', 'updated_at', 'is_online', 'image']  # 필요한 필드만 포함
 
+    def get_is_online(self, obj):
+        return self.is_user_online(obj.id)
+
+    def get_image(self, obj):
+        # 목록에서는 avatar 크기 이미지 사용
+        url = images.image_url(obj, 'avatar')
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 # 친구 요청
 class FriendshipSerializer(serializers.ModelSerializer):
     from_user = serializers.StringRelatedField()  # 요청을 보낸 사용자
@@ -162,10 +218,20 @@ class FriendRequestActionSerializer(serializers.Serializer):
     username = serializers.CharField()  # 수락 또는 거절할 친구 요청의 사용자 이름
 
 # 프로필 
-class UserProfileSerializers(serializers.ModelSerializer):
+class UserProfileSerializers(PresenceSerializerMixin, serializers.ModelSerializer):
+    is_online = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = '__all__'
+
+    def get_is_online(self, obj):
+        return self.is_user_online(obj.id)
+
+    def get_image_variants(self, obj):
+        # 크기별 이미지 URL (처리 전이면 모두 원본)
+        return {variant: images.image_url(obj, variant) for variant in images.VARIANT_SIZES}
         
 # 프로필 수정
 class UserProfileUpdateSerializers(serializers.ModelSerializer):
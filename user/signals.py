@@ -1,10 +1,41 @@
+import logging
 from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.conf import settings
+from middlewares.token_cache import token_user_cache
+from user import friend_graph, presence, profile_cache
+from user.models import Friendship, User
+
+logger = logging.getLogger(__name__)
 
 @receiver(user_logged_out)
 def set_user_offline(sender, request, user, **kwargs):
     if user is not None:  # 로그아웃 시 익명 사용자를 방지
-        user.is_online = False
-        user.save()
-        print(f"User {user.username}는 오프라인입니다.")
\ No newline at end of file
+        presence.clear(user.id)
+        logger.info(f"User {user.username}는 오프라인입니다.")
+
+@receiver(post_save, sender=User)
+def invalidate_token_user_cache(sender, instance, **kwargs):
+    # 프로필 변경 시 토큰 캐시에 남은 이전 사용자 정보 제거
+    token_user_cache.invalidate_user(instance.id)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    # 커밋 전후 모두 제거 (커밋 전에 다른 요청이 이전 값을 다시 채워 넣었을 수 있으므로)
+    user_id = instance.id
+    profile_cache.invalidate(user_id)
+    transaction.on_commit(lambda: profile_cache.invalidate(user_id))
+
+@receiver(post_save, sender=Friendship)
+def update_friend_graph_on_save(sender, instance, **kwargs):
+    # 커밋된 뒤에 양쪽 친구 그래프에 반영 (수락되지 않은 요청은 친구가 아님)
+    change = friend_graph.add_friendship if instance.accepted else friend_graph.remove_friendship
+    transaction.on_commit(lambda: change(instance.from_user_id, instance.to_user_id))
+
+@receiver(post_delete, sender=Friendship)
+def update_friend_graph_on_delete(sender, instance, **kwargs):
+    # 커밋된 뒤에 양쪽 친구 그래프에서 제거
+    transaction.on_commit(lambda: friend_graph.remove_friendship(instance.from_user_id, instance.to_user_id))
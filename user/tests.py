@@ -1,3 +1,734 @@
-from django.test import TestCase
+import asyncio
+import io
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.mail import EmailMessage
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django_redis import get_redis_connection
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from chat import partners as chat_partners
+from chat.models import ChatParticipant, ChatRoom
+from middlewares.jwt_middleware import JWTWebSocketMiddleware, UniversalJWTAuthMiddleware
+from middlewares.token_cache import TokenUserCache, get_user_for_token, token_user_cache
+from realtime import fanout
+from user import friend_graph, images, profile_cache, refresh_sessions, search, token_generation, verification
+from user.consumers import UserStatusConsumer
+from user.mail_queue import OutboundMailQueue
+from user.models import Friendship, User
+from user.serializers import (
+    CustomObtainPairSerializer, EmailVerificationSerializer, GenerationTokenRefreshSerializer, UserSerializer,
+)
+
+
+class TokenUserCacheTests(SimpleTestCase):
+    def make_user(self, user_id=1):
+        return User(id=user_id, email=f'user{user_id}@test.local', username=f'user{user_id}')
+
+    def test_returns_copy_of_cached_user(self):
+        cache = TokenUserCache()
+        user = self.make_user()
+        cache.set('jti-1', user)
+        user.username = 'changed_by_caller'
+
+        first = cache.get('jti-1')
+        first.username = 'changed_by_request'
+        self.assertEqual(cache.get('jti-1').username, 'user1')
+        self.assertIsNot(cache.get('jti-1'), cache.get('jti-1'))
+
+    def test_invalidate_user_removes_all_tokens(self):
+        cache = TokenUserCache()
+        cache.set('jti-1', self.make_user(1))
+        cache.set('jti-2', self.make_user(1))
+        cache.set('jti-3', self.make_user(2))
+        cache.invalidate_user(1)
+        self.assertIsNone(cache.get('jti-1'))
+        self.assertIsNone(cache.get('jti-2'))
+        self.assertEqual(cache.get('jti-3').id, 2)
+
+    def test_entry_expires_at_token_exp(self):
+        cache = TokenUserCache(ttl=60)
+        cache.set('jti-1', self.make_user(), token_exp=time.time() - 1)
+        self.assertIsNone(cache.get('jti-1'))
+
+    def test_entry_with_other_version_is_a_miss(self):
+        cache = TokenUserCache()
+        cache.set('jti-1', self.make_user(), version=3)
+        self.assertEqual(cache.get('jti-1', version=3).id, 1)
+        self.assertIsNone(cache.get('jti-1', version=4))
+        self.assertIsNone(cache.get('jti-1', version=3))
+
+    def test_lru_evicts_oldest(self):
+        cache = TokenUserCache(max_size=2)
+        cache.set('jti-1', self.make_user(1))
+        cache.set('jti-2', self.make_user(2))
+        cache.get('jti-1')
+        cache.set('jti-3', self.make_user(3))
+        self.assertIsNone(cache.get('jti-2'))
+        self.assertIsNotNone(cache.get('jti-1'))
+
+
+class TokenUserLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.bulk_create([User(email='lookup@test.local', username='before')])[0]
+
+    def setUp(self):
+        token_user_cache.clear()
+        token_generation._local.clear()
+        self.addCleanup(profile_cache.invalidate, self.user.id)
+
+    def change_in_other_process(self, username):
+        # 다른 프로세스의 변경: 이 프로세스의 토큰 캐시는 그대로 두고 프로필 버전만 올라감
+        User.objects.filter(id=self.user.id).update(username=username)
+        profile_cache.invalidate(self.user.id)
+
+    def test_cached_user_is_reused_within_token_lifetime(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(get_user_for_token(token).username, 'before')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_for_token(token).username, 'before')
+
+    def test_change_in_other_process_is_seen_after_check_interval(self):
+        token = AccessToken.for_user(self.user)
+        get_user_for_token(token)
+        self.change_in_other_process('after')
+        # 확인 주기 안에서는 기억된 버전을 사용
+        self.assertEqual(get_user_for_token(token).username, 'before')
+        token_generation._local.clear()
+        self.assertEqual(get_user_for_token(token).username, 'after')
+
+
+class FlakyConnection:
+    """지정한 수신자에게 보낼 때 한 번 실패하는 메일 연결"""
+
+    def __init__(self, fail_for):
+        self.fail_for = set(fail_for)
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.fail_for:
+                self.fail_for.discard(message.to[0])
+                raise ConnectionError('connection reset')
+            self.sent.append(message.to[0])
+        return len(messages)
+
+
+class OutboundMailQueueTests(SimpleTestCase):
+    def make_batch(self, *recipients):
+        return [(EmailMessage('subject', 'body', to=[recipient]), 0) for recipient in recipients]
+
+    def queued(self, mail_queue):
+        return [(message.to[0], attempts) for message, attempts in mail_queue._queue.queue]
+
+    def test_failed_batch_requeues_only_unsent_messages(self):
+        mail_queue = OutboundMailQueue(retry_delay=0)
+        connection = FlakyConnection(fail_for=['b@test.local'])
+        batch = self.make_batch('a@test.local', 'b@test.local', 'c@test.local')
+        for item in batch:
+            mail_queue._queue.put(item)
+            mail_queue._queue.get_nowait()
+
+        with mock.patch('user.mail_queue.get_connection', return_value=connection):
+            mail_queue._send_batch(batch)
+            self.assertEqual(connection.sent, ['a@test.local'])
+            self.assertEqual(self.queued(mail_queue), [('b@test.local', 1), ('c@test.local', 1)])
+
+            retry = [mail_queue._queue.get_nowait() for _ in range(2)]
+            mail_queue._send_batch(retry)
+
+        self.assertEqual(connection.sent, ['a@test.local', 'b@test.local', 'c@test.local'])
+        self.assertEqual(mail_queue.sent_total, 3)
+        self.assertEqual(mail_queue.queue_depth, 0)
+
+    def test_message_is_dropped_after_max_retries(self):
+        mail_queue = OutboundMailQueue(max_retries=1, retry_delay=0)
+        batch = self.make_batch('a@test.local')
+        mail_queue._queue.put(batch[0])
+        mail_queue._queue.get_nowait()
+
+        with mock.patch('user.mail_queue.get_connection', return_value=FlakyConnection(fail_for=['a@test.local'])):
+            mail_queue._send_batch(batch)
+
+        self.assertEqual(mail_queue.dropped_total, 1)
+        self.assertEqual(mail_queue.queue_depth, 0)
+
+
+class VerificationTests(SimpleTestCase):
+    email = 'verify@test.local'
+
+    def tearDown(self):
+        get_redis_connection("default").delete(verification._key(self.email))
+
+    def wrong_code(self, code):
+        return f"{(int(code) + 1) % 10 ** 6:06d}"
+
+    def test_wrong_code_after_verified_is_rejected(self):
+        code = verification.issue_code(self.email)
+        self.assertEqual(verification.check_code(self.email, code), verification.VERIFIED)
+        self.assertEqual(verification.check_code(self.email, self.wrong_code(code)), verification.MISMATCH)
+        self.assertEqual(verification.check_code(self.email, code), verification.VERIFIED)
+
+    @override_settings(EMAIL_VERIFICATION_MAX_ATTEMPTS=2)
+    def test_locked_after_max_attempts(self):
+        code = verification.issue_code(self.email)
+        for _ in range(2):
+            self.assertEqual(verification.check_code(self.email, self.wrong_code(code)), verification.MISMATCH)
+        self.assertEqual(verification.check_code(self.email, code), verification.LOCKED)
+        self.assertFalse(verification.is_verified(self.email))
+
+    def test_verified_state_is_consumed_once(self):
+        code = verification.issue_code(self.email)
+        self.assertFalse(verification.consume_verified(self.email))
+        verification.check_code(self.email, code)
+        self.assertTrue(verification.consume_verified(self.email))
+        self.assertFalse(verification.consume_verified(self.email))
+        self.assertEqual(verification.check_code(self.email, code), verification.EXPIRED)
+
+
+    def test_code_email_is_enqueued_immediately(self):
+        # 트랜잭션 커밋을 기다리지 않고 바로 발송 큐에 들어감
+        with mock.patch('user.verification.issue_code', return_value='123456'), \
+                mock.patch('user.utils.get_mail_queue') as get_mail_queue:
+            EmailVerificationSerializer().create({'email': self.email})
+        message = get_mail_queue.return_value.enqueue.call_args.args[0]
+        self.assertEqual(message.to, [self.email])
+        self.assertIn('123456', message.body)
+
+
+class SignupVerificationTests(TestCase):
+    email = 'signup@test.local'
+
+    def tearDown(self):
+        get_redis_connection("default").delete(verification._key(self.email))
+
+    def test_verification_is_consumed_after_commit(self):
+        verification.check_code(self.email, verification.issue_code(self.email))
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSerializer().create({
+                'email': self.email, 'username': 'signup_user', 'password': 'Passw0rd!', 'gender': '남성',
+            })
+            # 커밋 전에는 인증 완료 상태가 남아 있음
+            self.assertTrue(verification.is_verified(self.email))
+        self.assertFalse(verification.is_verified(self.email))
+        self.assertTrue(User.objects.filter(email=self.email).exists())
+
+    def test_signup_requires_verification(self):
+        with self.assertRaises(serializers.ValidationError):
+            UserSerializer().create({'email': self.email, 'username': 'signup_user', 'password': 'Passw0rd!'})
+        self.assertFalse(User.objects.filter(email=self.email).exists())
+
+
+class ProfileCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.bulk_create([User(email='profile@test.local', username='before')])[0]
+
+    def setUp(self):
+        profile_cache.invalidate(self.user.id)
+        self.addCleanup(profile_cache.invalidate, self.user.id)
+
+    def rename(self, username):
+        # save()를 거치지 않아 시그널의 캐시 제거가 실행되지 않음
+        User.objects.filter(id=self.user.id).update(username=username)
+
+    def test_snapshot_is_cached_until_invalidated(self):
+        self.assertEqual(profile_cache.get(self.user.id)['username'], 'before')
+        self.rename('after')
+        self.assertEqual(profile_cache.get(self.user.id)['username'], 'before')
+        profile_cache.invalidate(self.user.id)
+        self.assertEqual(profile_cache.get(self.user.id)['username'], 'after')
+
+    def test_stale_snapshot_is_not_written_after_invalidate(self):
+        load_from_db = profile_cache._load_from_db
+
+        def load_then_update(user_ids):
+            snapshots = load_from_db(user_ids)
+            # DB를 읽은 직후 다른 요청이 프로필을 바꾸고 캐시를 지움
+            self.rename('after')
+            profile_cache.invalidate(self.user.id)
+            return snapshots
+
+        with mock.patch('user.profile_cache._load_from_db', side_effect=load_then_update):
+            self.assertEqual(profile_cache.get(self.user.id)['username'], 'before')
+        self.assertIsNone(get_redis_connection("default").get(profile_cache._key(self.user.id)))
+        self.assertIsNone(profile_cache.peek(self.user.id))
+        self.assertEqual(profile_cache.get(self.user.id)['username'], 'after')
+
+
+def _direct(func):
+    """database_sync_to_async 대신 같은 스레드에서 바로 실행"""
+    async def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _status_event(user_id):
+    return {
+        'type': 'status_message',
+        'message': '로그인 되었습니다.',
+        'is_online': True,
+        'user_id': user_id,
+        'username': f'user{user_id}',
+        'updated_at': '2026-01-01T00:00:00+00:00',
+    }
+
+
+@override_settings(CHAT_FANOUT_MODE=fanout.INBOX)
+class InboxFanoutTests(SimpleTestCase):
+    def make_consumer(self):
+        consumer = UserStatusConsumer()
+        consumer.user = User(id=1, email='user1@test.local', username='user1')
+        consumer.friend_ids = {2}
+        consumer.send_data = mock.AsyncMock()
+        return consumer
+
+    def test_connection_subscribes_to_own_inbox_only(self):
+        self.assertEqual(fanout.subscription_groups(1, [1, 2, 3]), ['inbox_1'])
+
+    def test_status_message_ignores_users_not_followed(self):
+        consumer = self.make_consumer()
+
+        async def scenario():
+            for user_id in (1, 2, 3):
+                await consumer.status_message(_status_event(user_id))
+
+        asyncio.run(scenario())
+        # 3번 사용자는 채팅 상대일 뿐 친구가 아니므로 전달하지 않음
+        self.assertEqual([call.args[0]['user_id'] for call in consumer.send_data.await_args_list], [1, 2])
+
+    @mock.patch('realtime.fanout.database_sync_to_async', _direct)
+    def test_event_is_sent_to_each_audience_inbox(self):
+        async def scenario():
+            layer = InMemoryChannelLayer()
+            channels = {}
+            for user_id in (1, 2, 3):
+                channels[user_id] = await layer.new_channel()
+                await layer.group_add(fanout.inbox_group(user_id), channels[user_id])
+            # 캐시에 없으면 DB에서 채우는 경로로 수신자를 구함
+            with mock.patch('realtime.fanout.get_cached_status_audience', return_value=None), \
+                    mock.patch('realtime.fanout.get_status_audience', return_value={1, 2}):
+                await fanout.publish_user_event(layer, 1, _status_event(1))
+            received = {}
+            for user_id in (1, 2):
+                received[user_id] = await asyncio.wait_for(layer.receive(channels[user_id]), timeout=1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channels[3]), timeout=0.05)
+            return received
+
+        received = asyncio.run(scenario())
+        self.assertEqual({event['user_id'] for event in received.values()}, {1})
+
+
+def _direct_thread(func, thread_sensitive=True):
+    return _direct(func)
+
+
+@override_settings(CHAT_FANOUT_MODE=fanout.INBOX)
+class StatusAudienceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend, cls.partner, cls.stranger = User.objects.bulk_create([
+            User(email=f'audience{i}@test.local', username=f'audience{i}') for i in range(4)
+        ])
+        Friendship.objects.bulk_create([Friendship(from_user=cls.user, to_user=cls.friend, accepted=True)])
+        cls.room = ChatRoom.objects.create(room_type='direct')
+        cls.room.participants.add(cls.user, cls.partner)
+
+    def setUp(self):
+        user_ids = [self.user.id, self.friend.id, self.partner.id, self.stranger.id]
+        friend_graph.invalidate(*user_ids)
+        chat_partners.invalidate(*user_ids)
+        self.addCleanup(friend_graph.invalidate, *user_ids)
+        self.addCleanup(chat_partners.invalidate, *user_ids)
+
+    def test_audience_is_loaded_once_then_served_from_cache(self):
+        self.assertIsNone(fanout.get_cached_status_audience(self.user.id))
+        expected = {self.user.id, self.friend.id, self.partner.id}
+        self.assertEqual(fanout.get_status_audience(self.user.id), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(fanout.get_cached_status_audience(self.user.id), expected)
+
+    @mock.patch('realtime.fanout.sync_to_async', _direct_thread)
+    @mock.patch('realtime.fanout.database_sync_to_async', side_effect=AssertionError('DB를 조회하면 안 됨'))
+    def test_publish_with_cached_audience_does_not_touch_db(self, database_sync_to_async):
+        fanout.get_status_audience(self.user.id)
+
+        async def scenario():
+            layer = InMemoryChannelLayer()
+            channels = {}
+            for target in (self.user, self.friend, self.partner, self.stranger):
+                channels[target.id] = await layer.new_channel()
+                await layer.group_add(fanout.inbox_group(target.id), channels[target.id])
+            await fanout.publish_user_event(layer, self.user.id, _status_event(self.user.id))
+            for target in (self.user, self.friend, self.partner):
+                await asyncio.wait_for(layer.receive(channels[target.id]), timeout=1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channels[self.stranger.id]), timeout=0.05)
+
+        with self.assertNumQueries(0):
+            asyncio.run(scenario())
+        database_sync_to_async.assert_not_called()
+
+    def test_membership_changes_invalidate_partner_sets(self):
+        fanout.get_status_audience(self.user.id)
+        fanout.get_status_audience(self.stranger.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            room = ChatRoom.objects.create(room_type='direct')
+            room.participants.add(self.user, self.stranger)
+        self.assertIsNone(chat_partners.get_cached_partner_ids(self.user.id))
+        self.assertIn(self.stranger.id, fanout.get_status_audience(self.user.id))
+        self.assertEqual(chat_partners.get_partner_ids(self.stranger.id), {self.user.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.participants.remove(self.partner)
+        self.assertNotIn(self.partner.id, fanout.get_status_audience(self.user.id))
+        self.assertEqual(chat_partners.get_partner_ids(self.partner.id), set())
+
+    def test_stale_load_is_not_stored_after_membership_change(self):
+        load_from_db = chat_partners._load_from_db
+
+        def load_then_change(user_id):
+            partner_ids = load_from_db(user_id)
+            # DB를 읽은 직후 다른 요청이 상대를 채팅방에서 내보내고 커밋함
+            ChatParticipant.objects.filter(room=self.room, user=self.partner).delete()
+            chat_partners.invalidate_rooms([self.room.id], [self.partner.id])
+            return partner_ids
+
+        with mock.patch('chat.partners._load_from_db', side_effect=load_then_change):
+            self.assertEqual(chat_partners.get_partner_ids(self.user.id), {self.partner.id})
+        self.assertIsNone(chat_partners.get_cached_partner_ids(self.user.id))
+        self.assertEqual(chat_partners.get_partner_ids(self.user.id), set())
+
+
+class SearchUsersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend, cls.partner, cls.other_a, cls.other_b = User.objects.bulk_create([
+            User(email='searcher@test.local', username='searcher'),
+            User(email='kim_f@test.local', username='kim_zz_friend'),
+            User(email='kim_p@test.local', username='kim_yy_partner'),
+            User(email='kim_a@test.local', username='kim_aa_other'),
+            User(email='kim_b@test.local', username='kim_bb_other'),
+        ])
+        Friendship.objects.bulk_create([Friendship(from_user=cls.user, to_user=cls.friend, accepted=True)])
+        room = ChatRoom.objects.create(room_type='direct')
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(room=room, user=cls.user),
+            ChatParticipant(room=room, user=cls.partner),
+        ])
+
+    def setUp(self):
+        # bulk_create는 시그널을 보내지 않으므로 친구 그래프 캐시를 직접 비움
+        friend_graph.invalidate(self.user.id, self.friend.id)
+        cache.delete('user_search:prefix:KI')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def usernames(self, result):
+        return [user.username for user in result['users']]
+
+    def test_friend_then_partner_then_others_by_username(self):
+        result = search.search_users(self.user, 'kim_')
+        self.assertEqual(
+            self.usernames(result), ['kim_zz_friend', 'kim_yy_partner', 'kim_aa_other', 'kim_bb_other']
+        )
+        self.assertEqual(result['mode'], 'contains')
+        self.assertIsNone(result['candidate_limit'])
+
+    def test_cursor_round_trip_visits_every_user_once(self):
+        seen = []
+        cursor = None
+        while True:
+            result = search.search_users(self.user, 'kim_', cursor=cursor, limit=1)
+            seen += self.usernames(result)
+            if not result['has_more']:
+                break
+            cursor = result['next_cursor']
+        self.assertEqual(seen, ['kim_zz_friend', 'kim_yy_partner', 'kim_aa_other', 'kim_bb_other'])
+
+    @override_settings(USER_SEARCH_PREFIX_CANDIDATES=1)
+    def test_short_query_reports_prefix_mode_and_cap(self):
+        response = self.client.get(reverse('search_users'), {'username': 'ki'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['mode'], 'prefix')
+        self.assertEqual(response.data['candidate_limit'], 1)
+        # 친구/채팅 상대는 상한과 관계없이 포함되고, 그 외 사용자는 상한까지만 포함
+        self.assertEqual(
+            [user['username'] for user in response.data['users']],
+            ['kim_zz_friend', 'kim_yy_partner', 'kim_aa_other'],
+        )
+
+    def test_invalid_cursor_returns_400(self):
+        response = self.client.get(reverse('search_users'), {'username': 'kim_', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], '잘못된 커서입니다.')
+
+
+class FriendGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend, cls.other = User.objects.bulk_create([
+            User(email='graph@test.local', username='graph_user'),
+            User(email='graph_friend@test.local', username='graph_friend'),
+            User(email='graph_other@test.local', username='graph_other'),
+        ])
+        Friendship.objects.bulk_create([Friendship(from_user=cls.user, to_user=cls.friend, accepted=True)])
+
+    def setUp(self):
+        user_ids = (self.user.id, self.friend.id, self.other.id)
+        friend_graph.invalidate(*user_ids)
+        self.addCleanup(friend_graph.invalidate, *user_ids)
+
+    def cached(self, user_id):
+        return get_redis_connection("default").exists(friend_graph._key(user_id))
+
+    def test_loads_from_db_on_miss_only(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(friend_graph.get_friend_ids(self.user.id), {self.friend.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_graph.get_friend_ids(self.user.id), {self.friend.id})
+        self.assertEqual(friend_graph.get_friend_ids(self.other.id), set())
+
+    def test_accept_and_delete_update_loaded_sets_in_place(self):
+        friend_graph.get_friend_ids(self.user.id)
+        friend_graph.get_friend_ids(self.other.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            request = Friendship.objects.create(from_user=self.other, to_user=self.user)
+        # 대기 중인 요청은 친구가 아님
+        self.assertFalse(friend_graph.are_friends(self.user.id, self.other.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request.accepted = True
+            request.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_graph.get_friend_ids(self.user.id), {self.friend.id, self.other.id})
+            self.assertEqual(friend_graph.get_friend_ids(self.other.id), {self.user.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_graph.get_friend_ids(self.user.id), {self.friend.id})
+            self.assertEqual(friend_graph.get_friend_ids(self.other.id), set())
+
+    def test_change_does_not_create_unloaded_set(self):
+        friend_graph.add_friendship(self.user.id, self.other.id)
+        self.assertFalse(self.cached(self.user.id))
+        self.assertFalse(self.cached(self.other.id))
+
+    def test_stale_load_is_not_stored_after_concurrent_change(self):
+        load_from_db = friend_graph._load_from_db
+
+        def load_then_change(user_id):
+            friend_ids = load_from_db(user_id)
+            # DB를 읽은 직후 다른 요청이 친구 관계를 삭제하고 커밋함
+            Friendship.objects.filter(from_user=self.user, to_user=self.friend).delete()
+            friend_graph.remove_friendship(self.user.id, self.friend.id)
+            return friend_ids
+
+        with mock.patch('user.friend_graph._load_from_db', side_effect=load_then_change):
+            self.assertEqual(friend_graph.get_friend_ids(self.user.id), {self.friend.id})
+        self.assertFalse(self.cached(self.user.id))
+        self.assertEqual(friend_graph.get_friend_ids(self.user.id), set())
+
+
+def _image_bytes(size, color='red', orientation=None):
+    image = Image.new('RGB', size, color)
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(buffer, format='JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class TempStorageMixin:
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name)
+        patcher = mock.patch('user.images.default_storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ProfileImageRenderTests(TempStorageMixin, SimpleTestCase):
+    def decode(self, content):
+        return Image.open(io.BytesIO(content))
+
+    def test_variants_are_bounded_by_configured_sizes(self):
+        variants = images.render_variants(_image_bytes((2000, 1000)))
+        sizes = {variant: self.decode(content).size for variant, (content, _) in variants.items()}
+        self.assertEqual(sizes, {'avatar': (64, 32), 'sidebar': (128, 64), 'full': (1024, 512)})
+
+    def test_exif_rotation_is_applied_then_stripped(self):
+        # orientation 6: 카메라 기준 90도 회전된 사진 (가로 40, 세로 20으로 저장됨)
+        variants = images.render_variants(_image_bytes((40, 20), orientation=6))
+        full = self.decode(variants['full'][0])
+        self.assertEqual(full.size, (20, 40))
+        self.assertNotIn(0x0112, full.getexif())
+
+    def test_same_content_is_stored_once(self):
+        with mock.patch.object(self.storage, 'save', wraps=self.storage.save) as save:
+            first = images.store_variant(b'same-bytes', 'webp')
+            second = images.store_variant(b'same-bytes', 'webp')
+            other = images.store_variant(b'other-bytes', 'webp')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('profile/'))
+        self.assertEqual(save.call_count, 2)
+
+
+class ProfileImageProcessingTests(TempStorageMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = User.objects.bulk_create([
+            User(email='image@test.local', username='image_user'),
+            User(email='image_other@test.local', username='image_other'),
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis_connection("default")
+        self.addCleanup(self.redis.delete, images._sequence_key(self.user.id))
+        for target in ('close_old_connections', '_notify'):
+            patcher = mock.patch(f'user.images.{target}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stored_file(self, name):
+        return self.storage.save(f'profile/{name}', ContentFile(b'image'))
+
+    def test_shared_file_is_not_deleted(self):
+        path = self.stored_file('shared.webp')
+        User.objects.filter(id__in=[self.user.id, self.other.id]).update(image=path)
+        images._delete_unused({path}, path, self.user.id)
+        self.assertTrue(self.storage.exists(path))
+
+    def test_unshared_file_is_deleted(self):
+        path = self.stored_file('own.webp')
+        User.objects.filter(id=self.user.id).update(image=path)
+        images._delete_unused({path}, path, self.user.id)
+        self.assertFalse(self.storage.exists(path))
+
+    def test_upload_finishing_after_newer_upload_is_not_saved(self):
+        self.redis.set(images._sequence_key(self.user.id), 2)
+        newer, older = _image_bytes((10, 10), 'blue'), _image_bytes((10, 10), 'green')
+
+        images.process_profile_image(self.user.id, newer, 2)
+        self.user.refresh_from_db()
+        saved = (self.user.image.name, self.user.image_variants)
+        self.assertTrue(saved[0])
+
+        # 먼저 올렸지만 늦게 끝난 작업은 최신 이미지를 덮어쓰지 않음
+        images.process_profile_image(self.user.id, older, 1)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.image.name, self.user.image_variants), saved)
+        self.assertTrue(all(self.storage.exists(path) for path in saved[1].values()))
+
+    def test_newer_upload_replaces_and_cleans_up_previous(self):
+        images.process_profile_image(self.user.id, _image_bytes((10, 10), 'blue'), None)
+        self.user.refresh_from_db()
+        previous = set(self.user.image_variants.values())
+
+        self.redis.set(images._sequence_key(self.user.id), 3)
+        images.process_profile_image(self.user.id, _image_bytes((10, 10), 'green'), 3)
+        self.user.refresh_from_db()
+        self.assertTrue(previous.isdisjoint(self.user.image_variants.values()))
+        self.assertFalse(any(self.storage.exists(path) for path in previous))
+
+
+class TokenGenerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.bulk_create([User(email='gen@test.local', username='gen_user')])[0]
+
+    def setUp(self):
+        token_generation._local.clear()
+        token_user_cache.clear()
+        redis = get_redis_connection("default")
+        redis.delete(token_generation._key(self.user.id))
+        self.addCleanup(redis.delete, token_generation._key(self.user.id))
+
+    def login(self):
+        refresh = CustomObtainPairSerializer.get_token(self.user)
+        self.addCleanup(get_redis_connection("default").delete, refresh_sessions._key(refresh[refresh_sessions.SESSION_CLAIM]))
+        return refresh
+
+    def refresh(self, token):
+        serializer = GenerationTokenRefreshSerializer(data={'refresh': str(token)})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def test_bump_generation_revokes_existing_tokens(self):
+        token = self.login().access_token
+        self.assertTrue(token_generation.is_current(token))
+        self.assertEqual(token_generation.bump_generation(self.user.id), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_generation, 1)
+        self.assertFalse(token_generation.is_current(token))
+        # 다른 프로세스도 Redis에서 새 세대 번호를 읽음
+        token_generation._local.clear()
+        self.assertFalse(token_generation.is_current(token))
+        self.assertTrue(token_generation.is_current(self.login().access_token))
+
+    def test_refresh_after_logout_is_rejected(self):
+        refresh = self.login()
+        token_generation.bump_generation(self.user.id)
+        with self.assertRaises(InvalidToken):
+            self.refresh(refresh)
+
+    def test_rotated_out_refresh_token_is_rejected_and_revokes_session(self):
+        refresh = self.login()
+        rotated = self.refresh(refresh)
+        self.assertEqual(RefreshToken(rotated['refresh'])[refresh_sessions.SESSION_CLAIM], refresh['jti'])
+        with self.assertRaises(InvalidToken):
+            self.refresh(refresh)
+        # 재사용이 감지된 세션은 최신 token도 더 이상 갱신할 수 없음
+        with self.assertRaises(InvalidToken):
+            self.refresh(rotated['refresh'])
+
+    def test_sessions_rotate_independently(self):
+        first, second = self.login(), self.login()
+        self.refresh(self.refresh(first)['refresh'])
+        self.refresh(second)
+
+    def test_http_middleware_rejects_stale_generation(self):
+        token = str(self.login().access_token)
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        UniversalJWTAuthMiddleware(lambda request: None).process_request(request)
+        self.assertEqual(request.user.id, self.user.id)
+
+        token_generation.bump_generation(self.user.id)
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        UniversalJWTAuthMiddleware(lambda request: None).process_request(request)
+        self.assertIsInstance(request.user, AnonymousUser)
+
+    @mock.patch('middlewares.jwt_middleware.database_sync_to_async', _direct)
+    def test_websocket_middleware_rejects_stale_generation(self):
+        token = str(self.login().access_token)
+        middleware = JWTWebSocketMiddleware(None)
+        self.assertEqual(asyncio.run(middleware.authenticate_websocket(token)).id, self.user.id)
+        token_generation.bump_generation(self.user.id)
+        # 사용자는 토큰 캐시에 남아 있지만 세대 번호가 달라 거부됨
+        self.assertIsInstance(asyncio.run(middleware.authenticate_websocket(token)), AnonymousUser)
@@ -0,0 +1,137 @@
+"""
+사용자별 토큰 세대(generation) 카운터
+
+로그인 시 발급되는 토큰에 현재 세대 번호(gen 클레임)를 넣고, 토큰 검증 시 사용자의 현재
+세대와 비교한다. 로그아웃하면 세대 번호를 올리므로 그 이전에 발급된 access/refresh 토큰은
+모두 무효가 된다. 토큰별 블랙리스트 행을 쌓지 않아 로그인, 갱신, 로그아웃 비용이 일정하다.
+
+세대 번호의 원본은 User.token_generation이고 Redis(token_gen:user:{id})는 캐시이다.
+각 프로세스는 조회한 값을 JWT_GENERATION_CHECK_INTERVAL초 동안 기억하므로 다른 프로세스에서
+올린 세대 번호는 최대 그 시간만큼 늦게 반영된다.
+
+세대 번호를 읽을 때 프로필 버전(profile:version:{id}, 사용자 저장 때마다 증가)도 같은 MGET으로
+함께 읽어 둔다. 토큰 사용자 캐시는 이 값을 비교해 다른 프로세스에서 바뀐 사용자를 추가 I/O 없이
+다시 읽는다.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.settings import api_settings
+
+from user import profile_cache
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CLAIM = 'gen'
+
+_local = {}  # user_id -> (generation, profile_version, checked_at)
+_lock = threading.Lock()
+
+
+def _key(user_id):
+    return f"token_gen:user:{user_id}"
+
+
+def _redis_ttl():
+    return getattr(settings, 'JWT_GENERATION_REDIS_TTL', 3600)
+
+
+def _load_from_db(user_id):
+    return User.objects.filter(id=user_id).values_list('token_generation', flat=True).first() or 0
+
+
+def _fetch(user_id):
+    """(세대 번호, 프로필 버전) 조회 (Redis 장애 시 프로필 버전은 None)"""
+    try:
+        redis = get_redis_connection("default")
+        value, profile_version = redis.mget([_key(user_id), profile_cache._version_key(user_id)])
+        profile_version = int(profile_version or 0)
+        if value is not None:
+            return int(value), profile_version
+        generation = _load_from_db(user_id)
+        # 그 사이 로그아웃으로 더 새로운 값이 기록됐다면 덮어쓰지 않음
+        redis.set(_key(user_id), generation, ex=_redis_ttl(), nx=True)
+        return generation, profile_version
+    except Exception as e:
+        logger.error(f"Token generation lookup error for user {user_id}: {str(e)}")
+        return _load_from_db(user_id), None
+
+
+def _check_interval():
+    return getattr(settings, 'JWT_GENERATION_CHECK_INTERVAL', 5)
+
+
+def _lookup(user_id, max_age=None):
+    if max_age is None:
+        max_age = _check_interval()
+    entry = _local.get(user_id)
+    if entry is not None and time.monotonic() - entry[2] < max_age:
+        return entry
+    generation, profile_version = _fetch(user_id)
+    entry = (generation, profile_version, time.monotonic())
+    with _lock:
+        _local[user_id] = entry
+    return entry
+
+
+def _peek(user_id):
+    entry = _local.get(user_id)
+    if entry is None or time.monotonic() - entry[2] >= _check_interval():
+        return None
+    return entry
+
+
+def get_generation(user_id, max_age=None):
+    """사용자의 현재 토큰 세대 번호 (max_age초 이내에 조회한 값은 재사용)"""
+    return _lookup(user_id, max_age)[0]
+
+
+def get_profile_version(user_id):
+    """세대 번호와 함께 읽은 프로필 버전 (Redis 장애로 모르면 None)"""
+    return _lookup(user_id)[1]
+
+
+def peek_generation(user_id):
+    """프로세스에 기억된 최신 세대 번호 (없거나 오래됐으면 None, I/O 없음)"""
+    entry = _peek(user_id)
+    return None if entry is None else entry[0]
+
+
+def peek_profile_version(user_id):
+    """프로세스에 기억된 최신 프로필 버전 (없거나 오래됐으면 None, I/O 없음)"""
+    entry = _peek(user_id)
+    return None if entry is None else entry[1]
+
+
+def token_generation(token):
+    return token.get(GENERATION_CLAIM, 0)
+
+
+def is_current(token):
+    """토큰의 세대 번호가 사용자의 현재 세대와 같은지 확인"""
+    return token_generation(token) == get_generation(token[api_settings.USER_ID_CLAIM])
+
+
+def is_current_cached(token):
+    """I/O 없이 확인 가능한 경우에만 True (모르면 False)"""
+    return token_generation(token) == peek_generation(token[api_settings.USER_ID_CLAIM])
+
+
+def bump_generation(user_id):
+    """세대 번호를 올려 지금까지 발급된 사용자의 모든 토큰을 무효화"""
+    User.objects.filter(id=user_id).update(token_generation=F('token_generation') + 1)
+    generation = _load_from_db(user_id)
+    try:
+        get_redis_connection("default").set(_key(user_id), generation, ex=_redis_ttl())
+    except Exception as e:
+        logger.error(f"Token generation update error for user {user_id}: {str(e)}")
+    # 프로필 버전은 다음 조회 때 다시 읽음 (그때까지 토큰 사용자 캐시는 사용하지 않음)
+    with _lock:
+        _local[user_id] = (generation, None, time.monotonic())
+    return generation
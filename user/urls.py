@@ -1,11 +1,10 @@
 from django.urls import path
 from user import views
-from rest_framework_simplejwt.views import TokenRefreshView
 
 app_name = "user"
 urlpatterns = [
     path('token/', views.CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', views.GenerationTokenRefreshView.as_view(), name='token_refresh'),
     path('email-verification/', views.EmailVerificationView.as_view(), name='email_verification'),
     path('verify-code/', views.VerifyCodeView.as_view(), name='verify_code'),
     path('signup/', views.UserView.as_view(), name='user_view'),
@@ -21,6 +20,7 @@ urlpatterns = [
     path('accept_friend_request/', views.AcceptFriendRequestView.as_view(), name='accept_friend_request'), # 친구 요청 수락 API
     path('reject-friend-request/', views.RejectFriendRequestView.as_view(), name='reject_friend_request'),  # 친구 요청 거절 API
     path('friends/', views.FriendListView.as_view(), name='friend_list'),  # 친구 목록 API
+    path('mutual-friends/', views.MutualFriendListView.as_view(), name='mutual_friend_list'),  # 공통 친구 목록 API
     path('delete-friend/', views.DeleteFriendView.as_view(), name='delete-friend'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
 ]
\ No newline at end of file
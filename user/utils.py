@@ -1,11 +1,13 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
+
+from user.mail_queue import get_mail_queue
 
 def send_verification_email(email, verification_code):
-    """이메일 인증 번호 발송"""
-    send_mail(
+    """이메일 인증 번호 발송 (발송 큐에 넣고 바로 반환, 인증번호는 이미 Redis에 저장된 상태)"""
+    message = EmailMessage(
         '이메일 인증 번호',
         f'귀하의 인증번호는 {verification_code} 입니다. 10분 이내에 인증해주세요.',
         'your_email@example.com',
         [email],
-        fail_silently=False,
-    )
\ No newline at end of file
+    )
+    get_mail_queue().enqueue(message)
@@ -0,0 +1,84 @@
+"""
+Redis 기반 이메일 인증 상태
+
+이메일별 hash(email_verification:{email})에 인증번호, 틀린 횟수, 인증 완료 여부를 저장하고
+EMAIL_VERIFICATION_TTL(기본 10분)이 지나면 Redis가 자동으로 삭제한다. 인증번호 확인과
+인증 완료 사용은 Lua 스크립트로 처리해 동시에 들어온 요청이 같은 상태를 두 번 쓰지 못한다.
+"""
+
+import secrets
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+VERIFIED = 'verified'
+MISMATCH = 'mismatch'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+# 인증번호가 맞으면 인증 완료로 표시, 틀리면 시도 횟수 증가. 인증 완료 후에도 인증번호를 먼저
+# 비교하므로 다른 번호로는 인증 완료 응답을 받을 수 없다. 인증 완료 상태는 consume_verified()로 한 번만 사용
+_CHECK_CODE = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 'expired'
+end
+if tonumber(redis.call('HGET', KEYS[1], 'attempts') or '0') >= tonumber(ARGV[2]) then
+    return 'locked'
+end
+if code == ARGV[1] then
+    redis.call('HSET', KEYS[1], 'verified', '1')
+    return 'verified'
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+return 'mismatch'
+"""
+
+# 인증 완료 상태를 한 번만 사용하도록 확인과 삭제를 함께 처리
+_CONSUME_VERIFIED = """
+if redis.call('HGET', KEYS[1], 'verified') == '1' then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+def get_ttl():
+    return getattr(settings, 'EMAIL_VERIFICATION_TTL', 600)
+
+
+def _key(email):
+    return f"email_verification:{email.strip().lower()}"
+
+
+def issue_code(email):
+    """새 인증번호 발급 (이전 인증번호, 시도 횟수, 인증 상태는 초기화)"""
+    code = f"{secrets.randbelow(10 ** 6):06d}"
+    key = _key(email)
+    pipe = get_redis_connection("default").pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={'code': code, 'attempts': 0, 'verified': 0})
+    pipe.expire(key, get_ttl())
+    pipe.execute()
+    return code
+
+
+def check_code(email, code):
+    """인증번호 확인. VERIFIED, MISMATCH, EXPIRED, LOCKED 중 하나 반환"""
+    redis = get_redis_connection("default")
+    result = redis.register_script(_CHECK_CODE)(
+        keys=[_key(email)],
+        args=[code, getattr(settings, 'EMAIL_VERIFICATION_MAX_ATTEMPTS', 5)]
+    )
+    return result.decode() if isinstance(result, bytes) else result
+
+
+def is_verified(email):
+    return get_redis_connection("default").hget(_key(email), 'verified') == b'1'
+
+
+def consume_verified(email):
+    """인증 완료 상태를 사용 처리 (회원가입/비밀번호 재설정 1회). 인증된 상태였으면 True"""
+    redis = get_redis_connection("default")
+    return bool(redis.register_script(_CONSUME_VERIFIED)(keys=[_key(email)]))
@@ -1,9 +1,7 @@
 import logging
-import os
 from asgiref.sync import async_to_sync
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from django_redis import get_redis_connection
 from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ValidationError
 from rest_framework import status, permissions
@@ -11,12 +9,16 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from channels.layers import get_channel_layer
-from user.models import User, Friendship, EmailVerification
-from user.serializers import (UserSerializer, CustomObtainPairSerializer,  UserProfileSerializers, 
+from user.models import User, Friendship
+from user import friend_graph, images, presence, profile_cache, token_generation, verification
+from user.search import InvalidSearchCursor, search_users
+from middlewares.token_cache import token_user_cache
+from realtime import fanout
+from user.consumers import close_user_sessions
+from user.serializers import (UserSerializer, CustomObtainPairSerializer, GenerationTokenRefreshSerializer,  UserProfileSerializers, 
                               UserProfileUpdateSerializers, EmailVerificationSerializer, VerifyCodeSerializer,
                               UserSearchSerializer, FriendshipSerializer, FriendRequestActionSerializer, PasswordChangeSerializer, 
                               PasswordResetConfirmSerializer)
@@ -67,7 +69,6 @@ class UserView(APIView):
             serializer = UserSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
-                EmailVerification.objects.filter(email=email).delete()
                 return Response({"message" : "회원가입을 축하합니다!"}, status=status.HTTP_201_CREATED)
             else:
                 return Response({"message" : f"${serializer.errors}"}, status=status.HTTP_400_BAD_REQUEST)
@@ -113,13 +114,13 @@ class PasswordResetView(APIView):
             
             try:
                 user = User.objects.get(email=email)
+                # 인증 완료 상태를 한 번만 사용하도록 원자적으로 확인 후 삭제
+                if not verification.consume_verified(email):
+                    return Response({"message": "이메일 인증을 먼저 완료해주세요."}, status=status.HTTP_400_BAD_REQUEST)
                 # 새 비밀번호 설정
                 user.set_password(new_password)
                 user.save()
                 
-                # 인증 정보 삭제
-                EmailVerification.objects.filter(email=email).delete()
-                
                 return Response({"message": "비밀번호가 성공적으로 재설정되었습니다."}, status=status.HTTP_200_OK)
                 
             except User.DoesNotExist:
@@ -133,42 +134,17 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
     def post(self, request, *args, **kwargs):
         try:
-            response = super().post(request, *args, **kwargs)
-            
-            if response.status_code == 200:
-                email = request.data.get('email')
-                try:
-                    user = User.objects.get(email=email)
-                    
-                    # 기존 토큰 정리 로직
-                    outstanding_tokens = OutstandingToken.objects.filter(user_id=user.id)
-                    BlacklistedToken.objects.filter(token__in=outstanding_tokens).delete()
-                    outstanding_tokens.delete()
-                    
-                    # Redis 블랙리스트 토큰 삭제
-                    try:
-                        redis = get_redis_connection("default")
-                        blacklist_key = f"blacklist_user_{user.id}_refresh_token"
-                        if redis.exists(blacklist_key):
-                            redis.delete(blacklist_key)
-                    except Exception as e:
-                        print(f"Redis 작업 중 에러: {str(e)}")
-
-                    # 사용자 상태 변경
-                    user.is_online = True
-                    user.save()
-                
-                except User.DoesNotExist:
-                    print(f"User not found: {email}")
-                except Exception as e:
-                    print(f"토큰 삭제 중 에러: {str(e)}")
-            
-            return response
+            # 토큰 폐기는 세대 번호로 처리하므로 로그인 시 정리할 토큰 행이 없음
+            return super().post(request, *args, **kwargs)
 
         except Exception as e:
-            print(f"로그인 처리 중 에러 발생: {str(e)}")
+            logger.error(f"로그인 처리 중 에러 발생: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+# 토큰 갱신
+class GenerationTokenRefreshView(TokenRefreshView):
+    serializer_class = GenerationTokenRefreshSerializer
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -179,25 +155,33 @@ class LogoutView(APIView):
                 return Response({"error": "Refresh token is required"}, status=400)
 
             try:
-                token = RefreshToken(refresh_token)
-                token.blacklist()
+                RefreshToken(refresh_token)
             except Exception as e:
-                logging.error(f"Token blacklist error: {str(e)}")
+                logging.error(f"Invalid refresh token on logout: {str(e)}")
                 return Response({"error": "Invalid token"}, status=400)
 
             user = request.user
-            user.is_online = False
-            user.save()
+            # 세대 번호를 올려 이 사용자의 모든 access/refresh 토큰 폐기
+            token_generation.bump_generation(user.id)
+            # 토큰 캐시에서 사용자 제거
+            token_user_cache.invalidate_user(user.id)
+
+            # 접속 상태 초기화 (남아 있는 연결은 다시 등록하지 않고 닫음)
+            presence.clear(user.id)
+            try:
+                async_to_sync(close_user_sessions)(user.id)
+            except Exception as e:
+                logger.error(f"Session close error in logout for user {user.id}: {str(e)}")
 
             try:
-                group_name = f'user_{user.id}'
                 channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    group_name,
+                async_to_sync(fanout.publish_user_event)(
+                    channel_layer,
+                    user.id,
                     {
                         'type': 'status_message',
                         'message': '로그아웃 되었습니다.',
-                        'is_online': user.is_online,
+                        'is_online': False,
                         'user_id': user.id,
                         'username': user.username,
                         'updated_at': user.updated_at.isoformat()
@@ -226,17 +210,18 @@ class ProfileView(APIView):
     def put(self, request, *args, **kwargs):
         user = get_object_or_404(User, id=request.user.id)
 
-        # 기존 이미지 삭제 로직
-        if user.image:  # 이미지가 있을 경우
-            image_path = user.image.path  # 실제 파일 경로 가져오기
-            # 기본 프로필 이미지인지 확인 (default 폴더에 있으면 삭제 안 함)
-            if "media/default/" not in image_path.replace("\\", "/") and os.path.exists(image_path):  
-                os.remove(image_path)
-
         serializer = UserProfileUpdateSerializers(user, data=request.data, partial=True)
         if serializer.is_valid():
+            # 이미지는 백그라운드에서 크기별로 처리 (기존 파일 정리도 처리 후 진행)
+            upload = serializer.validated_data.pop('image', None)
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # 이 프로세스의 프로필 스냅샷은 응답 전에 바로 제거 (다른 프로세스는 시그널에서 Redis 제거)
+            profile_cache.invalidate(user.id)
+            if upload is not None:
+                images.schedule_profile_image(user.id, upload.read())
+            data = dict(serializer.data)
+            data['image_processing'] = upload is not None
+            return Response(data, status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -294,15 +279,40 @@ class PasswordChangeView(APIView):
         
 # 사용자 검색
 class SearchUserView(APIView):
+    """
+    사용자 검색 (친구 → 채팅 상대 → 그 외 순)
+
+    응답의 mode는 실제 사용한 검색 방식이다. contains를 요청해도 3글자 미만이면 prefix로 처리된다.
+    prefix에서 친구/채팅 상대가 아닌 사용자는 username 순 상위 candidate_limit명까지만 검색된다.
+    """
     permission_classes = [IsAuthenticated]  # 인증된 사용자만 접근 가능
     def get(self, request):
-        username = request.query_params.get('username', None)  # 쿼리 파라미터에서 username을 가져옴
+        username = request.query_params.get('username', '').strip()  # 쿼리 파라미터에서 username을 가져옴
         if username:
-            # username으로 사용자 검색 (대소문자 구분 없이)
-            users = User.objects.filter(username__icontains=username).exclude(id=request.user.id)  # 나를 제외하고 user 필터링
-            # 직렬화기를 사용하여 사용자 데이터 직렬화
-            serializer = UserSearchSerializer(users, many=True)
-            return Response({"users": serializer.data}, status=200)  # 사용자 목록 반환
+            # mode=prefix: 자동완성, 기본값: 부분 문자열 검색 (친구, 채팅 상대 우선)
+            mode = request.query_params.get('mode', 'contains')
+            try:
+                limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+                result = search_users(
+                    request.user,
+                    username,
+                    mode=mode,
+                    cursor=request.query_params.get('cursor'),
+                    limit=limit
+                )
+            except (ValueError, InvalidSearchCursor) as e:
+                return Response({"error": str(e)}, status=400)
+            users = result['users']
+            # 직렬화기를 사용하여 사용자 데이터 직렬화 (접속 상태는 한 번에 조회)
+            online_map = presence.get_many([user.id for user in users])
+            serializer = UserSearchSerializer(users, many=True, context={'online_map': online_map})
+            return Response({
+                "users": serializer.data,
+                "has_more": result['has_more'],
+                "next_cursor": result['next_cursor'],
+                "mode": result['mode'],  # 실제 사용한 검색 방식
+                "candidate_limit": result['candidate_limit']  # prefix 후보 상한 (contains는 null)
+            }, status=200)  # 사용자 목록 반환
         return Response({"error": "사용자가 존재하지 않습니다."}, status=400)  # username이 없을 경우 오류 메시지
         
 # 친구 요청 보내기
@@ -314,12 +324,10 @@ class SendFriendRequestView(APIView):
             username = serializer.validated_data['username']  # 추가할 친구의 사용자 이름
             friend_user = get_object_or_404(User, username=username)  # 친구 사용자 조회
             
-            # 이미 친구인지 확인
-            existing_friendship = Friendship.objects.filter(
+            # 이미 친구인지 확인 (수락된 관계는 친구 그래프 캐시, 대기 중인 요청은 DB에서 확인)
+            if friend_graph.are_friends(request.user.id, friend_user.id) or Friendship.objects.filter(
                 (Q(from_user=request.user, to_user=friend_user) | Q(from_user=friend_user, to_user=request.user))
-            ).first()  # 친구 관계가 존재하는지 확인
-            
-            if existing_friendship:
+            ).exists():
                 return Response({"error": "이미 친구입니다."}, status=400)  # 이미 친구인 경우 오류 메시지
             # 친구 추가 요청 생성
             new_friendship = Friendship(from_user=request.user, to_user=friend_user)
@@ -333,7 +341,7 @@ class SentFriendRequestListView(APIView):
     permission_classes = [IsAuthenticated]  # 인증된 사용자만 접근 가능
     def get(self, request):
         # 현재 사용자가 보낸 친구 요청 목록을 조회하되, accepted가 False인 요청만 필터링
-        sent_requests = Friendship.objects.filter(from_user=request.user, accepted=False)
+        sent_requests = Friendship.objects.filter(from_user=request.user, accepted=False).select_related('from_user', 'to_user')
         # 직렬화기를 사용하여 요청 데이터 직렬화
         serializer = FriendshipSerializer(sent_requests, many=True)
         return Response({"sent_requests": serializer.data}, status=200)  # 보낸 친구 요청 목록 반환
@@ -343,7 +351,7 @@ class ReceivedFriendRequestListView(APIView):
     permission_classes = [IsAuthenticated]  # 인증된 사용자만 접근 가능
     def get(self, request):
         # 현재 사용자가 받은 친구 요청 목록을 조회
-        received_requests = Friendship.objects.filter(to_user=request.user, accepted=False)
+        received_requests = Friendship.objects.filter(to_user=request.user, accepted=False).select_related('from_user', 'to_user')
         # 직렬화기를 사용하여 요청 데이터 직렬화
         serializer = FriendshipSerializer(received_requests, many=True)
         return Response({"received_requests": serializer.data}, status=200)  # 받은 친구 요청 목록 반환
@@ -379,13 +387,26 @@ class RejectFriendRequestView(APIView):
 class FriendListView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):      # 현재 사용자의 친구 목록을 조회
-        friends = Friendship.objects.filter(
-        Q(from_user=request.user, accepted=True) | Q(to_user=request.user, accepted=True)
-        ).distinct()
-        # 친구 목록에서 친구 사용자 정보를 직렬화
-        friend_usernames = [friend.to_user if friend.from_user == request.user else friend.from_user for friend in friends]  # 친구 객체를 가져옴
-        serializer = UserSearchSerializer(friend_usernames, many=True)
+        # 친구 ID는 친구 그래프 캐시에서, 사용자 정보는 한 번의 쿼리로 조회
+        friend_ids = friend_graph.get_friend_ids(request.user.id)
+        friend_usernames = list(User.objects.filter(id__in=friend_ids).order_by('username'))
+        online_map = presence.get_many([friend.id for friend in friend_usernames])
+        serializer = UserSearchSerializer(friend_usernames, many=True, context={'online_map': online_map})
         return Response({"friends_requests": serializer.data}, status=200)  # 친구 목록을 JSON 형식으로 반환
+
+# 공통 친구 목록
+class MutualFriendListView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        username = request.query_params.get('username', None)
+        if not username:
+            return Response({"error": "유효하지 않은 요청입니다."}, status=400)
+        other_user = get_object_or_404(User, username=username)
+        mutual_ids = friend_graph.get_mutual_friend_ids(request.user.id, other_user.id)
+        mutual_friends = list(User.objects.filter(id__in=mutual_ids).order_by('username'))
+        online_map = presence.get_many([friend.id for friend in mutual_friends])
+        serializer = UserSearchSerializer(mutual_friends, many=True, context={'online_map': online_map})
+        return Response({"mutual_friends": serializer.data, "count": len(mutual_friends)}, status=200)
     
 # 친구 삭제
 class DeleteFriendView(APIView):